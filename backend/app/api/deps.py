@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.core.security import decode_access_token
 from app.core.errors import auth_required, auth_invalid_credentials
+from app.core.request_id import set_user_id
 from app.models.user import User
 
 
@@ -31,6 +32,7 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(get_tok
         token_time = datetime.fromtimestamp(int(iat), timezone.utc)
         if token_time < user.password_changed_at:
             raise auth_invalid_credentials()
+    set_user_id(user.id)
     return user
 
 
@@ -57,4 +59,5 @@ def get_optional_user(
         token_time = datetime.fromtimestamp(int(iat), timezone.utc)
         if token_time < user.password_changed_at:
             return None
+    set_user_id(user.id)
     return user
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
 from datetime import datetime, date, timezone
-from collections import deque
 from pathlib import Path
 from app.db.session import get_db
 from app.core.response import ok, created
@@ -10,6 +10,22 @@ from app.core.rbac import require_roles
 from app.core.security import hash_password, validate_password_strength, generate_strong_password
 from app.core.errors import AppError
 from app.core.config import settings
+from app.core import (
+    bulk_import,
+    log_index,
+    log_reader,
+    metrics,
+    preview_cache,
+    profiler,
+    query_insights,
+    report_export,
+    sql_monitor,
+)
+from app.core.hot_cache import cover_cache
+from app.core.jobs import JobQueueFull
+from app.core.logging import pipeline_stats
+from app.core.office import office_pool
+from app.core.preview import pool_stats as preview_pool_stats
 from app.models.user import User
 from app.models.resource import Resource, resource_tags
 from app.models.meta import ProfessionalGroup, Major, Course, IdeologyTag
@@ -25,6 +41,8 @@ from app.schemas.admin import (
     CoursePatchIn,
     TagCreateIn,
     TagPatchIn,
+    QueryExplainIn,
+    ProfileSessionIn,
 )
 import logging
 
@@ -169,30 +187,43 @@ def reset_password(
     return ok(request, AdminResetPasswordOut(id=u.id, username=u.username, new_password=new_pwd).model_dump())
 
 
-def _res_count_by(db: Session, field, value):
-    return (
-        db.query(func.count(Resource.id))
-        .filter(field == value)
-        .scalar()
-    )
+def _resource_counts(db: Session, field) -> dict[int, int]:
+    """一条 GROUP BY 取出某一层级（专业群/专业/课程/标签）全部条目的资源数。"""
+    if field is resource_tags.c.tag_id:
+        q = db.query(field, func.count(resource_tags.c.resource_id))
+    else:
+        q = db.query(field, func.count(Resource.id)).filter(field.isnot(None))
+    return dict(q.group_by(field).all())
+
+
+def _with_counts(items: list[dict], counts: dict[int, int] | None) -> list[dict]:
+    if counts is not None:
+        for item in items:
+            item["resource_count"] = counts.get(item["id"], 0)
+    return items
 
 
 @router.get("/meta/groups")
-def admin_groups(request: Request, db: Session = Depends(get_db), admin: User = Depends(require_roles("admin"))):
+def admin_groups(
+    request: Request,
+    include_counts: bool = True,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
+    """include_counts=false 时不统计资源数（用于下拉框等只需名称的场景）。"""
     rows = db.query(ProfessionalGroup).order_by(ProfessionalGroup.sort_order.asc(), ProfessionalGroup.id.asc()).all()
-    data = []
-    for g in rows:
-        data.append(
-            {
-                "id": g.id,
-                "name": g.name,
-                "code": g.code,
-                "sort_order": g.sort_order,
-                "is_active": g.is_active,
-                "resource_count": _res_count_by(db, Resource.group_id, g.id),
-            }
-        )
-    return ok(request, {"items": data})
+    data = [
+        {
+            "id": g.id,
+            "name": g.name,
+            "code": g.code,
+            "sort_order": g.sort_order,
+            "is_active": g.is_active,
+        }
+        for g in rows
+    ]
+    counts = _resource_counts(db, Resource.group_id) if include_counts else None
+    return ok(request, {"items": _with_counts(data, counts)})
 
 
 @router.post("/meta/groups")
@@ -228,22 +259,26 @@ def patch_group(gid: int, payload: GroupPatchIn, request: Request, db: Session =
 
 
 @router.get("/meta/majors")
-def admin_majors(request: Request, db: Session = Depends(get_db), admin: User = Depends(require_roles("admin"))):
+def admin_majors(
+    request: Request,
+    include_counts: bool = True,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
     rows = db.query(Major).order_by(Major.sort_order.asc(), Major.id.asc()).all()
-    data = []
-    for m in rows:
-        data.append(
-            {
-                "id": m.id,
-                "group_id": m.group_id,
-                "name": m.name,
-                "code": m.code,
-                "sort_order": m.sort_order,
-                "is_active": m.is_active,
-                "resource_count": _res_count_by(db, Resource.major_id, m.id),
-            }
-        )
-    return ok(request, {"items": data})
+    data = [
+        {
+            "id": m.id,
+            "group_id": m.group_id,
+            "name": m.name,
+            "code": m.code,
+            "sort_order": m.sort_order,
+            "is_active": m.is_active,
+        }
+        for m in rows
+    ]
+    counts = _resource_counts(db, Resource.major_id) if include_counts else None
+    return ok(request, {"items": _with_counts(data, counts)})
 
 
 @router.post("/meta/majors")
@@ -280,22 +315,26 @@ def patch_major(mid: int, payload: MajorPatchIn, request: Request, db: Session =
 
 
 @router.get("/meta/courses")
-def admin_courses(request: Request, db: Session = Depends(get_db), admin: User = Depends(require_roles("admin"))):
+def admin_courses(
+    request: Request,
+    include_counts: bool = True,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
     rows = db.query(Course).order_by(Course.sort_order.asc(), Course.id.asc()).all()
-    data = []
-    for c in rows:
-        data.append(
-            {
-                "id": c.id,
-                "major_id": c.major_id,
-                "name": c.name,
-                "term": c.term,
-                "sort_order": c.sort_order,
-                "is_active": c.is_active,
-                "resource_count": _res_count_by(db, Resource.course_id, c.id),
-            }
-        )
-    return ok(request, {"items": data})
+    data = [
+        {
+            "id": c.id,
+            "major_id": c.major_id,
+            "name": c.name,
+            "term": c.term,
+            "sort_order": c.sort_order,
+            "is_active": c.is_active,
+        }
+        for c in rows
+    ]
+    counts = _resource_counts(db, Resource.course_id) if include_counts else None
+    return ok(request, {"items": _with_counts(data, counts)})
 
 
 @router.post("/meta/courses")
@@ -336,26 +375,24 @@ def patch_course(cid: int, payload: CoursePatchIn, request: Request, db: Session
 
 
 @router.get("/meta/tags")
-def admin_tags(request: Request, db: Session = Depends(get_db), admin: User = Depends(require_roles("admin"))):
+def admin_tags(
+    request: Request,
+    include_counts: bool = True,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
     rows = db.query(IdeologyTag).order_by(IdeologyTag.sort_order.asc(), IdeologyTag.id.asc()).all()
-    data = []
-    for t in rows:
-        count = (
-            db.query(func.count(Resource.id))
-            .join(resource_tags, resource_tags.c.resource_id == Resource.id)
-            .filter(resource_tags.c.tag_id == t.id)
-            .scalar()
-        )
-        data.append(
-            {
-                "id": t.id,
-                "name": t.name,
-                "sort_order": t.sort_order,
-                "is_active": t.is_active,
-                "resource_count": count,
-            }
-        )
-    return ok(request, {"items": data})
+    data = [
+        {
+            "id": t.id,
+            "name": t.name,
+            "sort_order": t.sort_order,
+            "is_active": t.is_active,
+        }
+        for t in rows
+    ]
+    counts = _resource_counts(db, resource_tags.c.tag_id) if include_counts else None
+    return ok(request, {"items": _with_counts(data, counts)})
 
 
 @router.post("/meta/tags")
@@ -390,24 +427,109 @@ def patch_tag(tid: int, payload: TagPatchIn, request: Request, db: Session = Dep
 
 
 @router.get("/reports/resources")
-def report_resources(request: Request, db: Session = Depends(get_db), admin: User = Depends(require_roles("admin"))):
-    rows = db.query(Resource).order_by(Resource.id.asc()).limit(200).all()
-    items = []
-    for r in rows:
-        items.append(
-            {
-                "id": r.id,
-                "title": r.title,
-                "major_name": None,
-                "course_name": None,
-                "tag_names": [],
-                "status": r.status,
-                "download_count": r.download_count,
-                "owner_name": None,
-                "published_at": r.published_at.isoformat() if r.published_at else None,
-            }
+def report_resources(
+    request: Request,
+    format: str = "json",
+    date_from: date | None = None,
+    date_to: date | None = None,
+    date_field: str = "created",
+    status: str | None = None,
+    major_id: int | None = None,
+    owner_id: int | None = None,
+    page: int = 1,
+    page_size: int = 50,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
+    """
+    资源报表。format=json 为分页预览；format=csv / xlsx 流式导出全部符合条件的行（不设上限）。
+    筛选：日期区间（date_field=created|published，含首尾）、状态、专业、发布者。
+    """
+    if format not in ("json", *report_export.FORMATS):
+        raise AppError(code="VALIDATION_ERROR", message="format 仅支持 json、csv、xlsx", status_code=400)
+    if date_field not in ("created", "published"):
+        raise AppError(code="VALIDATION_ERROR", message="date_field 仅支持 created、published", status_code=400)
+    if date_from and date_to and date_from > date_to:
+        raise AppError(code="VALIDATION_ERROR", message="开始日期不能晚于结束日期", status_code=400)
+    stmt = report_export.report_query(
+        date_from=date_from,
+        date_to=date_to,
+        date_field=date_field,
+        status=status,
+        major_id=major_id,
+        owner_id=owner_id,
+    )
+    if format == "json":
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), 500)
+        total, items = report_export.report_page(db, stmt, page, page_size)
+        for item in items:
+            for key in ("created_at", "published_at"):
+                item[key] = item[key].isoformat() if item[key] else None
+        return ok(request, {"items": items, "total": total, "page": page, "page_size": page_size})
+
+    filename = f"resources_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    logger.info("Report export by %s: format=%s", admin.username, format)
+    return StreamingResponse(
+        report_export.stream_report(format, stmt),
+        media_type=report_export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+
+@router.post("/resources/import")
+def import_resources(
+    request: Request,
+    manifest: UploadFile = File(...),
+    archive: UploadFile | None = File(None),
+    dry_run: bool = Form(False),
+    skip_invalid: bool = Form(False),
+    admin: User = Depends(require_roles("admin")),
+):
+    """
+    批量导入资源：manifest 为 CSV/XLSX 清单，archive 为包含清单中文件/封面的 zip（仅外链资源时可省略）。
+    上传完成后在后台执行并立即返回任务 id，通过 GET /admin/resources/import/{job_id} 查询进度与逐行报告。
+    先整体校验；dry_run 只返回逐行校验结果，skip_invalid 跳过无效行导入其余行。
+    """
+    suffix = Path(manifest.filename or "").suffix.lower()
+    if suffix not in (".csv", ".xlsx"):
+        raise AppError(code="FILE_TYPE_NOT_ALLOWED", message="清单仅支持 CSV 或 XLSX", status_code=415)
+    try:
+        job = bulk_import.submit_job(
+            admin, manifest.file, suffix, archive.file if archive is not None else None, dry_run, skip_invalid
         )
-    return ok(request, {"items": items})
+    except ValueError:
+        raise AppError(code="FILE_TOO_LARGE", message="清单或压缩包过大", status_code=413)
+    except JobQueueFull:
+        raise AppError(code="IMPORT_BUSY", message="导入任务排队已满，请稍后重试", status_code=503)
+    logger.info(
+        "AUDIT admin=%s action=bulk_import job=%s dry_run=%s skip_invalid=%s",
+        admin.username, job["id"], dry_run, skip_invalid,
+    )
+    return ok(request, job)
+
+
+@router.get("/resources/import/{job_id}")
+def import_job_status(request: Request, job_id: str, admin: User = Depends(require_roles("admin"))):
+    """批量导入任务状态（queued / running / done / failed）；完成后 report 为逐行报告。"""
+    job = bulk_import.get_job(job_id)
+    if job is None:
+        raise AppError(code="RESOURCE_NOT_FOUND", message="导入任务不存在或已过期", status_code=404)
+    return ok(request, job)
+
+
+@router.get("/preview-cache")
+def preview_cache_stats(request: Request, admin: User = Depends(require_roles("admin"))):
+    """预览缓存状态：命中率、占用大小、条目数，转换任务池/常驻 LibreOffice 实例概况，以及封面内存缓存。"""
+    return ok(
+        request,
+        {
+            "cache": preview_cache.stats(),
+            "covers": cover_cache.stats(),
+            "jobs": preview_pool_stats(),
+            "office": office_pool.info(),
+        },
+    )
 
 
 @router.get("/logs")
@@ -419,14 +541,20 @@ def read_logs(
     level: str | None = None,
     keyword: str | None = None,
     max_lines: int = 200,
+    before: int | None = None,
+    after: int | None = None,
 ):
     """
     轻量日志查看：按天文件 + 关键字/级别过滤 + 行数上限。
-    文件命名：app.log（当日）、app.log.YYYY-MM-DD（历史）。
+    文件命名：app.log（当日）、app.log.YYYY-MM-DD.gz（历史，压缩）。
+    默认返回最后 max_lines 条匹配行（从文件末尾向前读取）；before / after 为上次返回的游标，
+    分别用于向前翻页与拉取新增日志。
     """
-    log_dir = Path(settings.LOG_DIR)
-    log_dir.mkdir(parents=True, exist_ok=True)
     max_lines = max(10, min(max_lines, 1000))
+    if before is not None and after is not None:
+        raise AppError(code="VALIDATION_ERROR", message="before 与 after 不能同时指定", status_code=400)
+    if (before is not None and before < 0) or (after is not None and after < 0):
+        raise AppError(code="VALIDATION_ERROR", message="游标无效", status_code=400)
 
     # 选定日期文件
     target_date: date | None = None
@@ -436,41 +564,218 @@ def read_logs(
         except ValueError:
             raise AppError(code="VALIDATION_ERROR", message="date_str 格式应为 YYYY-MM-DD", status_code=400)
 
-    today = datetime.now().date()
-    if target_date and target_date < today:
-        fname = f"app.log.{target_date.isoformat()}"
-    else:
-        # 当日或未指定日期 -> 当前日志文件
-        fname = "app.log"
-
-    path = log_dir / fname
-    if not path.exists():
+    path = log_reader.log_file_for(target_date)
+    if path is None:
         raise AppError(code="NOT_FOUND", message="日志文件不存在或已清理", status_code=404)
 
-    # 读取并过滤
-    result: deque[str] = deque(maxlen=max_lines)
     level_upper = level.upper() if level else None
-    kw = keyword or ""
     try:
-        with path.open("r", encoding="utf-8") as f:
-            for line in f:
-                if level_upper and f"[{level_upper}]" not in line:
-                    continue
-                if kw and kw not in line:
-                    continue
-                result.append(line.rstrip("\n"))
-    except UnicodeDecodeError:
-        raise AppError(code="READ_ERROR", message="日志文件编码异常，读取失败", status_code=500)
-
-    logger.info("Admin %s viewed logs file=%s lines=%s", admin.username, fname, len(result))
+        result = log_reader.read_lines(path, level_upper, keyword, max_lines, before=before, after=after)
+    except OSError:
+        raise AppError(code="READ_ERROR", message="日志文件读取失败", status_code=500)
+
+    logger.info("Admin %s viewed logs file=%s lines=%s", admin.username, path.name, len(result["items"]))
     return ok(
         request,
         {
-            "file": fname,
-            "count": len(result),
+            "file": path.name,
+            "count": len(result["items"]),
             "max_lines": max_lines,
             "level": level_upper,
-            "keyword": kw or None,
-            "items": list(result),
+            "keyword": keyword or None,
+            "items": result["items"],
+            "next_before": result["next_before"],
+            "next_after": result["next_after"],
+        },
+    )
+
+
+@router.get("/logs/search")
+def search_logs(
+    request: Request,
+    start: str | None = None,
+    end: str | None = None,
+    level: str | None = None,
+    logger_name: str | None = None,
+    request_id: str | None = None,
+    keyword: str | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+    admin: User = Depends(require_roles("admin")),
+):
+    """
+    跨天日志检索（保留期内全部日志，含已压缩的历史文件）：时间范围、级别（可逗号分隔多个）、
+    logger、request_id 与关键字，按时间倒序分页，next_cursor 为下一页游标。
+    索引由后台增量维护，最新几秒内的日志可能尚未可查。
+    """
+    limit = max(1, min(limit, 500))
+    try:
+        data = log_index.search(
+            start=start,
+            end=end,
+            level=level,
+            logger_name=logger_name,
+            request_id=request_id,
+            keyword=keyword,
+            limit=limit,
+            cursor=cursor,
+        )
+    except log_index.LogIndexError as e:
+        raise AppError(code="VALIDATION_ERROR", message=str(e), status_code=400)
+    return ok(request, data)
+
+
+@router.get("/logs/index")
+def log_index_stats(request: Request, admin: User = Depends(require_roles("admin"))):
+    """日志索引状态（条数、覆盖的时间范围与占用空间）与日志写入队列状态。"""
+    return ok(request, {**log_index.stats(), "pipeline": pipeline_stats()})
+
+
+@router.get("/metrics/requests")
+def request_metrics(request: Request, admin: User = Depends(require_roles("admin"))):
+    """按路由汇总的请求耗时、SQL 次数/耗时与外部调用耗时（当前 worker 进程自启动以来）。"""
+    return ok(request, metrics.request_stats())
+
+
+@router.get("/metrics/queries")
+def query_metrics(
+    request: Request,
+    sort: str = "total",
+    limit: int = 20,
+    admin: User = Depends(require_roles("admin")),
+):
+    """
+    SQL 语句按指纹汇总的排行（当前 worker 进程自启动以来）：次数、总/平均/最大耗时、慢查询次数、
+    疑似 N+1 次数与主要来源路由。sort 可选 total / mean / max / calls / slow / n_plus_one。
+    """
+    if sort not in ("total", "mean", "max", "calls", "slow", "n_plus_one"):
+        raise AppError(code="VALIDATION_ERROR", message="sort 参数无效", status_code=400)
+    limit = max(1, min(limit, 200))
+    return ok(
+        request,
+        {
+            "slow_query_ms": settings.SLOW_QUERY_MS,
+            "n_plus_one_threshold": settings.N_PLUS_ONE_THRESHOLD,
+            "items": sql_monitor.top_queries(sort, limit),
         },
     )
+
+
+def _query_insights_error(e: query_insights.QueryInsightsError) -> AppError:
+    if isinstance(e, query_insights.QueryInsightsUnavailable):
+        return AppError(code="QUERY_INSIGHTS_UNAVAILABLE", message=str(e), status_code=503)
+    return AppError(code="VALIDATION_ERROR", message=str(e), status_code=400)
+
+
+@router.get("/query-insights/statements")
+def query_insight_statements(
+    request: Request,
+    sort: str = "total",
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
+    """pg_stat_statements 中按总耗时 / 平均耗时 / 次数排行的语句（sort=total|mean|calls）。"""
+    if sort not in ("total", "mean", "calls"):
+        raise AppError(code="VALIDATION_ERROR", message="sort 参数无效", status_code=400)
+    limit = max(1, min(limit, 100))
+    try:
+        items = query_insights.top_statements(db, sort, limit)
+    except query_insights.QueryInsightsError as e:
+        raise _query_insights_error(e)
+    return ok(request, {"items": items})
+
+
+@router.post("/query-insights/explain")
+def query_insight_explain(
+    payload: QueryExplainIn,
+    request: Request,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
+    """对选定语句的样例参数执行 EXPLAIN (ANALYZE, BUFFERS)，只读事务内执行并回滚。"""
+    try:
+        data = query_insights.explain_statement(db, payload.queryid, payload.params)
+    except query_insights.QueryInsightsError as e:
+        raise _query_insights_error(e)
+    logger.info("AUDIT admin=%s action=explain_query queryid=%s", admin.username, payload.queryid)
+    return ok(request, data)
+
+
+@router.get("/query-insights/indexes")
+def query_insight_indexes(
+    request: Request,
+    db: Session = Depends(get_db),
+    admin: User = Depends(require_roles("admin")),
+):
+    """resources / resource_tags / download_logs / ai_chat_messages 的未使用索引与缺失索引提示。"""
+    try:
+        data = query_insights.index_hints(db)
+    except query_insights.QueryInsightsError as e:
+        raise _query_insights_error(e)
+    return ok(request, data)
+
+
+@router.get("/profiler")
+def profiler_status(request: Request, admin: User = Depends(require_roles("admin"))):
+    """当前剖析会话与已采集的剖析结果（新的在前）。"""
+    return ok(request, {"session": profiler.current_session(), "profiles": profiler.list_profiles()})
+
+
+@router.post("/profiler/sessions")
+def start_profiler_session(
+    payload: ProfileSessionIn,
+    request: Request,
+    admin: User = Depends(require_roles("admin")),
+):
+    """
+    开启剖析会话（替换已有会话）：在 duration_seconds 内对匹配 route / user_id 的请求采集，
+    最多 max_requests 个。cprofile 模式生成 .pstats，sample 模式生成 collapsed stack（.folded）。
+    """
+    if not 1 <= payload.duration_seconds <= 3600:
+        raise AppError(code="VALIDATION_ERROR", message="duration_seconds 应在 1~3600 之间", status_code=400)
+    if not 1 <= payload.max_requests <= 100:
+        raise AppError(code="VALIDATION_ERROR", message="max_requests 应在 1~100 之间", status_code=400)
+    if not 1 <= payload.interval_ms <= 1000:
+        raise AppError(code="VALIDATION_ERROR", message="interval_ms 应在 1~1000 之间", status_code=400)
+    try:
+        session = profiler.start_session(
+            request.app,
+            payload.mode,
+            payload.route,
+            payload.user_id,
+            payload.duration_seconds,
+            payload.max_requests,
+            payload.interval_ms,
+        )
+    except profiler.ProfilerError as e:
+        raise AppError(code="VALIDATION_ERROR", message=str(e), status_code=400)
+    logger.info(
+        "AUDIT admin=%s action=start_profiler session=%s mode=%s route=%s user_id=%s",
+        admin.username, session["id"], session["mode"], session["route"], session["user_id"],
+    )
+    return ok(request, session)
+
+
+@router.delete("/profiler/sessions")
+def stop_profiler_session(request: Request, admin: User = Depends(require_roles("admin"))):
+    profiler.stop_session()
+    return ok(request, {"session": None})
+
+
+@router.get("/profiler/profiles/{profile_id}")
+def download_profile(
+    profile_id: str,
+    request: Request,
+    format: str = "raw",
+    admin: User = Depends(require_roles("admin")),
+):
+    """下载剖析结果：raw 为原始文件（.pstats / .folded）；format=text 时 pstats 返回按累计耗时排序的摘要。"""
+    try:
+        path = profiler.profile_file(profile_id)
+    except profiler.ProfilerError as e:
+        raise AppError(code="NOT_FOUND", message=str(e), status_code=404)
+    if format == "text" and path.suffix == ".pstats":
+        return PlainTextResponse(profiler.pstats_summary(path))
+    media_type = "text/plain; charset=utf-8" if path.suffix == ".folded" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=path.name)
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.core.errors import AppError, auth_required
+from app.core.request_id import track_external
 from app.core.response import ok
 from app.api.deps import get_optional_user, get_current_user
 from app.db.session import get_db
@@ -110,10 +111,11 @@ def chat(
 
         client = _get_client()
         model = payload.model or settings.AIHUBMIX_CHAT_MODEL
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[m.model_dump() for m in payload.messages],
-        )
+        with track_external("ai", "chat"):
+            resp = client.chat.completions.create(
+                model=model,
+                messages=[m.model_dump() for m in payload.messages],
+            )
         content = resp.choices[0].message.content if resp.choices else ""
         now = datetime.utcnow()
         if payload.messages:
@@ -1,20 +1,50 @@
-﻿import os
+﻿import logging
+import os
+import time
 
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, RedirectResponse, Response
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core import hls, preview_cache
 from app.core.errors import AppError
+from app.core.images import (
+    FORMATS as IMAGE_FORMATS,
+    IMAGE_DERIVATIVE_EXTS,
+    make_derivative,
+    media_type as image_media_type,
+    negotiate_format,
+    pick_width,
+)
 from app.core.security import verify_download_signature
 from app.core.storage import is_oss_enabled
 from app.db.session import get_db
 from app.models.resource import Resource
 from app.models.resource_attachment import ResourceAttachment
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1/files", tags=["files"])
 
 
+def _image_variant(file_id: str, src_path: str, w: int, fmt: str) -> tuple[str, str] | None:
+    """图片资源的缩放衍生图，缓存在预览目录（{file_id}.w{宽度}.{格式}），受预览缓存容量管理。"""
+    width = pick_width(w)
+    variant_path = os.path.join(settings.PREVIEW_DIR, f"{file_id}.w{width}.{IMAGE_FORMATS[fmt][1]}")
+    if os.path.exists(variant_path):
+        preview_cache.record_hit(variant_path)
+        return variant_path, fmt
+    preview_cache.record_miss()
+    try:
+        make_derivative(src_path, variant_path, width, fmt)
+    except Exception:
+        logger.warning("Image derivative failed for %s", file_id, exc_info=True)
+        return None
+    preview_cache.add(variant_path)
+    return variant_path, fmt
+
+
 @router.get("/signed/{file_id}")
 def signed_file(
     file_id: str,
@@ -24,6 +54,8 @@ def signed_file(
     db: Session = Depends(get_db),
     uid: int | None = None,
     inline: int | None = None,
+    w: int | None = None,
+    fmt: str | None = None,
 ):
     if is_oss_enabled():
         raise AppError(code="NOT_FOUND", message="仅本地存储使用该接口", status_code=404)
@@ -48,7 +80,45 @@ def signed_file(
     if not os.path.exists(path):
         raise AppError(code="RESOURCE_NOT_FOUND", message="服务器上未找到文件", status_code=404)
 
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if w and ext in IMAGE_DERIVATIVE_EXTS:
+        variant = _image_variant(file_id, path, w, negotiate_format(fmt, request.headers.get("accept")))
+        if variant:
+            variant_path, out_fmt = variant
+            headers = {"Content-Disposition": f'inline; filename="{filename}"'}
+            if fmt not in IMAGE_FORMATS:
+                headers["Vary"] = "Accept"
+            return FileResponse(variant_path, media_type=image_media_type(out_fmt), headers=headers)
+
     if inline:
         headers = {"Content-Disposition": f'inline; filename="{filename}"'}
         return FileResponse(path, media_type=mime or "application/octet-stream", headers=headers)
     return FileResponse(path, media_type=mime or "application/octet-stream", filename=filename)
+
+
+@router.get("/hls/{file_id}/{exp}/{uid}/{sig}/{path:path}")
+def hls_file(file_id: str, exp: int, uid: int, sig: str, path: str):
+    """HLS 播放列表与分片、缩略图 VTT 与雪碧图。签名在路径中，播放列表里的相对地址沿用同一签名。"""
+    if not hls.is_valid_path(path):
+        raise AppError(code="NOT_FOUND", message="文件不存在", status_code=404)
+    if not verify_download_signature(hls.signature_subject(file_id), exp, sig, uid):
+        raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+
+    if is_oss_enabled():
+        remaining = max(60, exp - int(time.time()))
+        if not hls.is_playlist(path):
+            return RedirectResponse(hls.oss_segment_url(file_id, path, remaining))
+        text = hls.oss_playlist(file_id, path, remaining)
+        if text is None:
+            raise AppError(code="RESOURCE_NOT_FOUND", message="文件不存在", status_code=404)
+        # 内含带有效期的分片直链，不允许缓存
+        return Response(text, media_type=hls.media_type_for(path), headers={"Cache-Control": "private, no-store"})
+
+    local_path = hls.local_path(file_id, path)
+    if not os.path.exists(local_path):
+        raise AppError(code="RESOURCE_NOT_FOUND", message="文件不存在", status_code=404)
+    return FileResponse(
+        local_path,
+        media_type=hls.media_type_for(path),
+        headers={"Cache-Control": f"private, max-age={settings.HLS_URL_EXPIRES_SECONDS}"},
+    )
@@ -2,23 +2,68 @@
 import os
 import uuid
 from datetime import datetime, timezone
-import subprocess
 import tempfile
 import shutil
 from pathlib import Path
 import mimetypes
-from urllib.parse import urlparse
-import re
+import logging
+from urllib.parse import quote
 from fastapi import APIRouter, Depends, Request, File, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy import or_, func
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.core.config import settings
 from app.core.response import ok, created, no_content
 from app.core.errors import validation_error, not_found, permission_denied, AppError
-from app.core.security import sign_download
-from app.core.storage import is_oss_enabled, save_file_local, save_file_oss, generate_oss_signed_url, download_oss_to_temp
+from app.core.security import verify_download_signature
+from app.core.signing import signed_download
+from app.core import hls, pdf_pages, preview_cache, thumbnails, zip_export, zip_inspect
+from app.core.faststart import FASTSTART_EXTS, needs_faststart
+from app.core.images import (
+    DERIVATIVE_WIDTHS,
+    FORMATS as IMAGE_FORMATS,
+    IMAGE_DERIVATIVE_EXTS,
+    derivative_name,
+    generate_all as generate_image_derivatives,
+    make_derivative as make_image_derivative,
+    media_type as image_media_type,
+    negotiate_format,
+    oss_process_param,
+    pick_width,
+)
+from app.core.hot_cache import cover_cache, cover_checks, invalidate_cover
+from app.core.resource_files import (
+    RESOURCE_TYPES,
+    allowed_exts,
+    default_cover,
+    enqueue_file_jobs,
+    safe_filename,
+    validate_external_url,
+)
+from app.core.jobs import JobQueueFull
+from app.core.preview import (
+    OFFICE_EXTS,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_READY,
+    preview_failure,
+    preview_pdf_path,
+    request_preview,
+    wait_preview,
+)
+from app.core.media import inspect_media, lookup_media_info, remember_media_info
+from app.core.storage import (
+    is_oss_enabled,
+    save_file_local,
+    save_file_oss,
+    save_path_oss,
+    spool_upload,
+    generate_oss_signed_url,
+    download_oss_to_temp,
+    local_cover_path,
+    local_upload_path,
+)
 from app.api.deps import get_current_user, get_optional_user
 from app.models.meta import ProfessionalGroup, Major, Course, IdeologyTag
 from app.models.resource import Resource, resource_tags
@@ -28,67 +73,69 @@ from app.models.user import User
 from app.schemas.resource import ResourceCreateIn, ResourcePatchIn
 from app.models.audit import ResourceAudit
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/v1/resources", tags=["resources"])
 
-RESOURCE_TYPES = {
-    "text": "文本",
-    "slide": "课件",
-    "video": "视频",
-    "audio": "音频",
-    "image": "图片",
-    "doc": "文档",
-    "policy": "政策",
-    "practice": "案例",
-    "link": "链接",
-}
 ALLOWED_STATUS = {"draft", "published"}
-DEFAULT_COVERS = {
-    "text": "/sample-covers/text.jpg",
-    "slide": "/sample-covers/slide.jpg",
-    "video": "/sample-covers/video.jpg",
-    "audio": "/sample-covers/audio.jpg",
-    "image": "/sample-covers/image.jpg",
-    "doc": "/sample-covers/doc.jpg",
-    "policy": "/sample-covers/policy.jpg",
-    "practice": "/sample-covers/practice.jpg",
-    "link": "/sample-covers/link.jpg",
-}
-DEFAULT_COVER_FALLBACK = "/sample-covers/default-cover.jpg"
-
+# 封面文件名含 uuid、内容永不变化，按 immutable 长期缓存。
+# invalidate_cover 只清理当前进程；多 worker 时其他进程的归属校验缓存（cover_checks）
+# 最多 COVER_CHECK_TTL_SECONDS 后过期，重新查库后拒绝已删除或已更换的封面。
+COVER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# 衍生图生成失败时回退的原图：之后可能生成成功，不能标记 immutable
+COVER_FALLBACK_CACHE_CONTROL = "public, max-age=300"
 
-def _default_cover(rt: str | None) -> str:
-    return DEFAULT_COVERS.get(rt or "", DEFAULT_COVER_FALLBACK)
 
-
-def _cover_public_url(r: Resource, request: Request | None = None) -> str:
+def _cover_public_url(r: Resource, request: Request | None = None, width: int | None = DERIVATIVE_WIDTHS["card"]) -> str:
     """
     返回可供前端展示的封面地址：
     - 空值：按类型默认封面
-    - 本地上传：cover_url 形如 local:filename，返回 /api/v1/resources/{rid}/cover-file?file=filename
-    - OSS 上传：cover_url 形如 oss:key，生成签名 URL
+    - 本地上传：cover_url 形如 local:filename，返回 /api/v1/resources/{rid}/cover-file?file=filename&w=宽度
+    - OSS 上传：cover_url 形如 oss:key，生成签名 URL（附带 OSS 图片处理参数输出对应宽度的 WebP）
     - 其他：直接返回 cover_url（可为前端静态路径或 http(s)）
+    width 默认为卡片尺寸；传 None 返回原图。
     """
     if not r.cover_url:
-        return _default_cover(r.resource_type)
+        return default_cover(r.resource_type)
     if r.cover_url.startswith("oss:"):
         key = r.cover_url.replace("oss:", "", 1)
-        return generate_oss_signed_url(key, settings.SIGNED_URL_EXPIRES_SECONDS)
+        params = {"x-oss-process": oss_process_param(width, "webp")} if width else None
+        return generate_oss_signed_url(key, settings.COVER_URL_EXPIRES_SECONDS, params)
     if r.cover_url.startswith("local:"):
         filename = r.cover_url.replace("local:", "", 1)
+        query = f"file={filename}" + (f"&w={width}" if width else "")
         if request:
             base = str(request.base_url).rstrip("/")
-            return f"{base}/api/v1/resources/{r.id}/cover-file?file={filename}"
-        return f"/api/v1/resources/{r.id}/cover-file?file={filename}"
+            return f"{base}/api/v1/resources/{r.id}/cover-file?{query}"
+        return f"/api/v1/resources/{r.id}/cover-file?{query}"
     return r.cover_url
 
-def _safe_filename(name: str) -> str:
-    cleaned = name.replace("\\", "_").replace("/", "_").replace("..", "_")
-    return cleaned.strip() or "file"
+
+def _cover_etag(filename: str, width: int | None, fmt: str | None) -> str:
+    # 文件名含 uuid，同名同尺寸同格式的内容不会变化，由请求参数即可得到 ETag
+    return '"' + hashlib.sha1(f"{filename}|{width}|{fmt}".encode("utf-8")).hexdigest()[:20] + '"'
 
 
-def _allowed_exts() -> set[str]:
-    return {x.strip().lower() for x in settings.ALLOWED_FILE_EXT.split(",") if x.strip()}
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 为逗号分隔的实体标签列表或 *，按弱比较（忽略 W/ 前缀）逐个精确匹配。"""
+    if not if_none_match:
+        return False
+    target = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if (tag[2:] if tag.startswith("W/") else tag) == target:
+            return True
+    return False
+
 
+def _cover_srcset(r: Resource, request: Request | None = None) -> str | None:
+    """上传封面的 srcset（各标准宽度），静态默认封面返回 None。"""
+    if not r.cover_url or not r.cover_url.startswith(("oss:", "local:")):
+        return None
+    widths = sorted(DERIVATIVE_WIDTHS.values())
+    return ", ".join(f"{_cover_public_url(r, request, w)} {w}w" for w in widths)
 
 def _allowed_mimes() -> dict[str, set[str]]:
     return {
@@ -113,16 +160,6 @@ def _allowed_mimes() -> dict[str, set[str]]:
         "zip": {"application/zip", "application/x-zip-compressed"},
     }
 
-def _validate_external_url(url: str) -> None:
-    if not url or len(url) > 2048:
-        raise validation_error("外链地址不合法")
-    lowered = url.strip().lower()
-    if lowered.startswith("javascript:") or lowered.startswith("data:"):
-        raise validation_error("外链协议不合法")
-    parsed = urlparse(url)
-    if parsed.scheme not in {"http", "https"} or not parsed.netloc:
-        raise validation_error("外链仅支持 http:// 或 https://")
-
 def _normalize_ext(file_type: str | None, file_name: str | None) -> str:
     value = (file_type or "").strip().lower()
     if value.startswith("."):
@@ -155,194 +192,14 @@ def _calc_can_edit(user: User, r: Resource) -> bool:
     return False
 
 
-def _probe_duration(path: str) -> int | None:
-    """使用 ffprobe 探测音视频时长（秒）。"""
-    try:
-        def _run(args: list[str]) -> int | None:
-            res = subprocess.run(
-                args,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=True,
-            )
-            out = res.stdout.decode().strip()
-            if not out:
-                return None
-            try:
-                seconds = float(out)
-            except ValueError:
-                return None
-            if seconds <= 0:
-                return None
-            return int(round(seconds))
-
-        def _run_kv(args: list[str]) -> dict[str, str]:
-            res = subprocess.run(
-                args,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                check=True,
-            )
-            out = res.stdout.decode().strip()
-            data: dict[str, str] = {}
-            for line in out.splitlines():
-                if "=" not in line:
-                    continue
-                key, value = line.split("=", 1)
-                data[key.strip()] = value.strip()
-            return data
-
-        def _duration_from_ts(info: dict[str, str]) -> int | None:
-            duration_ts = info.get("duration_ts")
-            time_base = info.get("time_base")
-            if not duration_ts or not time_base or "/" not in time_base:
-                return None
-            try:
-                num, den = time_base.split("/", 1)
-                base = float(num) / float(den)
-                seconds = float(duration_ts) * base
-            except (ValueError, ZeroDivisionError):
-                return None
-            if seconds <= 0:
-                return None
-            return int(round(seconds))
-
-        def _duration_from_frames(info: dict[str, str]) -> int | None:
-            frames = info.get("nb_frames") or info.get("nb_read_frames")
-            rate = info.get("avg_frame_rate")
-            if not frames or not rate or "/" not in rate:
-                return None
-            try:
-                frames_val = float(frames)
-            except ValueError:
-                return None
-            try:
-                num, den = rate.split("/", 1)
-                fps = float(num) / float(den)
-            except (ValueError, ZeroDivisionError):
-                return None
-            if fps <= 0:
-                return None
-            seconds = frames_val / fps
-            if seconds <= 0:
-                return None
-            return int(round(seconds))
-
-        def _duration_from_samples(info: dict[str, str]) -> int | None:
-            samples = info.get("nb_samples")
-            rate = info.get("sample_rate")
-            if not samples or not rate:
-                return None
-            try:
-                samples_val = float(samples)
-                rate_val = float(rate)
-            except ValueError:
-                return None
-            if rate_val <= 0:
-                return None
-            seconds = samples_val / rate_val
-            if seconds <= 0:
-                return None
-            return int(round(seconds))
-
-        base = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-        ]
-        duration = (
-            _run(base + ["-show_entries", "format=duration", path])
-            or _run(base + ["-select_streams", "v:0", "-show_entries", "stream=duration", path])
-            or _run(base + ["-select_streams", "a:0", "-show_entries", "stream=duration", path])
-            or _duration_from_ts(
-                _run_kv(
-                    [
-                        "ffprobe",
-                        "-v",
-                        "error",
-                        "-select_streams",
-                        "v:0",
-                        "-show_entries",
-                        "stream=duration_ts,time_base",
-                        "-of",
-                        "default=noprint_wrappers=1:nokey=0",
-                        path,
-                    ]
-                )
-            )
-            or _duration_from_ts(
-                _run_kv(
-                    [
-                        "ffprobe",
-                        "-v",
-                        "error",
-                        "-select_streams",
-                        "a:0",
-                        "-show_entries",
-                        "stream=duration_ts,time_base",
-                        "-of",
-                        "default=noprint_wrappers=1:nokey=0",
-                        path,
-                    ]
-                )
-            )
-            or _duration_from_frames(
-                _run_kv(
-                    [
-                        "ffprobe",
-                        "-v",
-                        "error",
-                        "-select_streams",
-                        "v:0",
-                        "-show_entries",
-                        "stream=nb_frames,nb_read_frames,avg_frame_rate",
-                        "-of",
-                        "default=noprint_wrappers=1:nokey=0",
-                        path,
-                    ]
-                )
-            )
-            or _duration_from_samples(
-                _run_kv(
-                    [
-                        "ffprobe",
-                        "-v",
-                        "error",
-                        "-select_streams",
-                        "a:0",
-                        "-show_entries",
-                        "stream=nb_samples,sample_rate",
-                        "-of",
-                        "default=noprint_wrappers=1:nokey=0",
-                        path,
-                    ]
-                )
-            )
-        )
-        if duration:
-            return duration
-        try:
-            res = subprocess.run(
-                ["ffmpeg", "-hide_banner", "-i", path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            output = (res.stderr or b"").decode(errors="ignore") + (res.stdout or b"").decode(errors="ignore")
-            match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", output)
-            if match:
-                hours = int(match.group(1))
-                minutes = int(match.group(2))
-                seconds = float(match.group(3))
-                total = hours * 3600 + minutes * 60 + seconds
-                if total > 0:
-                    return int(round(total))
-        except Exception:
-            return None
-        return None
-    except Exception:
-        return None
+def _inspect_media(db: Session, path: str, sha256: str | None) -> dict | None:
+    """探测音视频元数据；同一 sha256 只探测一次。"""
+    info = lookup_media_info(db, sha256)
+    if info is not None:
+        return info
+    info = inspect_media(path)
+    remember_media_info(sha256, info)
+    return info
 
 
 def _ensure_local_file(r: Resource) -> str:
@@ -351,49 +208,76 @@ def _ensure_local_file(r: Resource) -> str:
         raise not_found()
     if is_oss_enabled():
         return download_oss_to_temp(r.file_id)
-    storage_name = f"{r.file_id}_{r.file_name}"
-    path = os.path.join(settings.UPLOAD_DIR, storage_name)
+    path = local_upload_path(r.file_id, r.file_name)
     if not os.path.exists(path):
         raise not_found()
     return path
 
 
-def _ensure_preview_pdf(r: Resource) -> str:
-    """Convert office documents to PDF for preview, with caching."""
-    os.makedirs(settings.PREVIEW_DIR, exist_ok=True)
-    preview_path = os.path.join(settings.PREVIEW_DIR, f"{r.file_id}.pdf")
-    if os.path.exists(preview_path):
-        return preview_path
-    src_path = _ensure_local_file(r)
+def _image_variant_url(r: Resource, original_url: str, width: int) -> str:
+    if is_oss_enabled():
+        params = {"x-oss-process": oss_process_param(width, "webp")}
+        return generate_oss_signed_url(r.file_id, settings.SIGNED_URL_EXPIRES_SECONDS, params)
+    return f"{original_url}&w={width}"
+
+
+def _request_office_preview(r: Resource) -> str:
     try:
-        subprocess.run([
-            "soffice",
-            "--headless",
-            "--convert-to",
-            "pdf",
-            "--outdir",
-            settings.PREVIEW_DIR,
-            src_path,
-        ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except FileNotFoundError:
-        raise AppError(code="PREVIEW_NOT_AVAILABLE", message="未安装 LibreOffice，无法生成预览", status_code=503)
-    except subprocess.CalledProcessError as e:
-        raise AppError(code="PREVIEW_CONVERT_FAILED", message=f"预览生成失败: {e.stderr.decode(errors='ignore')}", status_code=500)
-
-    if not os.path.exists(preview_path):
-        pdfs = sorted([p for p in os.listdir(settings.PREVIEW_DIR) if p.endswith('.pdf')], reverse=True)
-        if pdfs:
-            preview_path = os.path.join(settings.PREVIEW_DIR, pdfs[0])
-    if not os.path.exists(preview_path):
-        raise AppError(code="PREVIEW_CONVERT_FAILED", message="预览生成失败", status_code=500)
-    return preview_path
+        return request_preview(r.file_id, r.file_name)
+    except JobQueueFull:
+        raise AppError(code="PREVIEW_BUSY", message="预览转换任务繁忙，请稍后重试", status_code=503)
+
+
+def _hls_preview(r: Resource, request: Request, user: User, fallback_url: str) -> dict | None:
+    """
+    切片已完成时返回 hls 预览；未切片（历史数据或切片目录丢失）或 pending 租约已过期时补排任务，
+    本次仍走整文件播放。这里是 GET 请求，不写数据库，状态由切片任务自己更新。
+    """
+    if not settings.HLS_ENABLED:
+        return None
+    if r.hls_status == hls.STATUS_READY and hls.is_available(r.file_id):
+        return {
+            "mode": "hls",
+            "url": hls.master_url(str(request.base_url), r.file_id, user.id),
+            "fallback_url": fallback_url,
+            "mime": hls.PLAYLIST_MEDIA_TYPE,
+            "ext": "m3u8",
+        }
+    if hls.needs_package(r.hls_status, r.hls_pending_since) and not hls.is_pending(r.file_id):
+        try:
+            hls.request_package(r.file_id, r.file_name, r.media_info)
+        except JobQueueFull:
+            pass
+    return None
+
+
+def _video_thumbnails(db: Session, r: Resource, request: Request, user: User) -> dict | None:
+    """
+    视频拖动预览的 WebVTT 缩略图轨（经路径签名访问，VTT 中的雪碧图相对地址沿用同一签名）。
+    尚未生成时（历史数据或目录丢失）补排任务，本次返回 None。
+    """
+    if r.source_type == "url" or not r.file_id or _normalize_ext(r.file_type, r.file_name) not in hls.HLS_EXTS:
+        return None
+    if thumbnails.is_available(r.file_id, r.media_info):
+        info = r.media_info["thumbnails"]
+        return {
+            "vtt": hls.signed_url(str(request.base_url), r.file_id, user.id, f"{hls.THUMBS_PREFIX}{thumbnails.VTT_NAME}"),
+            "interval": info["interval"],
+            "width": info["width"],
+            "height": info["height"],
+        }
+    status = ((r.media_info or {}).get("thumbnails") or {}).get("status")
+    if settings.THUMBNAILS_ENABLED and status != thumbnails.STATUS_FAILED and not thumbnails.is_pending(r.file_id):
+        try:
+            thumbnails.request_thumbnails(r.id, r.file_id, r.file_name, r.media_info)
+        except JobQueueFull:
+            pass
+    return None
 
 
 def _cover_local_path(filename: str) -> Path:
     """本地封面文件存储路径（UPLOAD_DIR/covers/filename）。"""
-    base = Path(settings.UPLOAD_DIR) / "covers"
-    base.mkdir(parents=True, exist_ok=True)
-    return base / filename
+    return local_cover_path(filename)
 
 def _enrich_names(db: Session, r: Resource):
     group = db.query(ProfessionalGroup).filter(ProfessionalGroup.id == r.group_id).first() if r.group_id else None
@@ -515,6 +399,7 @@ def list_resources(
             "created_at": r.created_at.isoformat() if r.created_at else None,
             "published_at": r.published_at.isoformat() if r.published_at else None,
             "cover_url": cover_out,
+            "cover_srcset": _cover_srcset(r, request),
             "duration_seconds": r.duration_seconds,
             "audience": r.audience,
             "owner": None,
@@ -768,6 +653,219 @@ def my_filters(
         },
     )
 
+def _unique_name(name: str, used: set[str]) -> str:
+    """打包条目重名时追加序号：a.pdf -> a (2).pdf。"""
+    candidate, n = name, 1
+    stem, dot, ext = name.rpartition(".")
+    if not dot or "/" in ext:
+        stem, ext = name, ""
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{stem} ({n}).{ext}" if ext else f"{stem} ({n})"
+    used.add(candidate.lower())
+    return candidate
+
+
+def _export_package(db: Session, resources: list[Resource], per_folder: bool) -> tuple[list[dict], dict[str, str]]:
+    """
+    组装打包清单：每个资源的主文件与附件（附件一次 IN 查询取出）。
+    per_folder 时每个资源一个目录；外链资源不下载，写入“外链资源.txt”。
+    """
+    attachments: dict[int, list[ResourceAttachment]] = {}
+    ids = [r.id for r in resources]
+    if ids:
+        for a in (
+            db.query(ResourceAttachment)
+            .filter(ResourceAttachment.resource_id.in_(ids))
+            .order_by(ResourceAttachment.id)
+            .all()
+        ):
+            attachments.setdefault(a.resource_id, []).append(a)
+
+    members: list[dict] = []
+    links: list[str] = []
+    used: set[str] = set()
+    folders: set[str] = set()
+    for r in resources:
+        folder = _unique_name(safe_filename(r.title), folders) + "/" if per_folder else ""
+        if r.source_type == "url":
+            if r.external_url:
+                links.append(f"{r.title}\t{r.external_url}")
+            continue
+        files = []
+        if r.file_id and r.file_name:
+            files.append((folder + safe_filename(r.file_name), r.file_id, r.file_name, r.file_size_bytes))
+        for a in attachments.get(r.id, []):
+            files.append((f"{folder}附件/{safe_filename(a.file_name)}", a.file_id, a.file_name, a.file_size_bytes))
+        for arcname, file_id, file_name, size in files:
+            if not zip_export.source_exists(file_id, file_name):
+                logger.warning("Export: missing file %s", file_id)
+                continue
+            members.append({
+                "arcname": _unique_name(arcname, used),
+                "file_id": file_id,
+                "file_name": file_name,
+                "size": size,
+            })
+    texts = {"外链资源.txt": "\n".join(links) + "\n"} if links else {}
+    return members, texts
+
+
+def _export_user(db: Session, subject: str, exp: int | None, uid: int | None, sig: str | None, user: User | None) -> User:
+    """打包下载由浏览器直接跳转，支持签名链接（exp/uid/sig）或登录态两种方式。"""
+    if sig and exp:
+        if not verify_download_signature(subject, exp, sig, uid):
+            raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+        user = db.query(User).filter(User.id == uid).first() if uid else None
+        if not user:
+            raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+    if not user:
+        raise AppError(code="AUTH_REQUIRED", message="请先登录", status_code=401)
+    return user
+
+
+def _export_signed_url(request: Request, path: str, subject: str, user: User) -> dict:
+    ttl = settings.EXPORT_URL_EXPIRES_SECONDS
+    exp_ts, sig = signed_download(subject, ttl, user.id)
+    base = str(request.base_url).rstrip("/")
+    return {"download_url": f"{base}{path}?exp={exp_ts}&uid={user.id}&sig={sig}", "expires_in": ttl}
+
+
+def _export_response(
+    db: Session,
+    request: Request,
+    user: User,
+    resources: list[Resource],
+    zip_name: str,
+    per_folder: bool,
+):
+    """
+    流式返回 zip：小包边读边打包；达到 EXPORT_CACHE_MIN_MB 的大包首次同样边读边打包，
+    同时在后台构建一份缓存，之后的下载（含断点续传的 Range 请求）直接从缓存文件返回。
+    下载记录批量写入（一次插入 + 一次计数更新），续传请求不重复计数。
+    """
+    members, texts = _export_package(db, resources, per_folder)
+    if not members and not texts:
+        raise AppError(code="RESOURCE_NOT_FOUND", message="没有可下载的文件", status_code=404)
+
+    range_header = request.headers.get("range")
+    if not range_header or range_header.replace(" ", "").startswith("bytes=0-"):
+        logged = sorted({r.id for r in resources})
+        ip = request.client.host if request.client else None
+        ua = request.headers.get("user-agent")
+        db.add_all([DownloadLog(resource_id=i, user_id=user.id, ip=ip, user_agent=ua) for i in logged])
+        db.query(Resource).filter(Resource.id.in_(logged)).update(
+            {Resource.download_count: Resource.download_count + 1}, synchronize_session=False
+        )
+        db.commit()
+
+    disposition = f"attachment; filename*=UTF-8''{quote(safe_filename(zip_name) + '.zip')}"
+    total = sum(m["size"] or 0 for m in members)
+    if zip_export.should_cache(total):
+        digest = zip_export.package_digest(members, texts)
+        path = zip_export.cached_path(digest)
+        if os.path.exists(path):
+            preview_cache.record_hit(path)
+            return FileResponse(
+                path,
+                media_type="application/zip",
+                headers={"Content-Disposition": disposition, "Cache-Control": "private, no-store"},
+            )
+        preview_cache.record_miss()
+        try:
+            zip_export.request_build(digest, members, texts)
+        except JobQueueFull:
+            logger.warning("Export build queue full, streaming %s only", digest)
+    return StreamingResponse(
+        zip_export.stream_zip(members, texts),
+        media_type="application/zip",
+        headers={"Content-Disposition": disposition, "Cache-Control": "private, no-store", "Accept-Ranges": "none"},
+    )
+
+
+def _course_export_resources(db: Session, course_id: int, user: User) -> tuple[Course, list[Resource]]:
+    course = db.query(Course).filter(Course.id == course_id).first()
+    if not course:
+        raise not_found()
+    rows = (
+        db.query(Resource)
+        .filter(Resource.course_id == course_id, Resource.deleted_at.is_(None))
+        .order_by(Resource.id)
+        .all()
+    )
+    resources = [r for r in rows if _calc_can_download(user, r)]
+    if not resources:
+        raise AppError(code="RESOURCE_NOT_FOUND", message="该课程没有可下载的资源", status_code=404)
+    return course, resources
+
+
+@router.get("/export/url")
+def export_course_url(
+    course_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """课程资源打包下载的签名地址（浏览器直接跳转下载，无需携带 Authorization 头）。"""
+    _course_export_resources(db, course_id, user)
+    data = _export_signed_url(request, "/api/v1/resources/export", f"export/course/{course_id}", user)
+    data["download_url"] += f"&course_id={course_id}"
+    return ok(request, data)
+
+
+@router.get("/export")
+def export_course(
+    course_id: int,
+    request: Request,
+    exp: int | None = None,
+    uid: int | None = None,
+    sig: str | None = None,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_optional_user),
+):
+    """把课程下有下载权限的资源（含附件）打成一个 zip 流式返回，每个资源一个目录。"""
+    user = _export_user(db, f"export/course/{course_id}", exp, uid, sig, user)
+    course, resources = _course_export_resources(db, course_id, user)
+    return _export_response(db, request, user, resources, course.name, per_folder=True)
+
+
+def _download_all_resource(db: Session, rid: int, user: User) -> Resource:
+    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
+    if not r:
+        raise not_found()
+    if not _calc_can_download(user, r):
+        raise permission_denied()
+    return r
+
+
+@router.get("/{rid}/download-all/url")
+def download_all_url(
+    rid: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """单个资源“下载全部（含附件）”的签名地址。"""
+    _download_all_resource(db, rid, user)
+    return ok(request, _export_signed_url(request, f"/api/v1/resources/{rid}/download-all", f"export/resource/{rid}", user))
+
+
+@router.get("/{rid}/download-all")
+def download_all(
+    rid: int,
+    request: Request,
+    exp: int | None = None,
+    uid: int | None = None,
+    sig: str | None = None,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_optional_user),
+):
+    """资源主文件与全部附件打成一个 zip 流式返回（附件放在“附件/”目录下）。"""
+    user = _export_user(db, f"export/resource/{rid}", exp, uid, sig, user)
+    r = _download_all_resource(db, rid, user)
+    return _export_response(db, request, user, [r], r.title, per_folder=False)
+
+
 @router.get("/{rid}")
 def get_resource(
     rid: int,
@@ -794,7 +892,7 @@ def get_resource(
     can_publish = can_manage and r.status != "published"
     can_archive = can_manage and r.status == "published"
     status_out = r.status if r.status in ALLOWED_STATUS else "draft"
-    cover_out = _cover_public_url(r, request)
+    cover_out = _cover_public_url(r, request, DERIVATIVE_WIDTHS["detail"])
     r.view_count = (r.view_count or 0) + 1
     db.commit()
     data = {
@@ -819,7 +917,10 @@ def get_resource(
         "created_at": r.created_at.isoformat() if r.created_at else None,
         "published_at": r.published_at.isoformat() if r.published_at else None,
         "cover_url": cover_out,
+        "cover_srcset": _cover_srcset(r, request),
         "duration_seconds": r.duration_seconds,
+        "media": r.media_info,
+        "thumbnails": _video_thumbnails(db, r, request, user),
         "audience": r.audience,
         "attachments": [_attachment_out(a) for a in attachments],
     }
@@ -863,13 +964,13 @@ def preview_resource(
 
     ext = _normalize_ext(r.file_type, r.file_name)
     mime = r.file_mime or "application/octet-stream"
-    raw_type = ((r.file_type or "") + " " + (r.file_mime or "")).lower()
-    if "zip" in raw_type or (r.file_name or "").lower().endswith(".zip"):
-        return ok(request, {"mode": "unsupported", "note": "压缩包暂不支持在线预览，请下载查看", "mime": mime, "ext": "zip"})
     inline_types = {"png", "jpg", "jpeg", "gif", "webp", "pdf", "mp4", "mp3"}
-    office_types = {"pptx", "docx", "xlsx"}
-    if ext == "zip":
-        return ok(request, {"mode": "unsupported", "note": "压缩包暂不支持在线预览，请下载查看", "mime": mime, "ext": ext})
+    if _is_zip(r):
+        if r.source_type == "url" or not r.file_id:
+            return ok(request, {"mode": "unsupported", "note": "压缩包暂不支持在线预览，请下载查看", "mime": mime, "ext": "zip"})
+        # 压缩包：浏览目录清单，按需解压单个文件
+        url = f"{str(request.base_url).rstrip('/')}/api/v1/resources/{rid}/zip"
+        return ok(request, {"mode": "archive", "url": url, "mime": mime, "ext": "zip"})
 
     # 外链资源直接跳转
     # 外链资源：可直接内嵌展示的类型
@@ -891,35 +992,309 @@ def preview_resource(
         if is_oss_enabled():
             preview_url = generate_oss_signed_url(r.file_id, settings.SIGNED_URL_EXPIRES_SECONDS)
         else:
-            exp_ts = int(datetime.now(timezone.utc).timestamp()) + settings.SIGNED_URL_EXPIRES_SECONDS
-            sig = sign_download(r.file_id, exp_ts, user.id)
+            exp_ts, sig = signed_download(r.file_id, settings.SIGNED_URL_EXPIRES_SECONDS, user.id)
             base = str(request.base_url).rstrip("/")
             preview_url = f"{base}/api/v1/files/signed/{r.file_id}?exp={exp_ts}&uid={user.id}&sig={sig}&inline=1"
         if stream:
             # 直接回源文件
             path = _ensure_local_file(r)
             return FileResponse(path, media_type=mime, filename=r.file_name)
+        if ext in IMAGE_DERIVATIVE_EXTS:
+            # 图片默认给详情尺寸的衍生图，原图通过 original_url 访问
+            sized = {w: _image_variant_url(r, preview_url, w) for w in sorted(DERIVATIVE_WIDTHS.values())}
+            return ok(
+                request,
+                {
+                    "mode": "inline",
+                    "url": sized[DERIVATIVE_WIDTHS["detail"]],
+                    "original_url": preview_url,
+                    "srcset": ", ".join(f"{u} {w}w" for w, u in sized.items()),
+                    "mime": mime,
+                    "ext": ext,
+                },
+            )
+        if ext in hls.HLS_EXTS:
+            video_extra = {
+                "poster": _cover_public_url(r, request, DERIVATIVE_WIDTHS["detail"]),
+                "thumbnails": _video_thumbnails(db, r, request, user),
+            }
+            hls_payload = _hls_preview(r, request, user, preview_url)
+            if hls_payload:
+                return ok(request, {**hls_payload, **video_extra})
+            return ok(request, {"mode": "inline", "url": preview_url, "mime": mime, "ext": ext, **video_extra})
+        if ext == "pdf":
+            return ok(request, {"mode": "inline", "url": preview_url, "mime": mime, "ext": ext, "page_images": True})
         return ok(request, {"mode": "inline", "url": preview_url, "mime": mime, "ext": ext})
 
-    if ext in office_types:
-        pdf_path = _ensure_preview_pdf(r)
+    if ext in OFFICE_EXTS:
+        status = _request_office_preview(r)
         if stream:
-            return FileResponse(pdf_path, media_type="application/pdf", filename=f"{r.file_name}.pdf")
+            if status == STATUS_PENDING:
+                preview_cache.record_miss()
+                status = wait_preview(r.file_id, settings.PREVIEW_WAIT_SECONDS)
+            elif status == STATUS_READY:
+                preview_cache.record_hit(preview_pdf_path(r.file_id))
+            if status == STATUS_READY:
+                # 先更新为最近访问，容量淘汰会先删更旧的条目；判断就绪后仍被淘汰时
+                # 重新排队转换并按生成中返回，而不是让 FileResponse 因文件不存在报 500
+                pdf_path = preview_pdf_path(r.file_id)
+                preview_cache.touch(pdf_path)
+                if os.path.exists(pdf_path):
+                    return FileResponse(pdf_path, media_type="application/pdf", filename=f"{r.file_name}.pdf")
+                _request_office_preview(r)
+                status = STATUS_PENDING
+            if status == STATUS_PENDING:
+                raise AppError(code="PREVIEW_PENDING", message="预览生成中，请稍后重试", status_code=503)
+            raise AppError(
+                code="PREVIEW_CONVERT_FAILED",
+                message=preview_failure(r.file_id) or "预览生成失败",
+                status_code=500,
+            )
         preview_stream_url = f"{str(request.base_url).rstrip('/')}/api/v1/resources/{rid}/preview?stream=1"
+        notes = {
+            STATUS_READY: "已转换为 PDF 预览",
+            STATUS_PENDING: "正在生成 PDF 预览",
+            STATUS_FAILED: preview_failure(r.file_id) or "预览生成失败",
+        }
         return ok(
             request,
             {
                 "mode": "pdf_preview",
+                "status": status,
                 "url": preview_stream_url,
                 "mime": "application/pdf",
                 "ext": "pdf",
-                "note": "已转换为 PDF 预览",
+                "note": notes[status],
+                "page_images": status == STATUS_READY,
             },
         )
 
     return ok(request, {"mode": "unsupported", "note": "暂不支持在线预览，请下载查看", "mime": mime, "ext": ext})
 
 
+def _pdf_source(r: Resource) -> tuple[str | None, str]:
+    """分页预览的 PDF 来源：原生 PDF 直接使用，办公文档使用转换后的预览 PDF（未就绪时返回状态）。"""
+    ext = _normalize_ext(r.file_type, r.file_name)
+    if r.source_type == "url" or not r.file_id or not r.file_name:
+        raise not_found()
+    if ext in OFFICE_EXTS:
+        status = _request_office_preview(r)
+        return (preview_pdf_path(r.file_id) if status == STATUS_READY else None), status
+    if ext == "pdf":
+        try:
+            return pdf_pages.native_pdf_path(r.file_id, r.file_name), STATUS_READY
+        except pdf_pages.PdfPageError as e:
+            raise AppError(code="RESOURCE_NOT_FOUND", message=str(e), status_code=404)
+    raise AppError(code="PREVIEW_NOT_SUPPORTED", message="该资源不支持分页预览", status_code=400)
+
+
+@router.get("/{rid}/preview/pages")
+def preview_pages(
+    rid: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    分页预览清单：页数、每页尺寸（pt）与页图地址模板。
+    页图地址带签名，可直接用于 img 标签并被浏览器缓存；{n} 为页码（从 1 开始），{zoom} 为 sm/lg。
+    """
+    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
+    if not r:
+        raise not_found()
+    if user.role != "admin" and not (r.status == "published" or r.owner_user_id == user.id):
+        raise permission_denied()
+
+    pdf_path, status = _pdf_source(r)
+    if status != STATUS_READY:
+        note = (preview_failure(r.file_id) or "预览生成失败") if status == STATUS_FAILED else "正在生成 PDF 预览"
+        return ok(request, {"status": status, "note": note})
+    try:
+        info = pdf_pages.manifest(r.file_id, pdf_path)
+    except pdf_pages.PdfPageError as e:
+        raise AppError(code="PREVIEW_CONVERT_FAILED", message=str(e), status_code=500)
+
+    exp_ts, sig = signed_download(pdf_pages.signature_subject(r.file_id), settings.PREVIEW_PAGE_URL_EXPIRES_SECONDS, user.id)
+    base = f"{str(request.base_url).rstrip('/')}/api/v1/resources/{rid}/preview/pages"
+    return ok(
+        request,
+        {
+            "status": STATUS_READY,
+            "page_count": info["page_count"],
+            "pages": [{"n": i + 1, "width": w, "height": h} for i, (w, h) in enumerate(info["pages"])],
+            "zooms": pdf_pages.ZOOM_WIDTHS,
+            "url_template": f"{base}/{{n}}?zoom={{zoom}}&exp={exp_ts}&uid={user.id}&sig={sig}",
+        },
+    )
+
+
+@router.get("/{rid}/preview/pages/{n}")
+def preview_page_image(
+    rid: int,
+    n: int,
+    zoom: str = pdf_pages.DEFAULT_ZOOM,
+    exp: int | None = None,
+    uid: int | None = None,
+    sig: str | None = None,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_optional_user),
+):
+    """第 n 页的 WebP 页图，按需渲染并缓存。支持清单中的签名地址，或携带登录凭证访问。"""
+    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
+    if not r:
+        raise not_found()
+    if sig and exp:
+        if not r.file_id or not verify_download_signature(pdf_pages.signature_subject(r.file_id), exp, sig, uid):
+            raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+    else:
+        if not user:
+            raise AppError(code="AUTH_REQUIRED", message="请先登录", status_code=401)
+        if user.role != "admin" and not (r.status == "published" or r.owner_user_id == user.id):
+            raise permission_denied()
+
+    pdf_path, status = _pdf_source(r)
+    if status != STATUS_READY:
+        raise AppError(code="PREVIEW_PENDING", message="预览生成中，请稍后重试", status_code=503)
+    try:
+        path = pdf_pages.page_image(r.file_id, pdf_path, n, zoom)
+    except IndexError:
+        raise not_found()
+    except pdf_pages.PdfPageError as e:
+        raise AppError(code="PREVIEW_CONVERT_FAILED", message=str(e), status_code=500)
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        headers={"Cache-Control": f"private, max-age={settings.PREVIEW_PAGE_URL_EXPIRES_SECONDS}"},
+    )
+
+
+def _is_zip(r: Resource) -> bool:
+    raw_type = ((r.file_type or "") + " " + (r.file_mime or "")).lower()
+    return _normalize_ext(r.file_type, r.file_name) == "zip" or "zip" in raw_type
+
+
+def _zip_resource(r: Resource) -> None:
+    if r.source_type == "url" or not r.file_id or not r.file_name:
+        raise not_found()
+    if not _is_zip(r):
+        raise AppError(code="PREVIEW_NOT_SUPPORTED", message="该资源不是压缩包", status_code=400)
+
+
+def _zip_listing(r: Resource) -> dict:
+    try:
+        return zip_inspect.listing(r.file_id, r.file_name, r.file_sha256)
+    except zip_inspect.ZipTooManyEntries as e:
+        raise AppError(code="ZIP_UNSUPPORTED", message=str(e), status_code=400)
+    except zip_inspect.ZipInspectError as e:
+        raise AppError(code="PREVIEW_CONVERT_FAILED", message=str(e), status_code=500)
+
+
+@router.get("/{rid}/zip")
+def zip_entries(
+    rid: int,
+    request: Request,
+    path: str = "",
+    page: int = 1,
+    page_size: int = 100,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    压缩包目录浏览：只读取中央目录，不解压。返回 path 下的直接子项（分页）与单个文件的签名下载地址模板，
+    {path} 为成员路径（需 URL 编码）。
+    """
+    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
+    if not r:
+        raise not_found()
+    if user.role != "admin" and not (r.status == "published" or r.owner_user_id == user.id):
+        raise permission_denied()
+    _zip_resource(r)
+    if page < 1 or page_size < 1 or page_size > 500:
+        raise validation_error("分页参数不合法", {"page": page, "page_size": page_size})
+
+    data = _zip_listing(r)
+    result = zip_inspect.children(data, path, page, page_size)
+    exp_ts, sig = signed_download(zip_inspect.signature_subject(r.file_id), settings.PREVIEW_PAGE_URL_EXPIRES_SECONDS, user.id)
+    base = f"{str(request.base_url).rstrip('/')}/api/v1/resources/{rid}/zip/member"
+    return ok(
+        request,
+        {
+            **result,
+            "entry_count": len(data["entries"]),
+            "total_size": sum(e["size"] for e in data["entries"]),
+            "truncated": data["truncated"],
+            "can_download": _calc_can_download(user, r),
+            "member_url_template": f"{base}?path={{path}}&exp={exp_ts}&uid={user.id}&sig={sig}",
+        },
+    )
+
+
+@router.get("/{rid}/zip/member")
+def zip_member(
+    rid: int,
+    path: str,
+    inline: bool = False,
+    exp: int | None = None,
+    uid: int | None = None,
+    sig: str | None = None,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_optional_user),
+):
+    """
+    解压并流式返回压缩包中的单个文件，只读取该成员的字节区间（OSS 为 Range 请求）。
+    图片、PDF、文本等可内嵌查看（inline=1）；以附件形式保存需要资源的下载权限。
+    """
+    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
+    if not r:
+        raise not_found()
+    if sig and exp:
+        if not r.file_id or not verify_download_signature(zip_inspect.signature_subject(r.file_id), exp, sig, uid):
+            raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+        user = db.query(User).filter(User.id == uid).first() if uid else None
+        if not user:
+            raise AppError(code="AUTH_REQUIRED", message="签名链接无效或已过期", status_code=401)
+    else:
+        if not user:
+            raise AppError(code="AUTH_REQUIRED", message="请先登录", status_code=401)
+        if user.role != "admin" and not (r.status == "published" or r.owner_user_id == user.id):
+            raise permission_denied()
+    _zip_resource(r)
+
+    entry = zip_inspect.find_entry(_zip_listing(r), path)
+    if entry is None:
+        raise AppError(code="RESOURCE_NOT_FOUND", message="压缩包中不存在该文件", status_code=404)
+    if entry["encrypted"]:
+        raise AppError(code="ZIP_ENCRYPTED", message="该文件已加密，无法在线解压", status_code=400)
+    name = entry["path"].rsplit("/", 1)[-1]
+    mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    inline = inline and mime in zip_inspect.INLINE_MIMES
+    if not inline and not _calc_can_download(user, r):
+        raise permission_denied()
+    if mime.startswith("text/"):
+        mime = f"{mime}; charset=utf-8"
+
+    # 在发出 200 与 Content-Length 之前打开成员，读取或解压失败时仍能返回正确的错误状态码
+    try:
+        reader = zip_inspect.open_member(r.file_id, r.file_name, entry["name"])
+    except zip_inspect.ZipNotFound as e:
+        raise AppError(code="RESOURCE_NOT_FOUND", message=str(e), status_code=404)
+    except zip_inspect.ZipUnavailable as e:
+        raise AppError(code="STORAGE_UNAVAILABLE", message=str(e), status_code=503)
+    except zip_inspect.ZipInspectError as e:
+        raise AppError(code="ZIP_UNSUPPORTED", message=str(e), status_code=400)
+
+    disposition = "inline" if inline else "attachment"
+    return StreamingResponse(
+        zip_inspect.stream_member(reader),
+        media_type=mime,
+        headers={
+            "Content-Length": str(entry["size"]),
+            "Content-Disposition": f"{disposition}; filename*=UTF-8''{quote(name)}",
+            "X-Content-Type-Options": "nosniff",
+        },
+    )
+
+
 @router.post("/{rid}/cover")
 def upload_cover(
     rid: int,
@@ -934,7 +1309,7 @@ def upload_cover(
     if user.role != "admin" and not (r.owner_user_id == user.id and r.status == "draft"):
         raise permission_denied()
 
-    filename = _safe_filename(file.filename or "cover")
+    filename = safe_filename(file.filename or "cover")
     ext = filename.split(".")[-1].lower() if "." in filename else ""
     if ext not in {"png", "jpg", "jpeg"}:
         raise AppError(code="COVER_TYPE_NOT_ALLOWED", message="封面仅支持 png/jpg", status_code=415)
@@ -954,8 +1329,14 @@ def upload_cover(
             _, _ = save_file_local(file.file, str(storage_path), max_bytes)
         except ValueError:
             raise AppError(code="FILE_TOO_LARGE", message="封面过大", status_code=413)
+        try:
+            generate_image_derivatives(str(storage_path), str(storage_path.parent), storage_path.stem)
+        except Exception:
+            # 生成失败不影响上传，访问时会按需重试
+            logger.warning("Cover derivatives failed for %s", storage_name, exc_info=True)
         r.cover_url = f"local:{storage_name}"
     db.commit()
+    invalidate_cover(rid)
     return ok(request, {"cover_url": _cover_public_url(r, request)})
 
 
@@ -964,28 +1345,72 @@ def get_cover_file(
     rid: int,
     file: str,
     request: Request,
+    w: int | None = None,
+    fmt: str | None = None,
     db: Session = Depends(get_db),
     user: User | None = Depends(get_optional_user),
 ):
-    r = db.query(Resource).filter(Resource.id == rid, Resource.deleted_at.is_(None)).first()
-    if not r:
+    """
+    本地封面文件。传 w 时返回对齐到标准宽度（thumb/card/detail）的衍生图，缺失时按需生成；
+    fmt 为 webp/jpeg，未指定时按 Accept 协商。
+    封面文件名含 uuid、内容永不变化，按 immutable 长期缓存；确认资源未删除且封面仍是该文件后，
+    带 If-None-Match 的条件请求直接返回 304，热点的小文件从进程内 LRU 返回，不再读盘。
+    归属校验的结果在进程内缓存 COVER_CHECK_TTL_SECONDS，热点请求不查库。
+    """
+    if not file or any(part in file for part in ("/", "\\", "..")):
         raise not_found()
     # 封面为低敏感内容，允许公开访问；如需收紧可改为仅已发布或校验签名
-    if not r.cover_url or not r.cover_url.startswith("local:"):
-        raise not_found()
-    filename = r.cover_url.replace("local:", "", 1)
-    if not file or file != filename:
-        raise not_found()
-    if any(part in file for part in ("/", "\\", "..")):
-        raise not_found()
+    if not cover_checks.passed((rid, file)):
+        exists = (
+            db.query(Resource.id)
+            .filter(Resource.id == rid, Resource.deleted_at.is_(None), Resource.cover_url == f"local:{file}")
+            .first()
+        )
+        if not exists:
+            invalidate_cover(rid)
+            raise not_found()
+        cover_checks.add((rid, file))
+    width = pick_width(w) if w else None
+    out_fmt = negotiate_format(fmt, request.headers.get("accept")) if w else None
+    vary = {"Vary": "Accept"} if w and fmt not in IMAGE_FORMATS else {}
+    etag = _cover_etag(file, width, out_fmt)
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": COVER_CACHE_CONTROL, **vary})
+    hot = cover_cache.get((rid, file, width, out_fmt))
+    if hot is not None:
+        data, meta = hot
+        return Response(data, media_type=meta["media_type"], headers=meta["headers"])
+
     base = _cover_local_path("").resolve()
-    path = _cover_local_path(filename).resolve()
+    path = _cover_local_path(file).resolve()
     if base not in path.parents and path != base:
         raise not_found()
     if not path.exists():
         raise not_found()
-    mime = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
-    return FileResponse(str(path), media_type=mime, filename=path.name)
+    served = None
+    if w:
+        variant = path.parent / derivative_name(path.stem, width, out_fmt)
+        try:
+            if not variant.exists():
+                make_image_derivative(str(path), str(variant), width, out_fmt)
+            served = (variant, image_media_type(out_fmt), {"ETag": etag, **vary})
+        except Exception:
+            logger.warning("Cover derivative failed for %s", file, exc_info=True)
+    fallback = served is None and bool(w)
+    if served is None:
+        mime = "image/png" if path.suffix.lower() == ".png" else "image/jpeg"
+        served = (path, mime, {"ETag": _cover_etag(file, None, None)})
+    served_path, media_type, headers = served
+    if fallback:
+        # 不进热点缓存，下次请求会重试生成衍生图
+        headers["Cache-Control"] = COVER_FALLBACK_CACHE_CONTROL
+        return FileResponse(str(served_path), media_type=media_type, headers=headers)
+    headers["Cache-Control"] = COVER_CACHE_CONTROL
+    if served_path.stat().st_size <= cover_cache.max_item_bytes:
+        data = served_path.read_bytes()
+        cover_cache.put((rid, file, width, out_fmt), data, {"media_type": media_type, "headers": headers})
+        return Response(data, media_type=media_type, headers=headers)
+    return FileResponse(str(served_path), media_type=media_type, headers=headers)
 
 
 @router.post("")
@@ -1005,14 +1430,14 @@ def create_resource(
     if payload.source_type == "url":
         if not payload.external_url:
             raise validation_error("外链模式必须提供 external_url")
-        _validate_external_url(payload.external_url)
+        validate_external_url(payload.external_url)
     if payload.source_type == "upload" and payload.external_url:
         raise validation_error("上传模式下 external_url 必须为空")
 
     status_val = payload.status or "draft"
     if status_val not in ALLOWED_STATUS:
         status_val = "draft"
-    cover_val = payload.cover_url or _default_cover(payload.resource_type)
+    cover_val = payload.cover_url or default_cover(payload.resource_type)
     duration_source = "manual" if payload.duration_seconds is not None else None
 
     course_id = payload.course_id
@@ -1100,7 +1525,7 @@ def patch_resource(
         new_external = update_data.get("external_url", r.external_url)
         if not new_external:
             raise validation_error("外链模式必须提供 external_url")
-        _validate_external_url(new_external)
+        validate_external_url(new_external)
     if new_source_type == "upload" and update_data.get("external_url"):
         raise validation_error("上传模式下 external_url 必须为空")
     if "course_name" in update_data:
@@ -1156,17 +1581,25 @@ def patch_resource(
         is_media = ext in {"mp4", "mp3", "wav", "m4a"} or mime.startswith(("video/", "audio/"))
         if is_media:
             try:
-                local_path = _ensure_local_file(r)
-                detected = _probe_duration(local_path)
-                if detected:
-                    r.duration_seconds = detected
-                    r.duration_source = "auto"
-                if is_oss_enabled():
-                    Path(local_path).unlink(missing_ok=True)
+                info = lookup_media_info(db, r.file_sha256)
+                if info is None:
+                    local_path = _ensure_local_file(r)
+                    try:
+                        info = _inspect_media(db, local_path, r.file_sha256)
+                    finally:
+                        if is_oss_enabled():
+                            Path(local_path).unlink(missing_ok=True)
+                if info:
+                    r.media_info = info
+                    if info.get("duration_seconds"):
+                        r.duration_seconds = info["duration_seconds"]
+                        r.duration_source = "auto"
             except Exception:
                 pass
 
     db.commit()
+    if "cover_url" in update_data:
+        invalidate_cover(r.id)
     return ok(request, {"id": r.id, "status": r.status})
 
 
@@ -1185,9 +1618,9 @@ def upload_file(
     if user.role != "admin" and not (r.owner_user_id == user.id and r.status == "draft"):
         raise permission_denied()
 
-    filename = _safe_filename(file.filename or "file")
+    filename = safe_filename(file.filename or "file")
     ext = filename.split(".")[-1].lower() if "." in filename else ""
-    if ext not in _allowed_exts():
+    if ext not in allowed_exts():
         raise AppError(code="FILE_TYPE_NOT_ALLOWED", message="文件类型不允许上传", status_code=415)
 
     max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
@@ -1199,11 +1632,21 @@ def upload_file(
     )
 
     file_id = f"file_{uuid.uuid4().hex}"
-    detected_duration: int | None = None
+    old_file_id = r.file_id
+    old_is_video = _normalize_ext(None, r.file_name) in hls.HLS_EXTS
+    media_info: dict | None = None
+    needs_remux = False
     if is_oss_enabled():
         key = f"{file_id}_{filename}"
         try:
-            size, sha = save_file_oss(file.file, key)
+            if is_media:
+                # 音视频先落地到本地临时文件：探测时长后再上传，避免上传完再从 OSS 整体拉回
+                with spool_upload(file.file, max_bytes, suffix=f".{ext}") as (spool_path, size, sha):
+                    media_info = _inspect_media(db, spool_path, sha)
+                    needs_remux = ext in FASTSTART_EXTS and needs_faststart(spool_path)
+                    save_path_oss(spool_path, key)
+            else:
+                size, sha = save_file_oss(file.file, key)
         except ValueError:
             raise AppError(code="FILE_TOO_LARGE", message="文件过大", status_code=413)
         r.file_id = key
@@ -1211,13 +1654,6 @@ def upload_file(
         r.file_size_bytes = size
         r.file_mime = file.content_type
         r.file_sha256 = sha
-        if is_media:
-            try:
-                local_path = download_oss_to_temp(key)
-                detected_duration = _probe_duration(local_path)
-                Path(local_path).unlink(missing_ok=True)
-            except Exception:
-                detected_duration = None
     else:
         Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
         storage_name = f"{file_id}_{filename}"
@@ -1232,8 +1668,15 @@ def upload_file(
         r.file_mime = file.content_type
         r.file_sha256 = sha
         if is_media:
-            detected_duration = _probe_duration(str(storage_path))
-
+            media_info = _inspect_media(db, str(storage_path), sha)
+            needs_remux = ext in FASTSTART_EXTS and needs_faststart(str(storage_path))
+
+    if media_info and ext in FASTSTART_EXTS:
+        media_info = {**media_info, "faststart": not needs_remux}
+    r.media_info = media_info if is_media else None
+    r.hls_status = None
+    r.hls_pending_since = None
+    detected_duration = (media_info or {}).get("duration_seconds")
     if is_media:
         if detected_duration and detected_duration > 0:
             r.duration_seconds = detected_duration
@@ -1247,6 +1690,12 @@ def upload_file(
         r.duration_source = None
     db.commit()
 
+    if old_file_id and old_file_id != r.file_id:
+        preview_cache.remove_file(old_file_id)
+        if old_is_video:
+            hls.remove(old_file_id)
+    enqueue_file_jobs(db, r, ext, needs_remux)
+
     return ok(
         request,
         {
@@ -1259,6 +1708,7 @@ def upload_file(
             },
             "status": r.status,
             "duration_seconds": r.duration_seconds,
+            "media": r.media_info,
         },
     )
 
@@ -1278,9 +1728,9 @@ def upload_attachment(
     if user.role != "admin" and not (r.owner_user_id == user.id and r.status == "draft"):
         raise permission_denied()
 
-    filename = _safe_filename(file.filename or "file")
+    filename = safe_filename(file.filename or "file")
     ext = filename.split(".")[-1].lower() if "." in filename else ""
-    if ext not in _allowed_exts():
+    if ext not in allowed_exts():
         raise AppError(code="FILE_TYPE_NOT_ALLOWED", message="文件类型不允许上传", status_code=415)
 
     max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
@@ -1344,8 +1794,7 @@ def download_attachment(
     if is_oss_enabled():
         download_url = generate_oss_signed_url(attachment.file_id, settings.SIGNED_URL_EXPIRES_SECONDS)
     else:
-        exp_ts = int(datetime.now(timezone.utc).timestamp()) + settings.SIGNED_URL_EXPIRES_SECONDS
-        sig = sign_download(attachment.file_id, exp_ts, user.id)
+        exp_ts, sig = signed_download(attachment.file_id, settings.SIGNED_URL_EXPIRES_SECONDS, user.id)
         base = str(request.base_url).rstrip("/")
         download_url = f"{base}/api/v1/files/signed/{attachment.file_id}?exp={exp_ts}&uid={user.id}&sig={sig}"
     return ok(request, {"download_url": download_url, "expires_in": settings.SIGNED_URL_EXPIRES_SECONDS})
@@ -1484,6 +1933,10 @@ def delete_resource(
         )
     )
     db.commit()
+    invalidate_cover(r.id)
+    preview_cache.remove_file(r.file_id)
+    if _normalize_ext(None, r.file_name) in hls.HLS_EXTS:
+        hls.remove(r.file_id)
     return no_content()
 
 
@@ -1519,8 +1972,7 @@ def download_resource(
         download_url = generate_oss_signed_url(r.file_id, settings.SIGNED_URL_EXPIRES_SECONDS)
         return ok(request, {"download_url": download_url, "expires_in": settings.SIGNED_URL_EXPIRES_SECONDS})
 
-    exp_ts = int(datetime.now(timezone.utc).timestamp()) + settings.SIGNED_URL_EXPIRES_SECONDS
-    sig = sign_download(r.file_id, exp_ts, user.id)
+    exp_ts, sig = signed_download(r.file_id, settings.SIGNED_URL_EXPIRES_SECONDS, user.id)
     base = str(request.base_url).rstrip("/")
     download_url = f"{base}/api/v1/files/signed/{r.file_id}?exp={exp_ts}&uid={user.id}&sig={sig}"
     return ok(request, {"download_url": download_url, "expires_in": settings.SIGNED_URL_EXPIRES_SECONDS})
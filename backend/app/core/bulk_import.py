@@ -0,0 +1,756 @@
+"""
+资源批量导入：清单（CSV/XLSX）+ 文件来源（zip 压缩包或目录）。
+
+流程：
+1. 读取清单并逐行校验（必填项、专业/类型/状态、文件是否存在、扩展名与大小），专业按名称一次性解析；
+   默认任意一行有误即不导入任何数据，只返回逐行报告。
+2. 多线程并行把文件写入存储（同时计算 sha256、探测音视频），封面一并写入并生成衍生图。
+3. 资源按批（BULK_IMPORT_CHUNK_SIZE）批量插入，每批一个事务：该批用到的课程与标签按名称批量查询、
+   缺失的在同一事务中创建；失败的批次回滚并清理已写入的文件，不影响其他批次。
+
+管理后台接口以后台任务执行（submit_job / get_job）：上传的清单与压缩包先存入 BULK_IMPORT_DIR/{任务 id}/，
+任务状态与报告写入 BULK_IMPORT_DIR/{任务 id}.json，任一 worker 都能查询。
+
+命令行用法（在 backend 目录下）：
+    python -m app.core.bulk_import 清单.xlsx 文件.zip --owner admin [--dry-run] [--skip-invalid]
+"""
+import argparse
+import csv
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.errors import AppError
+from app.core.faststart import FASTSTART_EXTS, needs_faststart
+from app.core.images import generate_all as generate_image_derivatives
+from app.core.jobs import JobPool
+from app.core.media import inspect_media, lookup_media_info, remember_media_info
+from app.core.resource_files import (
+    RESOURCE_TYPES,
+    allowed_exts,
+    default_cover,
+    enqueue_file_jobs,
+    safe_filename,
+    validate_external_url,
+)
+from app.core.storage import (
+    delete_oss_keys,
+    is_oss_enabled,
+    local_cover_path,
+    local_upload_path,
+    save_file_local,
+    save_path_oss,
+    spool_upload,
+)
+from app.core.zip_inspect import display_name
+from app.models.meta import Course, IdeologyTag, Major
+from app.models.resource import Resource, resource_tags
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 清单列名（支持中英文表头）
+COLUMNS = {
+    "title": ("title", "标题", "资源名称"),
+    "abstract": ("abstract", "简介", "摘要"),
+    "major": ("major", "专业"),
+    "course": ("course", "课程"),
+    "tags": ("tags", "标签", "思政标签"),
+    "resource_type": ("resource_type", "type", "类型", "资源类型"),
+    "file": ("file", "文件", "文件路径"),
+    "cover": ("cover", "封面"),
+    "external_url": ("external_url", "url", "外链", "链接"),
+    "audience": ("audience", "面向人群"),
+    "status": ("status", "状态"),
+    "duration_seconds": ("duration_seconds", "时长", "时长（秒）"),
+}
+_HEADER_ALIASES = {alias.lower(): field for field, aliases in COLUMNS.items() for alias in aliases}
+_STATUS_ALIASES = {"draft": "draft", "草稿": "draft", "published": "published", "发布": "published", "已发布": "published"}
+_TAG_SEPARATORS = (";", "；", ",", "，", "、", "|")
+MEDIA_EXTS = {"mp4", "mp3", "wav", "m4a"}
+COVER_EXTS = {"png", "jpg", "jpeg"}
+COVER_MAX_BYTES = 10 * 1024 * 1024
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+_JOB_RETENTION_SECONDS = 7 * 86400
+
+# 导入本身已多线程写入存储，同一时间只执行一个导入任务
+import_jobs = JobPool("import", 1, 4)
+
+
+class BulkImportError(Exception):
+    pass
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _map_header(header: list) -> list[str | None]:
+    fields = [_HEADER_ALIASES.get(_cell(h).lower()) for h in header]
+    if "title" not in fields or "major" not in fields:
+        raise BulkImportError("清单缺少必需的列：标题(title)、专业(major)")
+    return fields
+
+
+def _rows_from(records, max_rows: int) -> list[dict]:
+    it = iter(records)
+    try:
+        fields = _map_header(list(next(it)))
+    except StopIteration:
+        raise BulkImportError("清单为空")
+    rows = []
+    for line_no, record in enumerate(it, start=2):
+        values = {f: _cell(v) for f, v in zip(fields, record) if f}
+        if not any(values.values()):
+            continue
+        if len(rows) >= max_rows:
+            raise BulkImportError(f"清单超过 {max_rows} 行上限，请拆分后导入")
+        rows.append({"row": line_no, **values})
+    return rows
+
+
+def read_manifest(path: str, max_rows: int | None = None) -> list[dict]:
+    """读取 CSV（UTF-8 或 GBK）或 XLSX 清单，返回带行号的字典列表；空行跳过。"""
+    max_rows = max_rows or settings.BULK_IMPORT_MAX_ROWS
+    suffix = Path(path).suffix.lower()
+    if suffix == ".xlsx":
+        try:
+            import openpyxl
+        except ImportError:
+            raise BulkImportError("服务器未安装 openpyxl，无法读取 XLSX 清单，请改用 CSV")
+        try:
+            wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        except Exception as exc:
+            raise BulkImportError(f"XLSX 清单无法读取: {exc}")
+        try:
+            return _rows_from(wb.worksheets[0].iter_rows(values_only=True), max_rows)
+        finally:
+            wb.close()
+    if suffix == ".csv":
+        for encoding in ("utf-8-sig", "gbk"):
+            try:
+                with open(path, newline="", encoding=encoding) as f:
+                    return _rows_from(csv.reader(f), max_rows)
+            except UnicodeDecodeError:
+                continue
+        raise BulkImportError("CSV 清单编码无法识别，请保存为 UTF-8")
+    raise BulkImportError("清单仅支持 CSV 或 XLSX")
+
+
+def _norm_name(name: str) -> str:
+    name = name.strip().replace("\\", "/").lstrip("/")
+    while name.startswith("./"):
+        name = name[2:]
+    return name
+
+
+class FileSource:
+    """清单中 文件/封面 列引用的文件来源：zip 压缩包（支持 GBK 文件名）或服务器上的目录，按相对路径查找。"""
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._is_zip = bool(path) and os.path.isfile(path)
+        self._members: dict[str, zipfile.ZipInfo] = {}
+        self._local = threading.local()
+        self._handles: list[zipfile.ZipFile] = []
+        self._lock = threading.Lock()
+        if self._is_zip:
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    for info in zf.infolist():
+                        if not info.is_dir():
+                            self._members[_norm_name(display_name(info))] = info
+            except zipfile.BadZipFile:
+                raise BulkImportError("文件压缩包已损坏或不是 zip 格式")
+        elif path and not os.path.isdir(path):
+            raise BulkImportError("文件来源不存在")
+
+    def _dir_path(self, name: str) -> Path | None:
+        root = Path(self.path).resolve()
+        path = (root / name).resolve()
+        return path if root in path.parents and path.is_file() else None
+
+    def size(self, name: str) -> int | None:
+        """文件大小；不存在时返回 None。"""
+        name = _norm_name(name)
+        if not self.path:
+            return None
+        if self._is_zip:
+            info = self._members.get(name)
+            return info.file_size if info else None
+        path = self._dir_path(name)
+        return path.stat().st_size if path else None
+
+    def open(self, name: str):
+        name = _norm_name(name)
+        if not self._is_zip:
+            return open(self._dir_path(name), "rb")
+        # ZipFile 的解压不宜跨线程共享，每个工作线程各自打开一个句柄
+        zf = getattr(self._local, "zf", None)
+        if zf is None:
+            zf = zipfile.ZipFile(self.path)
+            self._local.zf = zf
+            with self._lock:
+                self._handles.append(zf)
+        return zf.open(self._members[name])
+
+    def close(self) -> None:
+        with self._lock:
+            for zf in self._handles:
+                zf.close()
+            self._handles.clear()
+
+
+def _resource_type(value: str) -> str | None:
+    if not value:
+        return "doc"
+    if value in RESOURCE_TYPES:
+        return value
+    return next((k for k, label in RESOURCE_TYPES.items() if label == value), None)
+
+
+def _split_tags(value: str) -> list[str]:
+    for sep in _TAG_SEPARATORS[1:]:
+        value = value.replace(sep, _TAG_SEPARATORS[0])
+    return list(dict.fromkeys(t.strip() for t in value.split(_TAG_SEPARATORS[0]) if t.strip()))
+
+
+def _plan_rows(db: Session, rows: list[dict], source: FileSource) -> list[dict]:
+    """逐行校验并生成导入计划；每行的 errors 为空即有效。专业一次查询全部解析。"""
+    majors_by_name: dict[str, list[Major]] = {}
+    majors_by_id: dict[str, Major] = {}
+    for m in db.query(Major).filter(Major.is_active.is_(True)).all():
+        majors_by_name.setdefault(m.name, []).append(m)
+        majors_by_id[str(m.id)] = m
+    allowed = allowed_exts()
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+
+    plans = []
+    for row in rows:
+        errors = []
+        title = row.get("title", "")
+        if not title:
+            errors.append("标题不能为空")
+        elif len(title) > 200:
+            errors.append("标题超过 200 字")
+
+        major = None
+        major_value = row.get("major", "")
+        candidates = majors_by_name.get(major_value) or ([majors_by_id[major_value]] if major_value in majors_by_id else [])
+        if not major_value:
+            errors.append("专业不能为空")
+        elif not candidates:
+            errors.append(f"专业不存在：{major_value}")
+        elif len(candidates) > 1:
+            errors.append(f"专业名称不唯一，请改用专业 ID：{major_value}")
+        else:
+            major = candidates[0]
+
+        resource_type = _resource_type(row.get("resource_type", ""))
+        if resource_type is None:
+            errors.append(f"资源类型不合法：{row.get('resource_type')}")
+        status = _STATUS_ALIASES.get(row.get("status", "").lower() or "draft")
+        if status is None:
+            errors.append(f"状态不合法：{row.get('status')}（应为 草稿/发布）")
+        duration = None
+        if row.get("duration_seconds"):
+            try:
+                duration = int(float(row["duration_seconds"]))
+            except ValueError:
+                errors.append("时长应为秒数")
+
+        file_name = _norm_name(row.get("file", ""))
+        external_url = row.get("external_url", "")
+        ext = file_name.rsplit(".", 1)[-1].lower() if "." in file_name else ""
+        if file_name and external_url:
+            errors.append("文件与外链只能填写一项")
+        elif not file_name and not external_url:
+            errors.append("需提供文件或外链")
+        elif external_url:
+            try:
+                validate_external_url(external_url)
+            except AppError as e:
+                errors.append(e.message)
+        else:
+            size = source.size(file_name)
+            if ext not in allowed:
+                errors.append(f"文件类型不允许上传：{file_name}")
+            elif size is None:
+                errors.append(f"文件不存在：{file_name}")
+            elif size > max_bytes:
+                errors.append(f"文件超过 {settings.MAX_UPLOAD_MB}MB：{file_name}")
+
+        cover = _norm_name(row.get("cover", ""))
+        if cover:
+            cover_size = source.size(cover)
+            if cover.rsplit(".", 1)[-1].lower() not in COVER_EXTS:
+                errors.append(f"封面仅支持 png/jpg：{cover}")
+            elif cover_size is None:
+                errors.append(f"封面文件不存在：{cover}")
+            elif cover_size > COVER_MAX_BYTES:
+                errors.append(f"封面超过 10MB：{cover}")
+
+        plans.append(
+            {
+                "row": row["row"],
+                "title": title,
+                "abstract": row.get("abstract", ""),
+                "major_id": major.id if major else None,
+                "group_id": major.group_id if major else None,
+                "course_name": row.get("course", ""),
+                "tag_names": _split_tags(row.get("tags", "")),
+                "resource_type": resource_type,
+                "source_type": "url" if external_url else "upload",
+                "file_type": ext or "link",
+                "external_url": external_url or None,
+                "file": file_name,
+                "cover": cover,
+                "audience": row.get("audience") or None,
+                "status": status,
+                "duration_seconds": duration,
+                "errors": errors,
+            }
+        )
+    return plans
+
+
+def _store_file(plan: dict, source: FileSource) -> None:
+    """把一行的主文件与封面写入存储，结果写回 plan["stored"]；写入过的位置记在 plan["written"] 以便失败时清理。"""
+    written = plan.setdefault("written", [])
+    stored = {}
+    if plan["file"]:
+        filename = safe_filename(os.path.basename(plan["file"]))
+        ext = plan["file_type"]
+        file_id = f"file_{uuid.uuid4().hex}"
+        max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+        media_info, needs_remux = None, False
+        with source.open(plan["file"]) as f:
+            if is_oss_enabled():
+                key = f"{file_id}_{filename}"
+                with spool_upload(f, max_bytes, suffix=f".{ext}") as (spool_path, size, sha):
+                    if ext in MEDIA_EXTS:
+                        media_info = _media_info(spool_path, sha)
+                        needs_remux = ext in FASTSTART_EXTS and needs_faststart(spool_path)
+                    save_path_oss(spool_path, key)
+                written.append(("oss", key))
+                file_id = key
+            else:
+                path = local_upload_path(file_id, filename)
+                written.append(("local", path))
+                size, sha = save_file_local(f, path, max_bytes)
+                if ext in MEDIA_EXTS:
+                    media_info = _media_info(path, sha)
+                    needs_remux = ext in FASTSTART_EXTS and needs_faststart(path)
+        if media_info and ext in FASTSTART_EXTS:
+            media_info = {**media_info, "faststart": not needs_remux}
+        stored.update(
+            file_id=file_id,
+            file_name=filename,
+            file_size_bytes=size,
+            file_mime=mimetypes.guess_type(filename)[0],
+            file_sha256=sha,
+            media_info=media_info,
+            needs_remux=needs_remux,
+        )
+    if plan["cover"]:
+        ext = plan["cover"].rsplit(".", 1)[-1].lower()
+        name = f"cover_{uuid.uuid4().hex}.{ext}"
+        with source.open(plan["cover"]) as f:
+            if is_oss_enabled():
+                with spool_upload(f, COVER_MAX_BYTES, suffix=f".{ext}") as (spool_path, _, _):
+                    save_path_oss(spool_path, name)
+                written.append(("oss", name))
+                stored["cover_url"] = f"oss:{name}"
+            else:
+                dst = local_cover_path(name)
+                written.append(("local", str(dst)))
+                save_file_local(f, str(dst), COVER_MAX_BYTES)
+                try:
+                    generate_image_derivatives(str(dst), str(dst.parent), dst.stem)
+                except Exception:
+                    # 生成失败不影响导入，访问时会按需重试
+                    logger.warning("Cover derivatives failed for %s", name, exc_info=True)
+                stored["cover_url"] = f"local:{name}"
+    plan["stored"] = stored
+
+
+def _media_info(path: str, sha: str) -> dict | None:
+    """同一 sha256 只探测一次（进程内缓存或库中同内容资源）；在写入线程中执行，使用独立会话。"""
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        info = lookup_media_info(db, sha)
+    finally:
+        db.close()
+    if info is None:
+        info = inspect_media(path)
+        remember_media_info(sha, info)
+    return info
+
+
+def _cleanup(plans: list[dict]) -> None:
+    oss_keys = []
+    for plan in plans:
+        for kind, location in plan.get("written", []):
+            if kind == "oss":
+                oss_keys.append(location)
+                continue
+            path = Path(location)
+            # 封面连同其衍生图（{stem}_w{宽度}.{格式}）一起删除
+            for p in [path, *path.parent.glob(f"{path.stem}_w*")] if path.name.startswith("cover_") else [path]:
+                try:
+                    p.unlink()
+                except OSError:
+                    pass
+    if oss_keys:
+        try:
+            delete_oss_keys(oss_keys)
+        except Exception:
+            logger.warning("Bulk import cleanup of %s OSS objects failed", len(oss_keys), exc_info=True)
+
+
+def _resolve_courses_and_tags(db: Session, plans: list[dict]) -> tuple[dict, dict]:
+    """
+    按名称批量查询课程与标签，缺失的一次性创建（与单个创建资源时的自动创建行为一致）。
+    只 flush 不提交：在调用方批次的事务中创建，批次失败回滚时不会留下无资源引用的课程与标签。
+    """
+    course_keys = {(p["major_id"], p["course_name"]) for p in plans if p["course_name"]}
+    courses: dict[tuple[int, str], int] = {}
+    if course_keys:
+        major_ids = {k[0] for k in course_keys}
+        names = {k[1] for k in course_keys}
+        for c in db.query(Course).filter(Course.major_id.in_(major_ids), Course.name.in_(names)).all():
+            courses.setdefault((c.major_id, c.name), c.id)
+        missing = [Course(major_id=m, name=n, is_active=True) for m, n in sorted(course_keys - courses.keys())]
+        db.add_all(missing)
+        db.flush()
+        courses.update({(c.major_id, c.name): c.id for c in missing})
+
+    tag_names = {t for p in plans for t in p["tag_names"]}
+    tags: dict[str, int] = {}
+    if tag_names:
+        tags = dict(db.query(IdeologyTag.name, IdeologyTag.id).filter(IdeologyTag.name.in_(tag_names)).all())
+        missing = [IdeologyTag(name=n, is_active=True) for n in sorted(tag_names - tags.keys())]
+        db.add_all(missing)
+        db.flush()
+        tags.update({t.name: t.id for t in missing})
+    return courses, tags
+
+
+def _insert_chunk(db: Session, chunk: list[dict], owner: User) -> list[int]:
+    courses, tags = _resolve_courses_and_tags(db, chunk)
+    now = datetime.now(timezone.utc)
+    values = []
+    for p in chunk:
+        stored = p.get("stored", {})
+        media_info = stored.get("media_info")
+        detected = (media_info or {}).get("duration_seconds")
+        values.append(
+            {
+                "title": p["title"],
+                "abstract": p["abstract"],
+                "group_id": p["group_id"],
+                "major_id": p["major_id"],
+                "course_id": courses.get((p["major_id"], p["course_name"])),
+                "resource_type": p["resource_type"],
+                "source_type": p["source_type"],
+                "file_type": p["file_type"],
+                "external_url": p["external_url"],
+                "cover_url": stored.get("cover_url") or default_cover(p["resource_type"]),
+                "duration_seconds": detected or p["duration_seconds"],
+                "duration_source": "auto" if detected else ("manual" if p["duration_seconds"] is not None else None),
+                "media_info": media_info,
+                "audience": p["audience"],
+                "status": p["status"],
+                "owner_user_id": owner.id,
+                "file_id": stored.get("file_id"),
+                "file_name": stored.get("file_name"),
+                "file_size_bytes": stored.get("file_size_bytes"),
+                "file_mime": stored.get("file_mime"),
+                "file_sha256": stored.get("file_sha256"),
+                "created_at": now,
+                "published_at": now if p["status"] == "published" else None,
+            }
+        )
+    ids = db.execute(insert(Resource).returning(Resource.id, sort_by_parameter_order=True), values).scalars().all()
+    links = [{"resource_id": rid, "tag_id": tags[t]} for rid, p in zip(ids, chunk) for t in p["tag_names"]]
+    if links:
+        db.execute(resource_tags.insert(), links)
+    db.commit()
+    return list(ids)
+
+
+def _enqueue_jobs(db: Session, chunk: list[dict], ids: list[int]) -> None:
+    resources = {r.id: r for r in db.query(Resource).filter(Resource.id.in_(ids)).all()}
+    for rid, p in zip(ids, chunk):
+        r = resources.get(rid)
+        if r is not None and r.file_id:
+            enqueue_file_jobs(db, r, p["file_type"], p["stored"].get("needs_remux", False))
+
+
+def run_import(
+    db: Session,
+    owner: User,
+    manifest_path: str,
+    source_path: str | None,
+    dry_run: bool = False,
+    skip_invalid: bool = False,
+    enqueue_jobs: bool = True,
+) -> dict:
+    """
+    执行批量导入并返回逐行报告。
+    dry_run 只校验；skip_invalid 为 False 时只要有无效行就不导入任何数据。
+    enqueue_jobs 控制是否为新文件排队后台任务（命令行进程退出后队列随之丢失，故命令行不排队，
+    HLS、雪碧图与 PDF 预览会在首次查看时补做）。
+    """
+    started = time.monotonic()
+    rows = read_manifest(manifest_path)
+    source = FileSource(source_path)
+    try:
+        plans = _plan_rows(db, rows, source)
+        valid = [p for p in plans if not p["errors"]]
+        invalid_count = len(plans) - len(valid)
+        aborted = dry_run or (invalid_count > 0 and not skip_invalid)
+        if not aborted and valid:
+            with ThreadPoolExecutor(max_workers=max(1, settings.BULK_IMPORT_WORKERS)) as pool:
+                for plan, future in [(p, pool.submit(_store_file, p, source)) for p in valid]:
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        logger.warning("Bulk import: storing row %s failed", plan["row"], exc_info=True)
+                        plan["errors"].append(f"文件写入失败：{exc}")
+            _cleanup([p for p in valid if p["errors"]])
+            valid = [p for p in valid if not p["errors"]]
+            chunk_size = max(1, settings.BULK_IMPORT_CHUNK_SIZE)
+            for i in range(0, len(valid), chunk_size):
+                chunk = valid[i : i + chunk_size]
+                try:
+                    ids = _insert_chunk(db, chunk, owner)
+                except Exception as exc:
+                    db.rollback()
+                    logger.exception("Bulk import: inserting rows %s-%s failed", chunk[0]["row"], chunk[-1]["row"])
+                    _cleanup(chunk)
+                    for p in chunk:
+                        p["errors"].append(f"写入数据库失败：{exc.__class__.__name__}")
+                    continue
+                for rid, p in zip(ids, chunk):
+                    p["id"] = rid
+                if enqueue_jobs:
+                    _enqueue_jobs(db, chunk, ids)
+    finally:
+        source.close()
+
+    report_rows = []
+    for p in plans:
+        if p["errors"]:
+            status = "failed"
+        elif p.get("id"):
+            status = "created"
+        else:
+            status = "valid" if dry_run or aborted else "skipped"
+        report_rows.append({"row": p["row"], "title": p["title"], "status": status, "id": p.get("id"), "errors": p["errors"]})
+    created = sum(1 for r in report_rows if r["status"] == "created")
+    logger.info(
+        "Bulk import by %s: rows=%s created=%s failed=%s dry_run=%s elapsed=%.1fs",
+        owner.username, len(plans), created, sum(1 for r in report_rows if r["status"] == "failed"), dry_run,
+        time.monotonic() - started,
+    )
+    return {
+        "total": len(plans),
+        "created": created,
+        "failed": sum(1 for r in report_rows if r["status"] == "failed"),
+        "dry_run": dry_run,
+        "aborted": aborted and not dry_run,
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+        "rows": report_rows,
+    }
+
+
+def _jobs_dir() -> Path:
+    return Path(settings.BULK_IMPORT_DIR)
+
+
+def _write_job(job: dict) -> None:
+    path = _jobs_dir() / f"{job['id']}.json"
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(job, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _prune_jobs() -> None:
+    """删除超过保留期的任务记录与遗留的输入文件。"""
+    before = time.time() - _JOB_RETENTION_SECONDS
+    for path in _jobs_dir().iterdir():
+        try:
+            if path.stat().st_mtime >= before:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _pid_alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def submit_job(
+    owner: User, manifest_file, manifest_suffix: str, archive_file, dry_run: bool, skip_invalid: bool
+) -> dict:
+    """
+    把上传的清单与压缩包存入任务目录后提交后台导入，立即返回任务记录。
+    文件过大时抛出 ValueError，任务队列已满时抛出 JobQueueFull。
+    """
+    directory = _jobs_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    _prune_jobs()
+    job_id = uuid.uuid4().hex[:16]
+    work_dir = directory / job_id
+    try:
+        manifest_path = work_dir / f"manifest{manifest_suffix}"
+        save_file_local(manifest_file, str(manifest_path), 50 * 1024 * 1024)
+        archive_path = None
+        if archive_file is not None:
+            archive_path = work_dir / "files.zip"
+            save_file_local(archive_file, str(archive_path), settings.BULK_IMPORT_MAX_ARCHIVE_MB * 1024 * 1024)
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "owner": owner.username,
+            "dry_run": dry_run,
+            "skip_invalid": skip_invalid,
+            "pid": os.getpid(),
+            "created_at": int(time.time()),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "report": None,
+        }
+        _write_job(job)
+        import_jobs.submit(
+            job_id, _run_job, job, owner.id, str(manifest_path), str(archive_path) if archive_path else None
+        )
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        try:
+            (directory / f"{job_id}.json").unlink()
+        except FileNotFoundError:
+            pass
+        raise
+    return job
+
+
+def _run_job(job: dict, owner_id: int, manifest_path: str, archive_path: str | None) -> None:
+    from app.db.session import SessionLocal
+
+    job = {**job, "status": "running", "started_at": int(time.time())}
+    _write_job(job)
+    db = SessionLocal()
+    try:
+        owner = db.query(User).filter(User.id == owner_id).first()
+        if owner is None:
+            raise BulkImportError("导入用户不存在")
+        report = run_import(
+            db, owner, manifest_path, archive_path, dry_run=job["dry_run"], skip_invalid=job["skip_invalid"]
+        )
+        job.update(status="done", report=report)
+    except BulkImportError as e:
+        job.update(status="failed", error=str(e))
+    except Exception as e:
+        logger.exception("Bulk import job %s failed", job["id"])
+        job.update(status="failed", error=f"导入失败：{e.__class__.__name__}")
+    finally:
+        db.close()
+        shutil.rmtree(Path(manifest_path).parent, ignore_errors=True)
+        job["finished_at"] = int(time.time())
+        _write_job(job)
+
+
+def get_job(job_id: str) -> dict | None:
+    """任务状态与报告；执行任务的进程已退出（如重启）而任务未结束时标记为失败。"""
+    if not JOB_ID_RE.match(job_id):
+        return None
+    try:
+        job = json.loads((_jobs_dir() / f"{job_id}.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    if job["status"] in ("queued", "running") and not _pid_alive(job.get("pid")):
+        job.update(status="failed", error="导入进程已退出，任务未完成")
+    return job
+
+
+def main() -> int:
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="CSV 或 XLSX 清单")
+    parser.add_argument("files", nargs="?", help="包含清单中文件的 zip 压缩包或目录")
+    parser.add_argument("--owner", required=True, help="资源归属的用户名（管理员或教师）")
+    parser.add_argument("--dry-run", action="store_true", help="只校验，不导入")
+    parser.add_argument("--skip-invalid", action="store_true", help="跳过无效行，导入其余有效行")
+    parser.add_argument("--report", help="把逐行报告写入该 JSON 文件")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        owner = db.query(User).filter(User.username == args.owner).first()
+        if not owner or owner.role not in ("admin", "teacher"):
+            print(f"用户不存在或无权创建资源：{args.owner}", file=sys.stderr)
+            return 2
+        try:
+            report = run_import(
+                db, owner, args.manifest, args.files,
+                dry_run=args.dry_run, skip_invalid=args.skip_invalid, enqueue_jobs=False,
+            )
+        except BulkImportError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+    finally:
+        db.close()
+
+    for r in report["rows"]:
+        if r["errors"]:
+            print(f"第 {r['row']} 行 {r['title']}: {'；'.join(r['errors'])}")
+    if report["aborted"]:
+        print("存在无效行，未导入任何数据（可使用 --skip-invalid 跳过无效行）")
+    print(
+        f"共 {report['total']} 行，创建 {report['created']}，失败 {report['failed']}，"
+        f"耗时 {report['elapsed_seconds']} 秒"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,9 +20,59 @@ class Settings(BaseSettings):
     # Signed download
     SIGNED_URL_SECRET: str
     SIGNED_URL_EXPIRES_SECONDS: int = 60
+    # 签名过期时间按窗口对齐，同一窗口内同一对象的签名地址不变（可被浏览器/CDN 缓存）
+    SIGNED_URL_BUCKET_SECONDS: int = 300
+    COVER_URL_EXPIRES_SECONDS: int = 3600  # 封面签名地址有效期，列表页大量使用，取较长以便缓存
+    # 本地封面的进程内热点缓存：总容量与单个文件上限
+    COVER_HOT_CACHE_MAX_MB: int = 64
+    COVER_HOT_CACHE_MAX_ITEM_KB: int = 256
+    # 封面归属校验（资源未删除且封面仍是该文件）在进程内的有效期；多 worker 时封面更换或删除最多滞后这么久
+    COVER_CHECK_TTL_SECONDS: int = 30
 
     # Preview
     PREVIEW_DIR: str = "/data/previews"
+    PREVIEW_WORKERS: int = 2
+    PREVIEW_MAX_PENDING: int = 64
+    PREVIEW_CONVERT_TIMEOUT_SECONDS: int = 120
+    PREVIEW_WAIT_SECONDS: int = 20
+    PREVIEW_CACHE_MAX_MB: int = 2048  # 预览缓存目录的容量上限，超出按最近访问淘汰
+    PREVIEW_PAGE_URL_EXPIRES_SECONDS: int = 3600  # PDF 分页页图签名地址有效期
+    ZIP_MAX_ENTRIES: int = 20000  # 可在线浏览的压缩包最多条目数，超出时按文件尾目录信息直接拒绝解析
+    # 常驻 LibreOffice 实例池（需 python3-uno；为 0 或不可用时走 soffice 命令行）
+    OFFICE_POOL_SIZE: int = 2
+    OFFICE_MAX_JOBS_PER_INSTANCE: int = 200
+    OFFICE_MAX_RSS_MB: int = 1024
+    OFFICE_START_TIMEOUT_SECONDS: int = 30
+    OFFICE_HEALTHCHECK_INTERVAL_SECONDS: int = 30
+
+    # Media
+    MEDIA_PROBE_TIMEOUT_SECONDS: int = 20
+    MEDIA_WORKERS: int = 1
+    MEDIA_MAX_PENDING: int = 32
+    # moov 在文件尾的 mp4 上传后后台重封装为 faststart（流复制，不重新编码）
+    FASTSTART_ENABLED: bool = True
+    FASTSTART_TIMEOUT_SECONDS: int = 600
+    # HLS 自适应码率切片（mp4 上传后后台生成）
+    HLS_ENABLED: bool = True
+    HLS_DIR: str = "/data/hls"
+    HLS_SEGMENT_SECONDS: int = 6
+    HLS_PACKAGE_TIMEOUT_SECONDS: int = 3600
+    HLS_URL_EXPIRES_SECONDS: int = 14400  # 播放列表签名有效期，需覆盖一节课的观看时长
+    # 视频海报帧（无封面时作为默认封面）与拖动预览雪碧图
+    THUMBNAILS_ENABLED: bool = True
+    THUMBNAIL_INTERVAL_SECONDS: int = 10
+    THUMBNAIL_TIMEOUT_SECONDS: int = 900
+
+    # 课程/资源打包下载：达到该大小的包在后台缓存一份完整 zip，之后的下载与断点续传直接读缓存
+    EXPORT_CACHE_MIN_MB: int = 200
+    EXPORT_URL_EXPIRES_SECONDS: int = 3600
+
+    # 资源批量导入（清单 + zip/目录）
+    BULK_IMPORT_MAX_ROWS: int = 10000
+    BULK_IMPORT_WORKERS: int = 4  # 并行写入存储的线程数
+    BULK_IMPORT_CHUNK_SIZE: int = 500  # 每个事务批量插入的行数
+    BULK_IMPORT_MAX_ARCHIVE_MB: int = 20480
+    BULK_IMPORT_DIR: str = "/data/imports"  # 后台导入任务的输入文件与报告，多个 worker 需共享
 
     # Storage
     STORAGE_BACKEND: str = "local"  # local or oss
@@ -40,6 +90,28 @@ class Settings(BaseSettings):
     LOG_DIR: str = "/data/logs"
     LOG_LEVEL: str = "INFO"
     LOG_RETENTION_DAYS: int = 14
+    # 日志队列：满时 INFO 及以下直接丢弃，WARNING 及以上最多等待该毫秒数
+    LOG_QUEUE_MAX_SIZE: int = 10000
+    LOG_QUEUE_BLOCK_MS: int = 200
+    # 多日日志检索索引（LOG_DIR/log_index.sqlite3），后台每隔 N 秒增量写入
+    LOG_INDEX_ENABLED: bool = True
+    LOG_INDEX_INTERVAL_SECONDS: int = 10
+
+    # SQL 监控：单条语句超过该毫秒数记慢查询日志；同一请求内同一类语句执行超过该次数视为疑似 N+1
+    SLOW_QUERY_MS: int = 200
+    N_PLUS_ONE_THRESHOLD: int = 10
+    # 管理后台查询洞察：EXPLAIN ANALYZE 的语句超时
+    QUERY_EXPLAIN_TIMEOUT_MS: int = 5000
+    # 按需性能剖析结果目录（多 worker 共享）与保留的剖析结果数
+    PROFILE_DIR: str = "/data/profiles"
+    PROFILE_MAX_PROFILES: int = 200
+
+    # Prometheus 指标（GET /metrics）
+    # 多个 uvicorn worker 时需设置为各 worker 共享、启动前清空的目录（prometheus_client 多进程模式）
+    METRICS_MULTIPROC_DIR: str | None = None
+    METRICS_TOKEN: str | None = None  # 设置后 /metrics 需携带 Authorization: Bearer <token>
+    # 未设置 METRICS_TOKEN 时默认不提供 /metrics（返回 404）；仅在反向代理已屏蔽该路径或本地开发时设为 true
+    METRICS_PUBLIC: bool = False
 
     # AI (AiHubMix OpenAI compatible)
     AIHUBMIX_API_KEY: str | None = None
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from app.core.config import settings
+from app.core.media import MediaError, SharedSource, remember_media_info, run_ffmpeg, submit_media_job
+from app.core.storage import is_oss_enabled, download_oss_to_path, local_upload_path, save_path_oss
+
+logger = logging.getLogger(__name__)
+
+FASTSTART_EXTS = {"mp4", "m4a", "mov"}
+
+
+def moov_before_mdat(path: str) -> bool | None:
+    """
+    遍历 MP4 顶层 box，判断 moov 是否位于 mdat 之前（即是否已是 faststart）。
+    只读取各 box 的 8/16 字节头并 seek 跳过内容；不是 MP4 或结构损坏时返回 None。
+    """
+    try:
+        size_total = os.path.getsize(path)
+        with open(path, "rb") as f:
+            offset = 0
+            while offset + 8 <= size_total:
+                f.seek(offset)
+                header = f.read(8)
+                if len(header) < 8:
+                    return None
+                box_size, box_type = struct.unpack(">I4s", header)
+                if box_size == 1:
+                    large = f.read(8)
+                    if len(large) < 8:
+                        return None
+                    box_size = struct.unpack(">Q", large)[0]
+                elif box_size == 0:
+                    box_size = size_total - offset
+                if box_size < 8:
+                    return None
+                if box_type == b"moov":
+                    return True
+                if box_type == b"mdat":
+                    return False
+                offset += box_size
+    except OSError:
+        return None
+    return None
+
+
+def needs_faststart(path: str) -> bool:
+    return moov_before_mdat(path) is False
+
+
+def request_remux(file_id: str, file_name: str, source: SharedSource | None = None) -> None:
+    """把 faststart 重封装加入后台队列（同一 file_id 单飞）；队列已满时抛出 JobQueueFull。"""
+    submit_media_job(f"faststart:{file_id}", source, _remux, file_id, file_name)
+
+
+def _file_sha256(path: str) -> tuple[int, str]:
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            sha.update(chunk)
+    return size, sha.hexdigest()
+
+
+def _update_resource(file_id: str, size: int, sha: str) -> None:
+    from app.db.session import SessionLocal
+    from app.models.resource import Resource
+
+    db = SessionLocal()
+    try:
+        for r in db.query(Resource).filter(Resource.file_id == file_id).all():
+            r.file_size_bytes = size
+            r.file_sha256 = sha
+            if r.media_info:
+                r.media_info = {**r.media_info, "size_bytes": size, "faststart": True}
+                remember_media_info(sha, r.media_info)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _remux(file_id: str, file_name: str, source: SharedSource | None = None) -> None:
+    """
+    流复制重封装（-c copy -movflags +faststart，不重新编码），把 moov 移到文件头。
+    新文件先写到同目录的临时文件，校验后原子替换原文件（OSS 为覆盖同名对象），
+    再更新资源的大小与 sha256。
+    """
+    suffix = os.path.splitext(file_name)[1] or ".mp4"
+    if is_oss_enabled():
+        work_dir = tempfile.mkdtemp(prefix="faststart_")
+        if source is not None:
+            src_path = source.path()
+        else:
+            src_path = download_oss_to_path(file_id, os.path.join(work_dir, f"source{suffix}"))
+    else:
+        src_path = local_upload_path(file_id, file_name)
+        if not os.path.exists(src_path):
+            raise MediaError("源文件不存在")
+        work_dir = tempfile.mkdtemp(prefix=".faststart_", dir=os.path.dirname(src_path))
+    try:
+        if not needs_faststart(src_path):
+            return
+        out_path = os.path.join(work_dir, f"out{suffix}")
+        run_ffmpeg(
+            ["-i", src_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", out_path],
+            settings.FASTSTART_TIMEOUT_SECONDS,
+        )
+        if moov_before_mdat(out_path) is not True:
+            raise MediaError("faststart 重封装结果校验失败")
+        size, sha = _file_sha256(out_path)
+        if is_oss_enabled():
+            save_path_oss(out_path, file_id)
+        else:
+            os.replace(out_path, src_path)
+        _update_resource(file_id, size, sha)
+        logger.info("Faststart remuxed %s (%s bytes)", file_id, size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
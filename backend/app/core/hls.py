@@ -0,0 +1,340 @@
+import fcntl
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from app.core.config import settings
+from app.core.media import MediaError, SharedSource, media_jobs, run_ffmpeg, submit_media_job
+from app.core.signing import signed_download
+from app.core.storage import (
+    is_oss_enabled,
+    delete_oss_prefix,
+    download_oss_to_path,
+    generate_oss_signed_url,
+    local_upload_path,
+    read_oss_object,
+    upload_dir_oss,
+)
+
+logger = logging.getLogger(__name__)
+
+HLS_EXTS = {"mp4"}
+
+STATUS_READY = "ready"
+STATUS_PENDING = "pending"
+STATUS_FAILED = "failed"
+
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+SEGMENT_MEDIA_TYPE = "video/mp2t"
+MASTER_PLAYLIST = "master.m3u8"
+
+# 码率阶梯：(名称, 高度, 视频码率 kbps, 音频码率 kbps)，只保留不高于源视频的档位
+RENDITIONS = (
+    ("360p", 360, 800, 96),
+    ("540p", 540, 1600, 128),
+    ("720p", 720, 3000, 128),
+)
+
+# 允许访问的相对路径：主播放列表、各档位播放列表与分片，防止路径穿越
+_PATH_RE = re.compile(
+    r"^(master\.m3u8|v\d{1,2}/index\.m3u8|v\d{1,2}/seg_\d{1,6}\.ts|thumbs/thumbs\.vtt|thumbs/sprite_\d{3,4}\.jpg)$"
+)
+THUMBS_PREFIX = "thumbs/"
+
+
+def hls_dir(file_id: str) -> str:
+    return os.path.join(settings.HLS_DIR, file_id)
+
+
+def oss_key(file_id: str, path: str = "") -> str:
+    return f"hls/{file_id}/{path}"
+
+
+def thumbs_dir(file_id: str) -> str:
+    """缩略图雪碧图与 VTT 的本地目录，与切片目录分开，重新切片时互不影响。"""
+    return os.path.join(settings.HLS_DIR, f"{file_id}.thumbs")
+
+
+def local_path(file_id: str, path: str) -> str:
+    if path.startswith(THUMBS_PREFIX):
+        return os.path.join(thumbs_dir(file_id), path[len(THUMBS_PREFIX) :])
+    return os.path.join(hls_dir(file_id), path)
+
+
+def is_valid_path(path: str) -> bool:
+    return bool(_PATH_RE.match(path))
+
+
+def media_type_for(path: str) -> str:
+    if path.endswith(".vtt"):
+        return "text/vtt"
+    if path.endswith(".jpg"):
+        return "image/jpeg"
+    return PLAYLIST_MEDIA_TYPE if path.endswith(".m3u8") else SEGMENT_MEDIA_TYPE
+
+
+def is_playlist(path: str) -> bool:
+    return path.endswith((".m3u8", ".vtt"))
+
+
+def is_available(file_id: str) -> bool:
+    """本地存储时确认切片目录仍在（数据目录可能被清理）；OSS 以数据库状态为准。"""
+    if is_oss_enabled():
+        return True
+    return os.path.exists(os.path.join(hls_dir(file_id), MASTER_PLAYLIST))
+
+
+def select_renditions(media_info: dict | None) -> list[tuple[str, int, int, int]]:
+    height = ((media_info or {}).get("video") or {}).get("height")
+    if not height:
+        return list(RENDITIONS)
+    out = [r for r in RENDITIONS if r[1] <= height]
+    if not out:
+        # 源视频低于最低档：按源高度（取偶数）只出一档
+        name, _, v_kbps, a_kbps = RENDITIONS[0]
+        out = [(name, max(2, height - height % 2), v_kbps, a_kbps)]
+    return out
+
+
+def build_ffmpeg_args(src_path: str, out_dir: str, renditions: list, has_audio: bool) -> list[str]:
+    """
+    一次解码、多档编码：split 后按各档高度缩放，关键帧按分片时长强制对齐，
+    保证各档分片边界一致，播放器切换码率时无缝衔接。
+    """
+    seg = settings.HLS_SEGMENT_SECONDS
+    n = len(renditions)
+    chains = [f"[0:v]split={n}" + "".join(f"[s{i}]" for i in range(n))]
+    chains += [f"[s{i}]scale=-2:{height}[v{i}]" for i, (_, height, _, _) in enumerate(renditions)]
+    args = ["-i", src_path, "-filter_complex", ";".join(chains)]
+    for i, (_, _, v_kbps, _) in enumerate(renditions):
+        args += [
+            "-map", f"[v{i}]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", f"{v_kbps}k",
+            f"-maxrate:v:{i}", f"{int(v_kbps * 1.1)}k",
+            f"-bufsize:v:{i}", f"{v_kbps * 2}k",
+        ]
+    if has_audio:
+        for i, (_, _, _, a_kbps) in enumerate(renditions):
+            args += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", f"{a_kbps}k"]
+        args += ["-ac", "2"]
+    stream_map = " ".join(f"v:{i},a:{i}" if has_audio else f"v:{i}" for i in range(n))
+    args += [
+        "-preset", "veryfast",
+        "-profile:v", "main",
+        "-pix_fmt", "yuv420p",
+        "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{seg})",
+        "-f", "hls",
+        "-hls_time", str(seg),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "v%v", "seg_%05d.ts"),
+        "-var_stream_map", stream_map,
+        os.path.join(out_dir, "v%v", "index.m3u8"),
+    ]
+    return args
+
+
+def build_master_playlist(renditions: list, media_info: dict | None, has_audio: bool) -> str:
+    """主播放列表自行生成（ffmpeg 在 %v 目录布局下放置 master 的位置不稳定），带宽按峰值码率估算。"""
+    video = (media_info or {}).get("video") or {}
+    src_w, src_h = video.get("width"), video.get("height")
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for i, (name, height, v_kbps, a_kbps) in enumerate(renditions):
+        bandwidth = int((v_kbps * 1.1 + (a_kbps if has_audio else 0)) * 1000)
+        attrs = [f"BANDWIDTH={bandwidth}", f"AVERAGE-BANDWIDTH={(v_kbps + (a_kbps if has_audio else 0)) * 1000}"]
+        if src_w and src_h:
+            width = int(round(src_w * height / src_h / 2)) * 2
+            attrs.append(f"RESOLUTION={width}x{height}")
+        attrs.append(f'NAME="{name}"')
+        lines += [f"#EXT-X-STREAM-INF:{','.join(attrs)}", f"v{i}/index.m3u8"]
+    return "\n".join(lines) + "\n"
+
+
+def signature_subject(file_id: str) -> str:
+    # 与下载签名区分，HLS 签名不能用于下载原文件
+    return f"hls/{file_id}"
+
+
+def signed_url(base_url: str, file_id: str, user_id: int, path: str) -> str:
+    """
+    签名放在路径里而不是查询串：播放列表 / VTT 中的相对地址（v0/index.m3u8、seg_00001.ts、sprite_001.jpg）
+    会按同一前缀解析，分片请求自动带上签名。
+    """
+    exp_ts, sig = signed_download(signature_subject(file_id), settings.HLS_URL_EXPIRES_SECONDS, user_id)
+    return f"{base_url.rstrip('/')}/api/v1/files/hls/{file_id}/{exp_ts}/{user_id}/{sig}/{path}"
+
+
+def master_url(base_url: str, file_id: str, user_id: int) -> str:
+    return signed_url(base_url, file_id, user_id, MASTER_PLAYLIST)
+
+
+def oss_segment_url(file_id: str, path: str, expires: int) -> str:
+    return generate_oss_signed_url(oss_key(file_id, path), expires)
+
+
+def oss_playlist(file_id: str, path: str, expires: int) -> str | None:
+    """
+    OSS 存储时由接口转发播放列表：档位播放列表中的分片（以及 VTT 中的雪碧图）改写为 OSS 签名直链，
+    分片流量不经过应用服务器。对象不存在返回 None。
+    """
+    import oss2
+
+    try:
+        text = read_oss_object(oss_key(file_id, path)).decode("utf-8")
+    except oss2.exceptions.NoSuchKey:
+        return None
+    if path == MASTER_PLAYLIST:
+        return text
+    folder = path.rsplit("/", 1)[0]
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#") and line.endswith(".ts"):
+            line = oss_segment_url(file_id, f"{folder}/{line}", expires)
+        elif line.startswith("sprite_"):
+            name, _, fragment = line.partition("#")
+            line = oss_segment_url(file_id, f"{folder}/{name}", expires) + (f"#{fragment}" if fragment else "")
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def request_package(file_id: str, file_name: str, media_info: dict | None, source: SharedSource | None = None) -> None:
+    """把切片任务加入后台队列（同一 file_id 单飞）；队列已满时抛出 JobQueueFull。"""
+    submit_media_job(f"hls:{file_id}", source, _package, file_id, file_name, media_info)
+
+
+def is_pending(file_id: str) -> bool:
+    return media_jobs.is_pending(f"hls:{file_id}")
+
+
+def lease_seconds() -> int:
+    """pending 租约时长：覆盖排队、下载、切片与上传；超过后认为持有任务的进程已退出。"""
+    return settings.HLS_PACKAGE_TIMEOUT_SECONDS * 2
+
+
+def needs_package(status: str | None, pending_since: datetime | None) -> bool:
+    """
+    是否需要（重新）排队切片，以数据库中的状态与租约为准，多个 worker 进程看到的结论一致：
+    从未切片、已就绪但切片丢失（调用方已确认不可用）、或 pending 租约已过期。
+    """
+    if status in (None, STATUS_READY):
+        return True
+    if status != STATUS_PENDING:
+        return False
+    if pending_since is None:
+        return True
+    if pending_since.tzinfo is None:
+        # SQLite 读回的时间不带时区，写入时为 UTC
+        pending_since = pending_since.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - pending_since > timedelta(seconds=lease_seconds())
+
+
+def remove(file_id: str | None) -> None:
+    """删除某个文件的全部切片与缩略图（资源删除、文件替换时调用）。"""
+    if not file_id:
+        return
+    shutil.rmtree(hls_dir(file_id), ignore_errors=True)
+    shutil.rmtree(thumbs_dir(file_id), ignore_errors=True)
+    if is_oss_enabled():
+        try:
+            delete_oss_prefix(oss_key(file_id))
+        except Exception:
+            logger.warning("Failed to delete HLS objects of %s", file_id, exc_info=True)
+
+
+def _set_status(file_id: str, status: str) -> None:
+    """更新状态；置为 pending 时同时写入租约起点，结束（ready / failed）时清空。"""
+    from app.db.session import SessionLocal
+    from app.models.resource import Resource
+
+    pending_since = datetime.now(timezone.utc) if status == STATUS_PENDING else None
+    db = SessionLocal()
+    try:
+        db.query(Resource).filter(Resource.file_id == file_id).update(
+            {"hls_status": status, "hls_pending_since": pending_since}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _db_status(file_id: str) -> str | None:
+    from app.db.session import SessionLocal
+    from app.models.resource import Resource
+
+    db = SessionLocal()
+    try:
+        return db.query(Resource.hls_status).filter(Resource.file_id == file_id).limit(1).scalar()
+    finally:
+        db.close()
+
+
+def fetch_source(file_id: str, file_name: str, job_dir: str, source: SharedSource | None = None) -> str:
+    """任务使用的本地源文件；OSS 存储时优先复用同一次上传的共享副本，否则下载到任务目录。"""
+    if is_oss_enabled():
+        if source is not None:
+            return source.path()
+        return download_oss_to_path(file_id, os.path.join(job_dir, f"source{Path(file_name).suffix}"))
+    path = local_upload_path(file_id, file_name)
+    if not os.path.exists(path):
+        raise MediaError("源文件不存在")
+    return path
+
+
+def _package(file_id: str, file_name: str, media_info: dict | None, source: SharedSource | None = None) -> None:
+    """
+    在 HLS_DIR 下的独立任务目录中切片，完成后整体 rename 到 HLS_DIR/{file_id}（OSS 时上传到 hls/{file_id}/），
+    最后把资源的 hls_status 置为 ready。多个 worker 进程之间用非阻塞文件锁去重，
+    抢不到锁说明其他进程正在处理（它已写入 pending 租约），直接返回。
+    状态写入都在任务中完成，查看预览的 GET 请求只负责按状态与租约决定是否排队。
+    """
+    os.makedirs(settings.HLS_DIR, exist_ok=True)
+    lock_dir = os.path.join(settings.HLS_DIR, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f"{file_id}.lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        try:
+            if is_available(file_id) and (not is_oss_enabled() or _db_status(file_id) == STATUS_READY):
+                # 其他进程已在本任务排队后完成切片
+                _set_status(file_id, STATUS_READY)
+                return
+            _set_status(file_id, STATUS_PENDING)
+            job_dir = tempfile.mkdtemp(prefix=".job_", dir=settings.HLS_DIR)
+            try:
+                src_path = fetch_source(file_id, file_name, job_dir, source)
+                out_dir = os.path.join(job_dir, "out")
+                renditions = select_renditions(media_info)
+                for i in range(len(renditions)):
+                    os.makedirs(os.path.join(out_dir, f"v{i}"))
+                has_audio = media_info is None or bool(media_info.get("audio"))
+                started = time.monotonic()
+                run_ffmpeg(build_ffmpeg_args(src_path, out_dir, renditions, has_audio), settings.HLS_PACKAGE_TIMEOUT_SECONDS)
+                if not all(os.path.exists(os.path.join(out_dir, f"v{i}", "index.m3u8")) for i in range(len(renditions))):
+                    raise MediaError("未生成 HLS 播放列表")
+                with open(os.path.join(out_dir, MASTER_PLAYLIST), "w") as f:
+                    f.write(build_master_playlist(renditions, media_info, has_audio))
+                if is_oss_enabled():
+                    upload_dir_oss(out_dir, oss_key(file_id))
+                else:
+                    shutil.rmtree(hls_dir(file_id), ignore_errors=True)
+                    os.replace(out_dir, hls_dir(file_id))
+                logger.info(
+                    "HLS packaged %s: %s in %.1fs",
+                    file_id,
+                    ",".join(r[0] for r in renditions),
+                    time.monotonic() - started,
+                )
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
+        except Exception:
+            _set_status(file_id, STATUS_FAILED)
+            raise
+        _set_status(file_id, STATUS_READY)
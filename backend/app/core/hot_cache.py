@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+from app.core import metrics
+from app.core.config import settings
+
+
+class HotFileCache:
+    """
+    进程内按字节数限额的 LRU：缓存小文件的内容（如封面衍生图），热点文件直接从内存返回，
+    不再查库、读盘。只缓存不超过 max_item_bytes 的条目。
+    """
+
+    def __init__(self, name: str, max_bytes: int, max_item_bytes: int):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._items: "OrderedDict[Hashable, tuple[bytes, dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: Hashable) -> tuple[bytes, dict] | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+            else:
+                self._items.move_to_end(key)
+                self._stats["hits"] += 1
+        metrics.record_cache_lookup(self.name, item is not None)
+        return item
+
+    def put(self, key: Hashable, data: bytes, meta: dict) -> None:
+        size = len(data)
+        if size > self.max_item_bytes or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[0])
+            self._items[key] = (data, meta)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, prefix: tuple) -> None:
+        """删除 key 以 prefix 开头的条目（key 为元组）。"""
+        with self._lock:
+            for key in [k for k in self._items if k[: len(prefix)] == prefix]:
+                self._bytes -= len(self._items.pop(key)[0])
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._items),
+                "size_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class RecentChecks:
+    """
+    进程内记录最近通过的校验（如“资源未删除且封面仍是该文件”），ttl 秒内命中时不再查库。
+    本进程的变更通过 invalidate 立即生效；其他 worker 的变更最多滞后 ttl 秒。
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 4096):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def passed(self, key: Hashable) -> bool:
+        if self.ttl_seconds <= 0:
+            return False
+        with self._lock:
+            checked_at = self._items.get(key)
+            if checked_at is None:
+                return False
+            if time.monotonic() - checked_at > self.ttl_seconds:
+                self._items.pop(key, None)
+                return False
+            return True
+
+    def add(self, key: Hashable) -> None:
+        with self._lock:
+            self._items[key] = time.monotonic()
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, prefix: tuple) -> None:
+        """删除 key 以 prefix 开头的记录（key 为元组）。"""
+        with self._lock:
+            for key in [k for k in self._items if k[: len(prefix)] == prefix]:
+                self._items.pop(key, None)
+
+
+# 本地封面（含衍生图）的热点缓存，key 为 (resource_id, 文件名, 宽度, 格式)
+cover_cache = HotFileCache(
+    "cover", settings.COVER_HOT_CACHE_MAX_MB * 1024 * 1024, settings.COVER_HOT_CACHE_MAX_ITEM_KB * 1024
+)
+# 封面归属校验的结果，key 为 (resource_id, 文件名)；与 cover_cache 一起失效
+cover_checks = RecentChecks(settings.COVER_CHECK_TTL_SECONDS)
+
+
+def invalidate_cover(resource_id: int) -> None:
+    """封面更换或资源删除后清理本进程的封面热点缓存与归属校验。"""
+    cover_cache.invalidate((resource_id,))
+    cover_checks.invalidate((resource_id,))
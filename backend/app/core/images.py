@@ -0,0 +1,82 @@
+import os
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# 固定的衍生图宽度：列表缩略图 / 卡片 / 详情
+DERIVATIVE_WIDTHS = {"thumb": 160, "card": 320, "detail": 960}
+# 可生成缩放衍生图的源图片扩展名
+IMAGE_DERIVATIVE_EXTS = {"png", "jpg", "jpeg", "webp"}
+FORMATS = {"webp": ("WEBP", "webp", "image/webp"), "jpeg": ("JPEG", "jpg", "image/jpeg")}
+DEFAULT_FORMAT = "webp"
+
+
+def pick_width(w: int | None) -> int:
+    """把任意请求宽度对齐到不小于它的标准宽度（超过最大值时取最大值）。"""
+    widths = sorted(DERIVATIVE_WIDTHS.values())
+    if not w or w <= 0:
+        return DERIVATIVE_WIDTHS["card"]
+    for width in widths:
+        if width >= w:
+            return width
+    return widths[-1]
+
+
+def negotiate_format(fmt: str | None, accept: str | None) -> str:
+    if fmt in FORMATS:
+        return fmt
+    if accept and "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][2]
+
+
+def derivative_name(stem: str, width: int, fmt: str) -> str:
+    return f"{stem}_w{width}.{FORMATS[fmt][1]}"
+
+
+def make_derivative(src_path: str, dst_path: str, width: int, fmt: str) -> str:
+    """按宽度等比缩小（不放大）并转码，先写临时文件再原子替换。"""
+    pil_format = FORMATS[fmt][0]
+    with Image.open(src_path) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.width > width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        if pil_format == "JPEG" and im.mode != "RGB":
+            if im.mode in ("RGBA", "LA", "P"):
+                im = im.convert("RGBA")
+                bg = Image.new("RGB", im.size, (255, 255, 255))
+                bg.paste(im, mask=im.getchannel("A"))
+                im = bg
+            else:
+                im = im.convert("RGB")
+        elif pil_format == "WEBP" and im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "A" in im.getbands() or im.mode == "P" else "RGB")
+        Path(dst_path).parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), suffix=".tmp")
+        os.close(fd)
+        try:
+            im.save(tmp_path, pil_format, quality=80, **({"method": 4} if pil_format == "WEBP" else {"optimize": True, "progressive": True}))
+            os.replace(tmp_path, dst_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return dst_path
+
+
+def generate_all(src_path: str, out_dir: str, stem: str) -> list[str]:
+    """生成全部标准宽度 × 格式的衍生图，返回生成的路径。"""
+    out = []
+    for width in sorted(DERIVATIVE_WIDTHS.values()):
+        for fmt in FORMATS:
+            out.append(make_derivative(src_path, os.path.join(out_dir, derivative_name(stem, width, fmt)), width, fmt))
+    return out
+
+
+def oss_process_param(width: int, fmt: str) -> str:
+    """OSS 图片处理参数：由 OSS 按需生成并缓存衍生图。"""
+    return f"image/resize,w_{width},m_lfit/format,{FORMATS[fmt][1]}"
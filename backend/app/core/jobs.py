@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_FAILURE_TTL_SECONDS = 300
+_pools: list["JobPool"] = []
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobPool:
+    """
+    后台任务池：
+    - 固定数量的工作线程（有界），排队任务数超过 max_pending 时拒绝提交
+    - 按 key 单飞去重：同一 key 执行中重复提交时复用同一个 Future
+    - 记录最近失败原因，供状态查询；失败记录 5 分钟后过期以便重试
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int = 64):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: ThreadPoolExecutor | None = None
+        self._inflight: dict[str, Future] = {}
+        self._failures: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        _pools.append(self)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"job-{self.name}")
+        return self._executor
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            if len(self._inflight) >= self.max_pending:
+                raise JobQueueFull(self.name)
+            self._failures.pop(key, None)
+            fut = self._get_executor().submit(self._run, key, fn, args, kwargs)
+            self._inflight[key] = fut
+            return fut
+
+    def _run(self, key: str, fn: Callable, args: tuple, kwargs: dict):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as exc:
+            logger.exception("Job %s[%s] failed", self.name, key)
+            with self._lock:
+                self._failures[key] = (time.monotonic(), str(exc) or exc.__class__.__name__)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key: str) -> Future | None:
+        with self._lock:
+            return self._inflight.get(key)
+
+    def is_pending(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def failure(self, key: str) -> str | None:
+        with self._lock:
+            item = self._failures.get(key)
+            if not item:
+                return None
+            ts, message = item
+            if time.monotonic() - ts > _FAILURE_TTL_SECONDS:
+                self._failures.pop(key, None)
+                return None
+            return message
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "workers": self.max_workers, "pending": len(self._inflight), "failed": len(self._failures)}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def shutdown_all() -> None:
+    for pool in _pools:
+        pool.shutdown()
@@ -0,0 +1,402 @@
+"""
+多日日志检索：后台线程把当前日志与滚动出的历史日志（含 .gz）增量写入 SQLite 索引
+（支持 JSON 行与旧的文本格式），
+按时间、级别、logger、request_id 建索引，消息正文用 FTS5（trigram 分词，支持中文子串）全文检索。
+
+- 索引文件：LOG_DIR/log_index.sqlite3（WAL 模式，检索与写入互不阻塞）
+- 多个 worker 进程之间用非阻塞文件锁保证同一时刻只有一个进程在写索引
+- 当前 app.log 按 (inode, 偏移) 记录进度；滚动后从对应历史文件的同一偏移继续，不重复、不遗漏
+- 超过 LOG_RETENTION_DAYS 的记录每天清理一次，索引大小与日志保留期一致
+"""
+import fcntl
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from app.core.config import settings
+from app.core.log_reader import LOG_NAME
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "log_index.sqlite3"
+_LINE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) \[(\w+)\] (\S+) ?(.*)$", re.S)
+_REQUEST_ID_RE = re.compile(r"req_[0-9a-f]{32}")
+_ROTATED_RE = re.compile(rf"^{re.escape(LOG_NAME)}\.(\d{{4}}-\d{{2}}-\d{{2}})(\.gz)?$")
+_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    level TEXT NOT NULL,
+    logger TEXT NOT NULL,
+    request_id TEXT,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_ts ON entries(ts);
+CREATE INDEX IF NOT EXISTS ix_entries_level_ts ON entries(level, ts);
+CREATE INDEX IF NOT EXISTS ix_entries_logger_ts ON entries(logger, ts);
+CREATE INDEX IF NOT EXISTS ix_entries_request_id ON entries(request_id) WHERE request_id IS NOT NULL;
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS done_files (name TEXT PRIMARY KEY);
+"""
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+    "message, content='entries', content_rowid='id', tokenize='trigram')"
+)
+
+
+class LogIndexError(Exception):
+    pass
+
+
+def index_path() -> Path:
+    return Path(settings.LOG_DIR) / INDEX_NAME
+
+
+def _connect(readonly: bool = False) -> sqlite3.Connection:
+    path = index_path()
+    if readonly:
+        if not path.exists():
+            raise LogIndexError("日志索引尚未建立")
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    else:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        try:
+            conn.execute(_FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 / trigram 时退化为 instr 子串匹配
+            logger.warning("SQLite FTS5 trigram unavailable, log search falls back to substring scan")
+        conn.commit()
+    return conn
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries_fts'").fetchone() is not None
+
+
+def _get_state(conn: sqlite3.Connection, key: str) -> dict | None:
+    row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _set_state(conn: sqlite3.Connection, key: str, value: dict) -> None:
+    conn.execute("INSERT OR REPLACE INTO state(key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+
+class _Writer:
+    """按批写入记录；文本格式跨批次的续行（如异常堆栈）追加到上一条记录。"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.fts = _has_fts(conn)
+        self.pending: list[list] = []
+        self.count = 0
+
+    def add_line(self, line: str) -> None:
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and "ts" in record:
+                message = str(record.get("message", ""))
+                if record.get("exc"):
+                    message = f"{message}\n{record['exc']}"
+                self.pending.append([
+                    record["ts"],
+                    record.get("level", ""),
+                    record.get("logger", ""),
+                    record.get("request_id"),
+                    message,
+                ])
+                if len(self.pending) >= _BATCH:
+                    self.flush()
+                return
+        m = _LINE_RE.match(line)
+        if m:
+            ts, level, name, message = m.groups()
+            rid = _REQUEST_ID_RE.search(message)
+            self.pending.append([ts, level, name, rid.group(0) if rid else None, message])
+            if len(self.pending) >= _BATCH:
+                self.flush()
+        elif self.pending:
+            self.pending[-1][4] += "\n" + line
+        else:
+            self._append_to_last(line)
+
+    def _append_to_last(self, line: str) -> None:
+        row = self.conn.execute("SELECT id, message FROM entries ORDER BY id DESC LIMIT 1").fetchone()
+        if not row:
+            return
+        rid, message = row
+        if self.fts:
+            self.conn.execute(
+                "INSERT INTO entries_fts(entries_fts, rowid, message) VALUES ('delete', ?, ?)", (rid, message)
+            )
+        message = f"{message}\n{line}"
+        self.conn.execute("UPDATE entries SET message = ? WHERE id = ?", (message, rid))
+        if self.fts:
+            self.conn.execute("INSERT INTO entries_fts(rowid, message) VALUES (?, ?)", (rid, message))
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        cur = self.conn.cursor()
+        for ts, level, name, rid, message in self.pending:
+            cur.execute(
+                "INSERT INTO entries(ts, level, logger, request_id, message) VALUES (?, ?, ?, ?, ?)",
+                (ts, level, name, rid, message),
+            )
+            if self.fts:
+                cur.execute("INSERT INTO entries_fts(rowid, message) VALUES (?, ?)", (cur.lastrowid, message))
+        self.count += len(self.pending)
+        self.pending.clear()
+
+
+def _ingest(writer: _Writer, f, start: int, complete: bool) -> int:
+    """从 start 读取到末尾，返回已消费到的偏移；complete=False 时末尾未写完的半行留到下次。"""
+    f.seek(start)
+    offset = start
+    for raw in f:
+        if not raw.endswith(b"\n") and not complete:
+            break
+        offset += len(raw)
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        if line:
+            writer.add_line(line)
+    writer.flush()
+    return offset
+
+
+def _open_log(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _rotated_files(log_dir: Path, oldest: date) -> list[tuple[str, Path]]:
+    out = []
+    for entry in os.scandir(log_dir):
+        m = _ROTATED_RE.match(entry.name)
+        if m and date.fromisoformat(m.group(1)) >= oldest:
+            out.append((m.group(1), Path(entry.path)))
+    return sorted(out)
+
+
+def index_once() -> int:
+    """执行一轮增量索引（需已持有写锁），返回新增记录数。"""
+    log_dir = Path(settings.LOG_DIR)
+    oldest = date.today() - timedelta(days=settings.LOG_RETENTION_DAYS)
+    conn = _connect()
+    try:
+        writer = _Writer(conn)
+        current = _get_state(conn, "current")
+        live = log_dir / LOG_NAME
+        live_stat = live.stat() if live.exists() else None
+        rotated_away = current is not None and (
+            live_stat is None or live_stat.st_ino != current["inode"] or live_stat.st_size < current["offset"]
+        )
+
+        done = {name for (name,) in conn.execute("SELECT name FROM done_files")}
+        resume_offset = current["offset"] if rotated_away else 0
+        for day, path in _rotated_files(log_dir, oldest):
+            if path.name in done or f"{LOG_NAME}.{day}" in done:
+                continue
+            start = 0
+            # 上一个 app.log 滚动后的文件：从已索引的偏移继续（每个当前文件只续读一次）
+            if rotated_away and resume_offset and day >= current["day"]:
+                start, resume_offset = resume_offset, 0
+            with _open_log(path) as f:
+                _ingest(writer, f, start, complete=True)
+            conn.execute("INSERT OR IGNORE INTO done_files(name) VALUES (?)", (path.name,))
+            conn.commit()
+        if rotated_away:
+            current = None
+
+        if live_stat is not None:
+            if current is None:
+                current = {"inode": live_stat.st_ino, "offset": 0, "day": date.today().isoformat()}
+            with open(live, "rb") as f:
+                current["offset"] = _ingest(writer, f, current["offset"], complete=False)
+            _set_state(conn, "current", current)
+        conn.commit()
+
+        _prune(conn, oldest)
+        return writer.count
+    finally:
+        conn.close()
+
+
+def _prune(conn: sqlite3.Connection, oldest: date) -> None:
+    """每天一次删除保留期之外的记录，并归还空闲页。"""
+    today = date.today().isoformat()
+    last = _get_state(conn, "pruned")
+    if last and last.get("day") == today:
+        return
+    cutoff = oldest.isoformat()
+    if _has_fts(conn):
+        conn.execute(
+            "INSERT INTO entries_fts(entries_fts, rowid, message) "
+            "SELECT 'delete', id, message FROM entries WHERE ts < ?",
+            (cutoff,),
+        )
+    deleted = conn.execute("DELETE FROM entries WHERE ts < ?", (cutoff,)).rowcount
+    conn.execute("DELETE FROM done_files WHERE substr(name, ?, 10) < ?", (len(LOG_NAME) + 2, cutoff))
+    _set_state(conn, "pruned", {"day": today})
+    conn.commit()
+    conn.execute("PRAGMA incremental_vacuum")
+    if deleted:
+        logger.info("Log index pruned %s entries before %s", deleted, cutoff)
+
+
+def _run_locked() -> None:
+    log_dir = Path(settings.LOG_DIR)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with open(log_dir / ".log_index.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # 其他 worker 进程正在写索引
+            return
+        index_once()
+
+
+class LogIndexer:
+    """后台定时增量索引的守护线程。"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if not settings.LOG_INDEX_ENABLED or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="log-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                _run_locked()
+            except Exception:
+                logger.exception("Log indexing failed")
+            self._stop.wait(settings.LOG_INDEX_INTERVAL_SECONDS)
+
+
+log_indexer = LogIndexer()
+
+
+def _normalize_time(value: str | None, end: bool = False) -> str | None:
+    """接受 YYYY-MM-DD、YYYY-MM-DD HH:MM[:SS] 或 ISO 格式，转换为日志时间戳的可比较前缀。"""
+    if not value:
+        return None
+    text = value.strip().replace("T", " ")
+    try:
+        if len(text) == 10:
+            day = date.fromisoformat(text)
+            return (day + timedelta(days=1)).isoformat() if end else day.isoformat()
+        return datetime.fromisoformat(text).strftime("%Y-%m-%d %H:%M:%S,%f")[:23]
+    except ValueError:
+        raise LogIndexError("时间格式应为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS")
+
+
+def search(
+    start: str | None = None,
+    end: str | None = None,
+    level: str | None = None,
+    logger_name: str | None = None,
+    request_id: str | None = None,
+    keyword: str | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict:
+    """
+    检索索引（按时间倒序）。level 可为逗号分隔的多个级别；keyword 为子串（不少于 3 个字符走全文索引）。
+    cursor 为上一页返回的 next_cursor。
+    """
+    where, params = [], []
+    start_ts, end_ts = _normalize_time(start), _normalize_time(end, end=True)
+    if start_ts:
+        where.append("e.ts >= ?")
+        params.append(start_ts)
+    if end_ts:
+        where.append("e.ts < ?" if len(end_ts) == 10 else "e.ts <= ?")
+        params.append(end_ts)
+    if level:
+        levels = [x.strip().upper() for x in level.split(",") if x.strip()]
+        where.append(f"e.level IN ({','.join('?' * len(levels))})")
+        params.extend(levels)
+    if logger_name:
+        where.append("e.logger = ?")
+        params.append(logger_name)
+    if request_id:
+        where.append("e.request_id = ?")
+        params.append(request_id)
+    if cursor:
+        try:
+            cursor_ts, cursor_id = cursor.rsplit("|", 1)
+            cursor_id = int(cursor_id)
+        except ValueError:
+            raise LogIndexError("游标无效")
+        where.append("(e.ts < ? OR (e.ts = ? AND e.id < ?))")
+        params.extend([cursor_ts, cursor_ts, cursor_id])
+
+    started = time.perf_counter()
+    conn = _connect(readonly=True)
+    try:
+        if keyword:
+            if len(keyword) >= 3 and _has_fts(conn):
+                where.append("e.id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)")
+                params.append('"' + keyword.replace('"', '""') + '"')
+            else:
+                where.append("instr(e.message, ?) > 0")
+                params.append(keyword)
+        sql = "SELECT e.id, e.ts, e.level, e.logger, e.request_id, e.message FROM entries e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.ts DESC, e.id DESC LIMIT ?"
+        rows = conn.execute(sql, (*params, limit)).fetchall()
+        current = _get_state(conn, "current")
+    finally:
+        conn.close()
+
+    items = [
+        {"id": r[0], "ts": r[1], "level": r[2], "logger": r[3], "request_id": r[4], "message": r[5]} for r in rows
+    ]
+    return {
+        "items": items,
+        "next_cursor": f"{rows[-1][1]}|{rows[-1][0]}" if len(rows) == limit else None,
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+        "indexed_offset": current["offset"] if current else None,
+    }
+
+
+def stats() -> dict:
+    path = index_path()
+    if not path.exists():
+        return {"enabled": settings.LOG_INDEX_ENABLED, "entries": 0, "size_bytes": 0}
+    conn = _connect(readonly=True)
+    try:
+        count, oldest, newest = conn.execute("SELECT count(*), min(ts), max(ts) FROM entries").fetchone()
+    finally:
+        conn.close()
+    size = sum(os.path.getsize(p) for p in (str(path), f"{path}-wal") if os.path.exists(p))
+    return {
+        "enabled": settings.LOG_INDEX_ENABLED,
+        "entries": count,
+        "oldest": oldest,
+        "newest": newest,
+        "size_bytes": size,
+    }
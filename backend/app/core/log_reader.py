@@ -0,0 +1,166 @@
+"""
+日志文件读取：按天定位文件（当日 app.log，历史 app.log.YYYY-MM-DD[.gz]），
+从文件末尾按块向前扫描，凑够条数即停止，不再为取最后几百行读完整个文件。
+
+游标为行首在（解压后）文件中的字节偏移：
+- before：返回该位置之前的匹配行（向前翻页）
+- after：返回该位置及之后的匹配行（查看新增日志）
+gzip 压缩的历史文件无法反向定位，只能顺序解压，但文件已不再增长，体积也小得多。
+"""
+import gzip
+import os
+from collections import deque
+from datetime import date
+from pathlib import Path
+from app.core.config import settings
+
+LOG_NAME = "app.log"
+_BLOCK = 64 * 1024
+
+
+def log_file_for(day: date | None) -> Path | None:
+    """当日（或未指定）对应 app.log；历史日期优先取压缩文件，兼容未压缩的旧文件。"""
+    log_dir = Path(settings.LOG_DIR)
+    if day is None or day >= date.today():
+        path = log_dir / LOG_NAME
+        return path if path.exists() else None
+    for name in (f"{LOG_NAME}.{day.isoformat()}.gz", f"{LOG_NAME}.{day.isoformat()}"):
+        path = log_dir / name
+        if path.exists():
+            return path
+    return None
+
+
+def _matcher(level: str | None, keyword: str | None):
+    # 文件为 JSON 行（"level": "INFO"）；旧的文本格式日志为 [INFO]
+    level_json = f'"level": "{level.upper()}"'.encode("utf-8") if level else None
+    level_text = f"[{level.upper()}]".encode("utf-8") if level else None
+    keyword_b = keyword.encode("utf-8") if keyword else None
+
+    def match(line: bytes) -> bool:
+        if level_json and level_json not in line and level_text not in line:
+            return False
+        if keyword_b and keyword_b not in line:
+            return False
+        return True
+
+    return match
+
+
+def _scan_backward(f, end: int, match, limit: int) -> tuple[list[tuple[int, bytes]], bool]:
+    """从 end 向前按块读取，返回 ([(行首偏移, 行)]（由新到旧）, 是否已读到文件开头)。"""
+    found: list[tuple[int, bytes]] = []
+    pos = end
+    tail = b""
+    while pos > 0 and len(found) < limit:
+        size = min(_BLOCK, pos)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + tail).split(b"\n")
+        offsets = []
+        offset = pos
+        for seg in lines:
+            offsets.append(offset)
+            offset += len(seg) + 1
+        # 块首的半行留到下一轮与前一块拼接；已到文件开头时它就是第一行
+        first = 1 if pos > 0 else 0
+        for i in range(len(lines) - 1, first - 1, -1):
+            if lines[i] and match(lines[i]):
+                found.append((offsets[i], lines[i]))
+                if len(found) >= limit:
+                    return found, False
+        tail = lines[0] if pos > 0 else b""
+    return found, pos == 0
+
+
+def _scan_forward(f, start: int, end: int | None, match, limit: int, keep_last: bool):
+    """
+    顺序读取 [start, end)。keep_last 时只保留最后 limit 条（用于无法反向定位的 gzip），
+    否则凑够 limit 条即停止。返回 ([(行首偏移, 行)]（由旧到新）, 扫描结束位置, 之前是否还有被丢弃的匹配)。
+    """
+    found: deque[tuple[int, bytes]] = deque(maxlen=limit if keep_last else None)
+    dropped = False
+    f.seek(start)
+    offset = start
+    for line in f:
+        if end is not None and offset >= end:
+            break
+        if not line.endswith(b"\n") and end is None and not keep_last:
+            # 当前文件末尾尚未写完的行，留给下一次 after 请求
+            break
+        text = line.rstrip(b"\r\n")
+        if text and match(text):
+            if keep_last and len(found) == limit:
+                dropped = True
+            found.append((offset, text))
+            if not keep_last and len(found) >= limit:
+                offset += len(line)
+                break
+        offset += len(line)
+    return list(found), offset, dropped
+
+
+def read_lines(
+    path: Path,
+    level: str | None = None,
+    keyword: str | None = None,
+    limit: int = 200,
+    before: int | None = None,
+    after: int | None = None,
+) -> dict:
+    """
+    读取匹配行（按时间先后排列）。返回 items 以及翻页游标：
+    next_before 为继续向前翻页的游标（没有更早的匹配时为 None），
+    next_after 为下次拉取新增日志的游标。
+    """
+    match = _matcher(level, keyword)
+    compressed = path.suffix == ".gz"
+    if compressed:
+        with gzip.open(path, "rb") as f:
+            if after is not None:
+                found, scanned, _ = _scan_forward(f, after, None, match, limit, keep_last=False)
+                more_before = None
+            else:
+                found, scanned, more_before = _scan_forward(f, 0, before, match, limit, keep_last=True)
+    else:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if after is not None:
+                found, scanned, _ = _scan_forward(f, min(after, size), None, match, limit, keep_last=False)
+                more_before = None
+            else:
+                end = size if before is None else min(before, size)
+                newest_first, at_start = _scan_backward(f, end, match, limit)
+                found = list(reversed(newest_first))
+                more_before = not at_start
+                scanned = size if before is None else end
+
+    items = [line.decode("utf-8", errors="replace") for _, line in found]
+    if after is not None:
+        next_before = found[0][0] if found else None
+        next_after = scanned
+    else:
+        next_before = found[0][0] if found and more_before else None
+        next_after = scanned if before is None else None
+    return {"items": items, "next_before": next_before, "next_after": next_after}
+
+
+def compress_rotated(source: str, dest: str) -> None:
+    """
+    TimedRotatingFileHandler 的 rotator：把滚动出的日志压缩为 dest（namer 已追加 .gz）后删除原文件。
+    先写入以点开头的临时文件再改名，避免半成品被 getFilesToDelete 当作历史日志。
+    """
+    dirname, basename = os.path.split(dest)
+    tmp = os.path.join(dirname, f".{basename}.part")
+    with open(source, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as out:
+        while True:
+            chunk = src.read(1024 * 1024)
+            if not chunk:
+                break
+            out.write(chunk)
+    os.replace(tmp, dest)
+    os.remove(source)
+
+
+def gz_namer(default_name: str) -> str:
+    return default_name + ".gz"
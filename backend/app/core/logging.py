@@ -1,46 +1,202 @@
+import atexit
+import copy
+import json
 import logging
 import logging.config
+import logging.handlers
+import queue
+import threading
 from pathlib import Path
 from app.core.config import settings
+from app.core.log_reader import LOG_NAME, compress_rotated, gz_namer
+from app.core.request_id import current_context
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s %(message)s"
+
+# LogRecord 自带的属性；其余属性视为 extra 字段写入 JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_CONTEXT_KEYS = ("request_id", "route", "user_id")
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    """一行一条 JSON：ts、level、logger、message，请求上下文（request_id / route / user_id）与 extra 字段。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in _CONTEXT_KEYS:
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key not in data:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    有界队列：请求线程只负责入队，写控制台与文件由 QueueListener 线程完成。
+    队列满时 INFO 及以下直接丢弃；WARNING 及以上最多等待 LOG_QUEUE_BLOCK_MS 再丢弃（背压）。
+    丢弃数量计入统计，并在队列恢复后补记一条告警。
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self._lock = threading.Lock()
+        self.counters = {"enqueued": 0, "dropped": 0, "dropped_warning": 0, "blocked": 0}
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在请求线程中补齐上下文（ContextVar 在监听线程中不可见），并提前格式化消息与异常，
+        # 避免把不可序列化或可变的参数对象交给其他线程
+        record = copy.copy(record)
+        for key, value in current_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self._drop(record)
+                return
+            with self._lock:
+                self.counters["blocked"] += 1
+            try:
+                self.queue.put(record, timeout=settings.LOG_QUEUE_BLOCK_MS / 1000)
+            except queue.Full:
+                self._drop(record)
+                return
+        with self._lock:
+            self.counters["enqueued"] += 1
+            unreported, self._unreported = self._unreported, 0
+        if unreported:
+            notice = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0, "Log queue full: dropped %s records", (unreported,), None
+            )
+            notice.message = notice.msg = notice.getMessage()
+            notice.args = None
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                pass
+
+    def _drop(self, record: logging.LogRecord) -> None:
+        with self._lock:
+            self.counters["dropped"] += 1
+            if record.levelno >= logging.WARNING:
+                self.counters["dropped_warning"] += 1
+            self._unreported += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "depth": self.queue.qsize(), "max_size": self.queue.maxsize}
+
+
+_queue_handler: BoundedQueueHandler | None = None
+
+
+def _queue_handler_factory(maxsize: int) -> BoundedQueueHandler:
+    global _queue_handler
+    _queue_handler = BoundedQueueHandler(queue.Queue(maxsize))
+    return _queue_handler
+
+
+def _file_handler(logfile: Path) -> logging.Handler:
+    handler = logging.handlers.TimedRotatingFileHandler(
+        str(logfile),
+        when="midnight",
+        interval=1,
+        backupCount=settings.LOG_RETENTION_DAYS,
+        encoding="utf-8",
+        utc=False,
+        delay=True,
+    )
+    # 滚动出的历史日志压缩为 app.log.YYYY-MM-DD.gz；getFilesToDelete 按文件名中的日期段
+    # 匹配，压缩文件与旧的未压缩文件都会按 LOG_RETENTION_DAYS 清理
+    handler.namer = gz_namer
+    handler.rotator = compress_rotated
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(settings.LOG_LEVEL)
+    return handler
+
+
+def _console_handler() -> logging.Handler:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler.setLevel(settings.LOG_LEVEL)
+    return handler
 
 
 def setup_logging():
+    """
+    所有 logger 只挂一个有界队列 handler，控制台（文本）与文件（JSON 行）由后台监听线程写出，
+    请求线程不做磁盘 I/O。访问日志由 RequestIdMiddleware 记录（app.access，含耗时），
+    uvicorn 自带的访问日志只保留 WARNING 以上。
+    """
+    global _listener
     log_dir = Path(settings.LOG_DIR)
     log_dir.mkdir(parents=True, exist_ok=True)
-    logfile = log_dir / "app.log"
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
 
     logging.config.dictConfig(
         {
             "version": 1,
             "disable_existing_loggers": False,
-            "formatters": {
-                "default": {
-                    "format": "%(asctime)s [%(levelname)s] %(name)s %(message)s",
-                }
-            },
             "handlers": {
-                "console": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "default",
-                    "level": settings.LOG_LEVEL,
-                },
-                "file": {
-                    "class": "logging.handlers.TimedRotatingFileHandler",
-                    "formatter": "default",
+                "queue": {
+                    "()": _queue_handler_factory,
+                    "maxsize": settings.LOG_QUEUE_MAX_SIZE,
                     "level": settings.LOG_LEVEL,
-                    "filename": str(logfile),
-                    "interval": 1,
-                    "when": "midnight",
-                    "backupCount": settings.LOG_RETENTION_DAYS,
-                    "encoding": "utf-8",
-                    "utc": False,
-                    "delay": True,
                 },
             },
             "loggers": {
-                "uvicorn.error": {"handlers": ["console", "file"], "level": settings.LOG_LEVEL, "propagate": False},
-                "uvicorn.access": {"handlers": ["console", "file"], "level": settings.LOG_LEVEL, "propagate": False},
-                "": {"handlers": ["console", "file"], "level": settings.LOG_LEVEL},
+                "uvicorn.error": {"handlers": ["queue"], "level": settings.LOG_LEVEL, "propagate": False},
+                "uvicorn.access": {"handlers": ["queue"], "level": "WARNING", "propagate": False},
+                "": {"handlers": ["queue"], "level": settings.LOG_LEVEL},
             },
         }
     )
+    _listener = logging.handlers.QueueListener(
+        _queue_handler.queue,
+        _console_handler(),
+        _file_handler(log_dir / LOG_NAME),
+        respect_handler_level=True,
+    )
+    _listener.start()
+
+
+def _shutdown_listener() -> None:
+    # 进程退出前把队列中剩余的记录写完
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_shutdown_listener)
+
+
+def pipeline_stats() -> dict:
+    """日志队列状态：入队/丢弃/背压等待次数与当前深度。"""
+    return _queue_handler.stats() if _queue_handler else {}
@@ -0,0 +1,324 @@
+import copy
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+from app.core.config import settings
+from app.core.jobs import JobPool, JobQueueFull
+from app.core.request_id import track_external
+from app.core.storage import download_oss_to_path
+
+logger = logging.getLogger(__name__)
+
+_CACHE_MAX_ENTRIES = 512
+_cache: "OrderedDict[str, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# 音视频后台处理（HLS 切片等）共用的任务池，ffmpeg 转码很重，默认单线程
+media_jobs = JobPool("media", settings.MEDIA_WORKERS, settings.MEDIA_MAX_PENDING)
+
+
+# 后台任务写进 media_info 的状态（缩略图任务结果、faststart 标记）属于具体的 file_id，
+# 不是内容的探测结果，按 sha256 复用给新文件前要去掉，否则新文件会带上别人的任务状态
+JOB_STATE_KEYS = ("thumbnails", "faststart")
+
+
+class MediaError(Exception):
+    pass
+
+
+class SharedSource:
+    """
+    一次上传排队的多个音视频任务（faststart、缩略图、HLS）共用的源文件：
+    OSS 存储时由第一个用到的任务下载到临时目录，后续任务直接复用，最后一个任务结束后删除。
+    """
+
+    def __init__(self, file_id: str, file_name: str):
+        self.file_id = file_id
+        self.file_name = file_name
+        self._users = 0
+        self._dir: str | None = None
+        self._path: str | None = None
+        self._lock = threading.Lock()
+
+    def attach(self) -> None:
+        with self._lock:
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users <= 0 and self._dir:
+                shutil.rmtree(self._dir, ignore_errors=True)
+                self._dir = self._path = None
+
+    def path(self) -> str:
+        """返回本地副本路径，首次调用时下载（并发的任务在锁上等待同一次下载）。"""
+        with self._lock:
+            if self._path is None:
+                work_dir = tempfile.mkdtemp(prefix="media_src_")
+                suffix = os.path.splitext(self.file_name)[1]
+                try:
+                    self._path = download_oss_to_path(self.file_id, os.path.join(work_dir, f"source{suffix}"))
+                except BaseException:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                    raise
+                self._dir = work_dir
+            return self._path
+
+
+def submit_media_job(key: str, source: SharedSource | None, fn: Callable, *args) -> Future:
+    """
+    提交音视频任务；带共享源文件时以关键字参数 source 传给任务，
+    任务结束（含提前返回与失败）或未能提交时释放引用。
+    """
+    if source is None:
+        return media_jobs.submit(key, fn, *args)
+
+    def run():
+        try:
+            return fn(*args, source=source)
+        finally:
+            source.release()
+
+    existing = media_jobs.get(key)
+    source.attach()
+    try:
+        fut = media_jobs.submit(key, run)
+    except JobQueueFull:
+        source.release()
+        raise
+    if fut is existing:
+        # 同一 key 的任务已在执行，本次提交被单飞复用，run 不会执行
+        source.release()
+    return fut
+
+
+def probe_fields(info: dict | None) -> dict | None:
+    """去掉任务状态，只保留可按内容复用的探测结果。"""
+    if not info:
+        return info
+    return {k: v for k, v in info.items() if k not in JOB_STATE_KEYS}
+
+
+def cached_media_info(sha256: str | None) -> dict | None:
+    """按 sha256 读取进程内缓存的探测结果（返回副本，调用方修改不影响缓存）。"""
+    if not sha256:
+        return None
+    with _cache_lock:
+        info = _cache.get(sha256)
+        if info is not None:
+            _cache.move_to_end(sha256)
+    return copy.deepcopy(info)
+
+
+def lookup_media_info(db, sha256: str | None) -> dict | None:
+    """按 sha256 复用已有探测结果：先查进程内缓存，再查同内容资源的 media_info（去掉其任务状态）。"""
+    from app.models.resource import Resource
+
+    if not sha256:
+        return None
+    info = cached_media_info(sha256)
+    if info is not None:
+        return info
+    row = (
+        db.query(Resource.media_info)
+        .filter(Resource.file_sha256 == sha256, Resource.media_info.isnot(None))
+        .first()
+    )
+    if row and row[0]:
+        info = probe_fields(row[0])
+        remember_media_info(sha256, info)
+        return info
+    return None
+
+
+def remember_media_info(sha256: str | None, info: dict | None) -> None:
+    if not sha256 or not info:
+        return
+    info = copy.deepcopy(probe_fields(info))
+    with _cache_lock:
+        _cache[sha256] = info
+        _cache.move_to_end(sha256)
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def _to_float(value) -> float | None:
+    if value in (None, "", "N/A"):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> int | None:
+    num = _to_float(value)
+    return int(num) if num is not None else None
+
+
+def _ratio(value: str | None) -> float | None:
+    if not value or "/" not in value:
+        return None
+    num, den = value.split("/", 1)
+    try:
+        result = float(num) / float(den)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return result if result > 0 else None
+
+
+def _stream_seconds(stream: dict) -> float | None:
+    """依次尝试 duration、duration_ts*time_base、nb_frames/avg_frame_rate。"""
+    seconds = _to_float(stream.get("duration"))
+    if seconds and seconds > 0:
+        return seconds
+    duration_ts = _to_float(stream.get("duration_ts"))
+    base = _ratio(stream.get("time_base"))
+    if duration_ts and base:
+        return duration_ts * base
+    frames = _to_float(stream.get("nb_frames"))
+    fps = _ratio(stream.get("avg_frame_rate"))
+    if frames and fps:
+        return frames / fps
+    return None
+
+
+def _run(args: list[str], **kwargs) -> subprocess.CompletedProcess:
+    # ffprobe / ffmpeg 耗时计入当前请求的 Server-Timing（subprocess）
+    with track_external("subprocess", args[0]):
+        return subprocess.run(args, **kwargs)
+
+
+def _run_ffprobe(path: str) -> dict | None:
+    res = _run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_format",
+            "-show_streams",
+            "-of",
+            "json",
+            path,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=settings.MEDIA_PROBE_TIMEOUT_SECONDS,
+    )
+    if res.returncode != 0 or not res.stdout:
+        return None
+    try:
+        return json.loads(res.stdout.decode(errors="ignore"))
+    except ValueError:
+        return None
+
+
+def _ffmpeg_duration(path: str) -> float | None:
+    """兜底：解析 ffmpeg -i 输出的 Duration 行（仅在 ffprobe 拿不到时长时使用）。"""
+    res = _run(
+        ["ffmpeg", "-hide_banner", "-i", path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=settings.MEDIA_PROBE_TIMEOUT_SECONDS,
+    )
+    output = (res.stderr or b"").decode(errors="ignore")
+    match = re.search(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if not match:
+        return None
+    total = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3))
+    return total if total > 0 else None
+
+
+def parse_probe(data: dict) -> dict:
+    """把 ffprobe JSON 整理为播放器使用的元数据。"""
+    fmt = data.get("format") or {}
+    streams = data.get("streams") or []
+    video = next((s for s in streams if s.get("codec_type") == "video" and not (s.get("disposition") or {}).get("attached_pic")), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    seconds = _to_float(fmt.get("duration"))
+    if not seconds or seconds <= 0:
+        seconds = next((x for x in (_stream_seconds(s) for s in (video, audio) if s) if x), None)
+
+    info: dict = {
+        "duration_seconds": int(round(seconds)) if seconds else None,
+        "format": fmt.get("format_name"),
+        "bit_rate": _to_int(fmt.get("bit_rate")),
+        "size_bytes": _to_int(fmt.get("size")),
+        "video": None,
+        "audio": None,
+    }
+    if video:
+        fps = _ratio(video.get("avg_frame_rate")) or _ratio(video.get("r_frame_rate"))
+        info["video"] = {
+            "codec": video.get("codec_name"),
+            "profile": video.get("profile"),
+            "width": _to_int(video.get("width")),
+            "height": _to_int(video.get("height")),
+            "frame_rate": round(fps, 3) if fps else None,
+            "bit_rate": _to_int(video.get("bit_rate")),
+            "pix_fmt": video.get("pix_fmt"),
+        }
+    if audio:
+        info["audio"] = {
+            "codec": audio.get("codec_name"),
+            "sample_rate": _to_int(audio.get("sample_rate")),
+            "channels": _to_int(audio.get("channels")),
+            "bit_rate": _to_int(audio.get("bit_rate")),
+        }
+    return info
+
+
+def inspect_media(path: str) -> dict | None:
+    """
+    单次 ffprobe（-show_format -show_streams -of json）提取时长、编码、分辨率、码率、采样率。
+    每次子进程调用都有硬超时；仅当拿不到时长时才退回 ffmpeg -i 解析。
+    探测失败（未安装、超时、无法创建子进程、输出格式异常等）返回 None，不影响上传。
+    """
+    try:
+        data = _run_ffprobe(path)
+        info = parse_probe(data) if isinstance(data, dict) else None
+    except (FileNotFoundError, subprocess.TimeoutExpired):
+        info = None
+    except (OSError, subprocess.SubprocessError, ValueError, TypeError, AttributeError):
+        # 无法创建子进程、输出不是预期的 JSON 结构等：按探测失败处理
+        logger.warning("ffprobe failed for %s", path, exc_info=True)
+        info = None
+    if info and info["duration_seconds"]:
+        return info
+    try:
+        seconds = _ffmpeg_duration(path)
+    except (OSError, subprocess.SubprocessError, ValueError):
+        seconds = None
+    if not seconds:
+        return info
+    info = info or {"format": None, "bit_rate": None, "size_bytes": None, "video": None, "audio": None}
+    info["duration_seconds"] = int(round(seconds))
+    return info
+
+
+def run_ffmpeg(args: list[str], timeout: float) -> None:
+    """执行 ffmpeg（带硬超时），失败时抛出 MediaError 并附上 stderr 末尾内容。"""
+    try:
+        res = _run(
+            ["ffmpeg", "-hide_banner", "-nostdin", "-y", *args],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except FileNotFoundError:
+        raise MediaError("未安装 ffmpeg")
+    except subprocess.TimeoutExpired:
+        raise MediaError("ffmpeg 处理超时")
+    if res.returncode != 0:
+        tail = (res.stderr or b"").decode(errors="ignore").strip().splitlines()[-5:]
+        raise MediaError("ffmpeg 处理失败: " + " | ".join(tail))
@@ -0,0 +1,168 @@
+"""
+请求与运行指标。
+
+- Prometheus 指标（GET /metrics）：按路由的耗时直方图与状态码计数、SQL 次数与耗时、请求/响应字节数、
+  数据库连接池、缓存命中、外部调用（OSS / AI / soffice / ffmpeg / ffprobe）耗时。
+  配置 METRICS_MULTIPROC_DIR 后使用 prometheus_client 多进程模式：各 uvicorn worker 把数值写入该目录下的
+  mmap 文件，任一 worker 响应 /metrics 时汇总全部进程。该目录需在启动 worker 前清空。
+- 进程内汇总（request_stats，供 /admin/metrics/requests）：按路由的平均/最大耗时等，便于直接查看。
+
+指标均按路由模板而非实际路径聚合，避免 /resources/123 这类路径撑爆维度；
+未匹配任何路由的请求（如 404）统一记为 "unmatched"。
+"""
+import os
+import threading
+import time
+from app.core.config import settings
+
+# prometheus_client 在导入时根据环境变量决定是否使用多进程模式，必须先于导入设置
+if settings.METRICS_MULTIPROC_DIR:
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.METRICS_MULTIPROC_DIR
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+_HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_EXTERNAL_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route"], buckets=_HTTP_BUCKETS
+)
+HTTP_DB_SECONDS = Counter("http_request_db_seconds_total", "Time spent in SQL per route", ["method", "route"])
+HTTP_DB_QUERIES = Counter("http_request_db_queries_total", "SQL statements per route", ["method", "route"])
+HTTP_REQUEST_BYTES = Counter("http_request_body_bytes_total", "Request body bytes (uploads)", ["method", "route"])
+HTTP_RESPONSE_BYTES = Counter("http_response_body_bytes_total", "Response body bytes (downloads)", ["method", "route"])
+EXTERNAL_DURATION = Histogram(
+    "external_call_duration_seconds",
+    "OSS / AI upstream / subprocess call latency",
+    ["kind", "name"],
+    buckets=_EXTERNAL_BUCKETS,
+)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups", ["cache", "result"])
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Open pooled DB connections", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "DB connections currently checked out", multiprocess_mode="livesum")
+
+# labels() 每次都要加锁查找，按标签缓存子指标，每个请求只做一次 dict 查找
+_route_children: dict[tuple[str, str], tuple] = {}
+_status_children: dict[tuple[str, str, int], Counter] = {}
+
+_lock = threading.Lock()
+_routes: dict[tuple[str, str], dict] = {}
+_started_at = time.time()
+
+
+def observe_request(
+    method: str,
+    route: str | None,
+    status: int,
+    seconds: float,
+    db_seconds: float,
+    db_queries: int,
+    external: dict[str, float],
+    request_bytes: int = 0,
+    response_bytes: int = 0,
+) -> None:
+    route = route or UNMATCHED_ROUTE
+    children = _route_children.get((method, route))
+    if children is None:
+        children = _route_children[(method, route)] = tuple(
+            metric.labels(method, route)
+            for metric in (HTTP_DURATION, HTTP_DB_SECONDS, HTTP_DB_QUERIES, HTTP_REQUEST_BYTES, HTTP_RESPONSE_BYTES)
+        )
+    duration, db_seconds_total, db_queries_total, request_bytes_total, response_bytes_total = children
+    counter = _status_children.get((method, route, status))
+    if counter is None:
+        counter = _status_children[(method, route, status)] = HTTP_REQUESTS.labels(method, route, str(status))
+    counter.inc()
+    duration.observe(seconds)
+    if db_queries:
+        db_seconds_total.inc(db_seconds)
+        db_queries_total.inc(db_queries)
+    if request_bytes:
+        request_bytes_total.inc(request_bytes)
+    if response_bytes:
+        response_bytes_total.inc(response_bytes)
+
+    key = (method, route)
+    with _lock:
+        entry = _routes.get(key)
+        if entry is None:
+            entry = _routes[key] = {
+                "count": 0,
+                "errors": 0,
+                "seconds": 0.0,
+                "max_seconds": 0.0,
+                "db_seconds": 0.0,
+                "db_queries": 0,
+                "external": {},
+            }
+        entry["count"] += 1
+        if status >= 500:
+            entry["errors"] += 1
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        entry["db_seconds"] += db_seconds
+        entry["db_queries"] += db_queries
+        for kind, value in external.items():
+            entry["external"][kind] = entry["external"].get(kind, 0.0) + value
+
+
+def observe_external(kind: str, name: str, seconds: float) -> None:
+    EXTERNAL_DURATION.labels(kind, name).observe(seconds)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Prometheus 文本格式；多进程模式下汇总所有 worker。"""
+    if settings.METRICS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """worker 退出时调用：移除本进程的 livesum 仪表值（计数器与直方图保留）。"""
+    if settings.METRICS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def request_stats() -> dict:
+    """按总耗时倒序的路由统计（毫秒）；仅为当前 worker 进程自启动以来的数据。"""
+    with _lock:
+        snapshot = [(key, {**entry, "external": dict(entry["external"])}) for key, entry in _routes.items()]
+    items = []
+    for (method, route), entry in snapshot:
+        count = entry["count"]
+        items.append(
+            {
+                "method": method,
+                "route": route,
+                "count": count,
+                "errors": entry["errors"],
+                "avg_ms": round(entry["seconds"] * 1000 / count, 1),
+                "max_ms": round(entry["max_seconds"] * 1000, 1),
+                "total_ms": round(entry["seconds"] * 1000, 1),
+                "avg_db_ms": round(entry["db_seconds"] * 1000 / count, 1),
+                "avg_db_queries": round(entry["db_queries"] / count, 2),
+                "avg_external_ms": {k: round(v * 1000 / count, 1) for k, v in entry["external"].items()},
+            }
+        )
+    items.sort(key=lambda x: x["total_ms"], reverse=True)
+    return {"since": int(_started_at), "items": items}
@@ -0,0 +1,318 @@
+import logging
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from app.core.config import settings
+from app.core.request_id import track_external
+
+try:  # LibreOffice 自带的 Python 桥（python3-uno），未安装时退回命令行转换
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:  # pragma: no cover - 取决于运行环境
+    uno = None
+    PropertyValue = None
+    NoConnectException = Exception
+
+logger = logging.getLogger(__name__)
+
+# 不同文档组件对应的 PDF 导出过滤器
+_PDF_FILTERS = (
+    ("com.sun.star.presentation.PresentationDocument", "impress_pdf_Export"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "calc_pdf_Export"),
+    ("com.sun.star.drawing.DrawingDocument", "draw_pdf_Export"),
+    ("com.sun.star.text.TextDocument", "writer_pdf_Export"),
+)
+
+
+class OfficeUnavailable(Exception):
+    """常驻实例不可用（未安装 uno、启动失败、崩溃或超时），调用方应退回 CLI 转换。"""
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _props(**kwargs):
+    out = []
+    for k, v in kwargs.items():
+        p = PropertyValue()
+        p.Name = k
+        p.Value = v
+        out.append(p)
+    return tuple(out)
+
+
+class OfficeInstance:
+    """一个常驻的 headless LibreOffice 进程（UNO socket 监听）及其连接。"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.port = 0
+        self.process: subprocess.Popen | None = None
+        self.profile_dir: str | None = None
+        self.desktop = None
+        self.jobs_done = 0
+        self.started_at = 0.0
+        self.restarts = 0
+
+    def start(self) -> None:
+        self.port = _free_port()
+        self.profile_dir = tempfile.mkdtemp(prefix=f"lo_profile_{self.index}_")
+        self.process = subprocess.Popen(
+            [
+                "soffice",
+                f"-env:UserInstallation=file://{self.profile_dir}",
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--norestore",
+                "--nodefault",
+                "--nolockcheck",
+                f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.started_at = time.monotonic()
+        self.jobs_done = 0
+        self.desktop = self._connect(settings.OFFICE_START_TIMEOUT_SECONDS)
+
+    def _connect(self, timeout: float):
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        url = f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.process and self.process.poll() is not None:
+                raise OfficeUnavailable(f"soffice[{self.index}] exited with {self.process.returncode}")
+            try:
+                ctx = resolver.resolve(url)
+                return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+            except NoConnectException:
+                if time.monotonic() > deadline:
+                    raise OfficeUnavailable(f"soffice[{self.index}] did not start listening in time")
+                time.sleep(0.2)
+
+    def stop(self) -> None:
+        self.desktop = None
+        proc = self.process
+        self.process = None
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait(timeout=5)
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            self.profile_dir = None
+
+    def kill(self) -> None:
+        proc = self.process
+        if proc and proc.poll() is None:
+            proc.kill()
+
+    def rss_bytes(self) -> int:
+        if not self.process:
+            return 0
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError):
+            return 0
+        return 0
+
+    def health_problem(self) -> str | None:
+        """返回需要重启的原因；健康时返回 None。"""
+        if not self.process or self.process.poll() is not None:
+            return "not running"
+        if self.desktop is None:
+            return "not connected"
+        if self.jobs_done >= settings.OFFICE_MAX_JOBS_PER_INSTANCE:
+            return f"served {self.jobs_done} jobs"
+        rss = self.rss_bytes()
+        if rss > settings.OFFICE_MAX_RSS_MB * 1024 * 1024:
+            return f"rss {rss // (1024 * 1024)}MB"
+        return None
+
+    def restart(self, reason: str) -> None:
+        logger.info("Restarting soffice[%s]: %s", self.index, reason)
+        self.stop()
+        self.restarts += 1
+        self.start()
+
+    def convert(self, src_path: str, out_path: str, timeout: float) -> None:
+        """通过 UNO 把 src 导出为 PDF。超时由看门狗直接杀进程，使阻塞的 UNO 调用立即失败。"""
+        watchdog = threading.Timer(timeout, self.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        doc = None
+        try:
+            doc = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(src_path)),
+                "_blank",
+                0,
+                _props(Hidden=True, ReadOnly=True),
+            )
+            if doc is None:
+                raise OfficeUnavailable("document could not be loaded")
+            filter_name = next((f for svc, f in _PDF_FILTERS if doc.supportsService(svc)), "writer_pdf_Export")
+            doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(out_path)), _props(FilterName=filter_name))
+        except OfficeUnavailable:
+            raise
+        except Exception as exc:
+            raise OfficeUnavailable(f"uno conversion failed: {exc}")
+        finally:
+            watchdog.cancel()
+            if doc is not None:
+                try:
+                    doc.close(True)
+                except Exception:
+                    pass
+            self.jobs_done += 1
+        if not Path(out_path).exists():
+            raise OfficeUnavailable("no output produced")
+
+
+class OfficePool:
+    """
+    常驻 LibreOffice 实例池：
+    - 每个实例同一时间只处理一个任务（空闲实例放在队列中）
+    - 后台线程定期健康检查：进程退出、内存超限或任务数达到上限时重启
+    - 转换失败/超时的实例会被重启，本次任务交给调用方走 CLI 兜底
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: "queue.Queue[OfficeInstance]" = queue.Queue()
+        self._instances: list[OfficeInstance] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._stop = threading.Event()
+        self.stats = {"uno_jobs": 0, "uno_failures": 0, "restarts": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return uno is not None and self.size > 0
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.size):
+            inst = OfficeInstance(i)
+            self._instances.append(inst)
+            try:
+                inst.start()
+            except (OfficeUnavailable, OSError) as exc:
+                logger.warning("soffice[%s] failed to start: %s", i, exc)
+            self._idle.put(inst)
+        threading.Thread(target=self._health_loop, name="office-health", daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        for inst in self._instances:
+            inst.stop()
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(settings.OFFICE_HEALTHCHECK_INTERVAL_SECONDS):
+            # 只检查空闲实例，正在转换的实例由任务自身处理
+            for _ in range(self._idle.qsize()):
+                try:
+                    inst = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._ensure_healthy(inst)
+                except Exception:
+                    # 不能让意外异常结束健康检查线程
+                    logger.exception("soffice[%s] health check failed", inst.index)
+                finally:
+                    self._idle.put(inst)
+
+    def _ensure_healthy(self, inst: OfficeInstance) -> bool:
+        problem = inst.health_problem()
+        if problem is None:
+            return True
+        try:
+            inst.restart(problem)
+            self._count("restarts")
+            return True
+        except (OfficeUnavailable, OSError) as exc:
+            logger.warning("soffice[%s] restart failed: %s", inst.index, exc)
+            return False
+        except Exception:
+            # UNO 连接阶段可能抛出 RuntimeException / DisposedException 等非 OfficeUnavailable 异常
+            logger.exception("soffice[%s] restart failed", inst.index)
+            return False
+
+    def _count(self, key: str) -> None:
+        # 多个转换任务线程会同时更新
+        with self._lock:
+            self.stats[key] += 1
+
+    def convert(self, src_path: str, out_path: str, deadline: float) -> None:
+        """deadline 为 time.monotonic() 时刻：等待空闲实例与 UNO 转换共用同一截止时间。"""
+        if not self.enabled:
+            raise OfficeUnavailable("uno not available")
+        self.start()
+        try:
+            inst = self._idle.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise OfficeUnavailable("no idle office instance")
+        try:
+            if not self._ensure_healthy(inst):
+                raise OfficeUnavailable(f"soffice[{inst.index}] unhealthy")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OfficeUnavailable("conversion deadline exceeded")
+            try:
+                with track_external("subprocess", "soffice-uno"):
+                    inst.convert(src_path, out_path, remaining)
+                self._count("uno_jobs")
+            except OfficeUnavailable:
+                self._count("uno_failures")
+                inst.kill()
+                raise
+        finally:
+            self._idle.put(inst)
+
+    def _stats_snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def info(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": self.size,
+            "instances": [
+                {
+                    "index": i.index,
+                    "pid": i.process.pid if i.process else None,
+                    "alive": bool(i.process and i.process.poll() is None),
+                    "jobs_done": i.jobs_done,
+                    "rss_bytes": i.rss_bytes(),
+                    "restarts": i.restarts,
+                }
+                for i in self._instances
+            ],
+            **self._stats_snapshot(),
+        }
+
+
+office_pool = OfficePool(settings.OFFICE_POOL_SIZE)
@@ -0,0 +1,161 @@
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import pypdfium2 as pdfium
+from app.core.config import settings
+from app.core import preview_cache
+from app.core.storage import is_oss_enabled, download_oss_to_path, local_upload_path
+
+logger = logging.getLogger(__name__)
+
+# 两档缩放：按目标像素宽度渲染（列表/手机用 sm，放大或高分屏用 lg）
+ZOOM_WIDTHS = {"sm": 800, "lg": 1600}
+DEFAULT_ZOOM = "sm"
+_MAX_PIXELS_PER_SIDE = 4000
+
+MANIFEST_NAME = "manifest.json"
+
+# pdfium 不是线程安全的，进程内所有调用串行
+_pdfium_lock = threading.Lock()
+
+
+class PdfPageError(Exception):
+    pass
+
+
+def pages_dir(file_id: str) -> str:
+    """分页图片缓存目录：PREVIEW_DIR/{file_id}.pages/，作为一个条目参与预览缓存容量管理。"""
+    return os.path.join(settings.PREVIEW_DIR, f"{file_id}.pages")
+
+
+def signature_subject(file_id: str) -> str:
+    # 与下载签名区分，分页图片签名不能用于下载原文件
+    return f"pages/{file_id}"
+
+
+def native_pdf_path(file_id: str, file_name: str) -> str:
+    """原生 PDF 的本地路径；OSS 存储时下载一份到预览缓存（{file_id}.src.pdf）。"""
+    if not is_oss_enabled():
+        path = local_upload_path(file_id, file_name)
+        if not os.path.exists(path):
+            raise PdfPageError("源文件不存在")
+        return path
+    path = os.path.join(settings.PREVIEW_DIR, f"{file_id}.src.pdf")
+    if os.path.exists(path):
+        preview_cache.touch(path)
+        return path
+    os.makedirs(settings.PREVIEW_DIR, exist_ok=True)
+    lock_dir = os.path.join(settings.PREVIEW_DIR, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f"{file_id}.src.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            fd, tmp_path = tempfile.mkstemp(prefix=".job_", dir=settings.PREVIEW_DIR)
+            os.close(fd)
+            try:
+                download_oss_to_path(file_id, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            preview_cache.add(path)
+    return path
+
+
+def _open(pdf_path: str):
+    try:
+        return pdfium.PdfDocument(pdf_path)
+    except pdfium.PdfiumError as exc:
+        raise PdfPageError(f"PDF 无法解析: {exc}")
+
+
+def manifest(file_id: str, pdf_path: str) -> dict:
+    """页数与每页尺寸（pt），首次访问时生成并缓存，供前端按比例占位、按需加载。"""
+    out_dir = pages_dir(file_id)
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        preview_cache.record_hit(out_dir)
+        return data
+    except (FileNotFoundError, ValueError):
+        pass
+    preview_cache.record_miss()
+    with _pdfium_lock:
+        pdf = _open(pdf_path)
+        try:
+            sizes = [[round(w, 2), round(h, 2)] for w, h in (pdf.get_page_size(i) for i in range(len(pdf)))]
+        finally:
+            pdf.close()
+    data = {"page_count": len(sizes), "pages": sizes}
+    _write_atomic(path, json.dumps(data).encode())
+    preview_cache.add(out_dir)
+    return data
+
+
+def page_image(file_id: str, pdf_path: str, n: int, zoom: str) -> str:
+    """第 n 页（从 1 开始）指定缩放的 WebP，缺失时即时渲染并缓存。"""
+    if zoom not in ZOOM_WIDTHS:
+        zoom = DEFAULT_ZOOM
+    out_dir = pages_dir(file_id)
+    path = os.path.join(out_dir, f"{zoom}_{n}.webp")
+    if os.path.exists(path):
+        preview_cache.touch(out_dir)
+        return path
+    with _pdfium_lock:
+        if os.path.exists(path):
+            return path
+        pdf = _open(pdf_path)
+        try:
+            if n < 1 or n > len(pdf):
+                raise IndexError(n)
+            page = pdf[n - 1]
+            try:
+                width, height = page.get_size()
+                scale = min(ZOOM_WIDTHS[zoom] / width, _MAX_PIXELS_PER_SIDE / height)
+                # to_pil 与 bitmap 共享内存：复制一份后在锁内释放 bitmap，WebP 编码放到锁外
+                bitmap = page.render(scale=scale)
+                image = bitmap.to_pil().copy()
+                bitmap.close()
+            finally:
+                page.close()
+        finally:
+            pdf.close()
+    _replace_atomic(path, lambda tmp_path: image.save(tmp_path, "WEBP", quality=80, method=4))
+    # 新渲染的页面使目录变大，需计入预览缓存预算
+    preview_cache.add(out_dir, throttle=True)
+    return path
+
+
+def _replace_atomic(path: str, write) -> None:
+    """
+    write(tmp_path) 写入同目录临时文件后原子替换。{file_id}.pages 目录可能在渲染期间被预览缓存淘汰整体删除，
+    所以写入前才创建目录，目录中途消失（FileNotFoundError）时重建并重试一次。
+    """
+    out_dir = os.path.dirname(path)
+    for attempt in range(2):
+        os.makedirs(out_dir, exist_ok=True)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+            os.close(fd)
+            write(tmp_path)
+            os.replace(tmp_path, path)
+            return
+        except FileNotFoundError:
+            if attempt:
+                raise
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    def write(tmp_path: str) -> None:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+    _replace_atomic(path, write)
@@ -0,0 +1,152 @@
+import fcntl
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from pathlib import Path
+from app.core.config import settings
+from app.core import preview_cache
+from app.core.jobs import JobPool
+from app.core.request_id import track_external
+from app.core.office import OfficeUnavailable, office_pool
+from app.core.storage import is_oss_enabled, download_oss_to_path, local_upload_path
+
+logger = logging.getLogger(__name__)
+
+OFFICE_EXTS = {"pptx", "docx", "xlsx"}
+
+STATUS_READY = "ready"
+STATUS_PENDING = "pending"
+STATUS_FAILED = "failed"
+
+_pool = JobPool("preview", settings.PREVIEW_WORKERS, settings.PREVIEW_MAX_PENDING)
+
+
+class PreviewError(Exception):
+    pass
+
+
+def preview_pdf_path(file_id: str) -> str:
+    return os.path.join(settings.PREVIEW_DIR, f"{file_id}.pdf")
+
+
+def preview_status(file_id: str) -> str | None:
+    """ready / pending / failed；从未请求过返回 None。"""
+    if os.path.exists(preview_pdf_path(file_id)):
+        return STATUS_READY
+    if _pool.is_pending(file_id):
+        return STATUS_PENDING
+    if _pool.failure(file_id):
+        return STATUS_FAILED
+    return None
+
+
+def preview_failure(file_id: str) -> str | None:
+    return _pool.failure(file_id)
+
+
+def request_preview(file_id: str, file_name: str) -> str:
+    """确保转换任务已入队，返回当前状态。同一 file_id 同时只会有一个转换任务。"""
+    status = preview_status(file_id)
+    if status is not None:
+        return status
+    _pool.submit(file_id, _convert, file_id, file_name)
+    return STATUS_PENDING
+
+
+def wait_preview(file_id: str, timeout: float) -> str:
+    fut = _pool.get(file_id)
+    if fut is not None:
+        try:
+            fut.result(timeout=timeout)
+        except FutureTimeoutError:
+            return STATUS_PENDING
+        except Exception:
+            pass
+    return preview_status(file_id) or STATUS_FAILED
+
+
+def pool_stats() -> dict:
+    return _pool.stats()
+
+
+def _fetch_source(file_id: str, file_name: str, job_dir: str) -> str:
+    if is_oss_enabled():
+        suffix = Path(file_name).suffix
+        return download_oss_to_path(file_id, os.path.join(job_dir, f"source{suffix}"))
+    path = local_upload_path(file_id, file_name)
+    if not os.path.exists(path):
+        raise PreviewError("源文件不存在")
+    return path
+
+
+def _soffice_convert(src_path: str, out_dir: str, profile_dir: str, timeout: float) -> None:
+    if timeout <= 0:
+        raise PreviewError("预览生成超时")
+    try:
+        with track_external("subprocess", "soffice"):
+            subprocess.run(
+                [
+                    "soffice",
+                    f"-env:UserInstallation=file://{profile_dir}",
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    "--outdir",
+                    out_dir,
+                    src_path,
+                ],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=timeout,
+            )
+    except FileNotFoundError:
+        raise PreviewError("未安装 LibreOffice，无法生成预览")
+    except subprocess.TimeoutExpired:
+        raise PreviewError("预览生成超时")
+    except subprocess.CalledProcessError as e:
+        raise PreviewError(f"预览生成失败: {e.stderr.decode(errors='ignore')}")
+
+
+def _convert(file_id: str, file_name: str) -> str:
+    """
+    在独立的任务目录中转换（含独立的 LibreOffice 用户配置，避免并发实例互相抢占），
+    完成后原子 rename 到 PREVIEW_DIR/{file_id}.pdf。
+    多个 worker 进程之间用文件锁串行化同一 file_id 的转换。
+    等待空闲实例、UNO 转换与 CLI 兜底共用一个截止时间，整个任务不超过 PREVIEW_CONVERT_TIMEOUT_SECONDS。
+    """
+    os.makedirs(settings.PREVIEW_DIR, exist_ok=True)
+    final_path = preview_pdf_path(file_id)
+    lock_dir = os.path.join(settings.PREVIEW_DIR, ".locks")
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, f"{file_id}.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if os.path.exists(final_path):
+            return final_path
+        job_dir = tempfile.mkdtemp(prefix=".job_", dir=settings.PREVIEW_DIR)
+        try:
+            src_path = _fetch_source(file_id, file_name, job_dir)
+            out_dir = os.path.join(job_dir, "out")
+            os.makedirs(out_dir)
+            deadline = time.monotonic() + settings.PREVIEW_CONVERT_TIMEOUT_SECONDS
+            try:
+                # 优先交给常驻 LibreOffice 实例，省去每次冷启动
+                office_pool.convert(src_path, os.path.join(out_dir, "preview.pdf"), deadline)
+            except OfficeUnavailable as exc:
+                if office_pool.enabled:
+                    logger.warning("UNO conversion of %s failed, falling back to CLI: %s", file_id, exc)
+                shutil.rmtree(out_dir, ignore_errors=True)
+                os.makedirs(out_dir)
+                _soffice_convert(src_path, out_dir, os.path.join(job_dir, "profile"), deadline - time.monotonic())
+            pdfs = [p for p in os.listdir(out_dir) if p.endswith(".pdf")]
+            if not pdfs:
+                raise PreviewError("预览生成失败")
+            os.replace(os.path.join(out_dir, pdfs[0]), final_path)
+            preview_cache.add(final_path)
+            return final_path
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
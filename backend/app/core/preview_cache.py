@@ -0,0 +1,197 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0, "removed": 0}
+# 逐步增长的条目（如 PDF 分页图目录）每写入一次都可能触发淘汰，扫描整个缓存目录较重，限制频率
+_ENFORCE_INTERVAL_SECONDS = 5.0
+# 打包下载的缓存（export_{digest}.zip）按内容摘要命名、不属于单个文件，对账时不清理，只受容量预算淘汰
+EXPORT_PREFIX = "export_"
+_last_enforced = 0.0
+
+
+def _budget_bytes() -> int:
+    return max(0, settings.PREVIEW_CACHE_MAX_MB) * 1024 * 1024
+
+
+def _entry_size(path: str) -> int:
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _entries() -> list[tuple[str, int, float]]:
+    """
+    缓存条目：PREVIEW_DIR 下命名为 {file_id}.<kind> 的文件或目录（以 . 开头的是任务/锁目录，跳过）。
+    返回 (路径, 字节数, 最近访问时间)。
+    """
+    out = []
+    try:
+        it = os.scandir(settings.PREVIEW_DIR)
+    except FileNotFoundError:
+        return out
+    with it:
+        for e in it:
+            if e.name.startswith("."):
+                continue
+            try:
+                atime = e.stat().st_atime
+            except OSError:
+                continue
+            out.append((e.path, _entry_size(e.path), atime))
+    return out
+
+
+def _delete(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def touch(path: str) -> None:
+    """记录一次访问：更新 atime 作为 LRU 依据（不依赖文件系统的 atime 挂载选项，多进程共享）。"""
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass
+
+
+def record_hit(path: str) -> None:
+    with _lock:
+        _stats["hits"] += 1
+    metrics.record_cache_lookup("preview", True)
+    touch(path)
+
+
+def record_miss() -> None:
+    with _lock:
+        _stats["misses"] += 1
+    metrics.record_cache_lookup("preview", False)
+
+
+def enforce_budget(keep: str | None = None) -> None:
+    """按最近访问时间淘汰最旧条目，直到总大小不超过预算；keep 为刚生成的条目，不参与淘汰。"""
+    budget = _budget_bytes()
+    if budget <= 0:
+        return
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    if total <= budget:
+        return
+    for path, size, _ in sorted(entries, key=lambda x: x[2]):
+        if total <= budget:
+            break
+        if keep and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        _delete(path)
+        total -= size
+        with _lock:
+            _stats["evictions"] += 1
+            _stats["evicted_bytes"] += size
+        logger.info("Preview cache evicted %s (%s bytes)", os.path.basename(path), size)
+
+
+def add(path: str, throttle: bool = False) -> None:
+    """
+    登记新写入（或变大）的条目并按预算淘汰。throttle=True 用于频繁增长的目录条目：
+    本进程距上次淘汰不足 _ENFORCE_INTERVAL_SECONDS 时只更新访问时间。
+    """
+    global _last_enforced
+    touch(path)
+    if throttle:
+        now = time.monotonic()
+        with _lock:
+            if now - _last_enforced < _ENFORCE_INTERVAL_SECONDS:
+                return
+            _last_enforced = now
+    enforce_budget(keep=path)
+
+
+def remove_file(file_id: str | None) -> None:
+    """删除某个文件的全部预览产物（资源删除、文件替换时调用）。"""
+    if not file_id:
+        return
+    prefix = f"{file_id}."
+    for path, _, _ in _entries():
+        if os.path.basename(path).startswith(prefix):
+            _delete(path)
+            with _lock:
+                _stats["removed"] += 1
+
+
+def _owner_file_id(name: str, live_file_ids: set[str]) -> str | None:
+    idx = name.find(".")
+    while idx != -1:
+        if name[:idx] in live_file_ids:
+            return name[:idx]
+        idx = name.find(".", idx + 1)
+    return None
+
+
+def reconcile(live_file_ids: set[str]) -> None:
+    """
+    启动时对账：
+    - 清理崩溃遗留的任务目录（超过转换超时两倍仍存在的 .job_*）
+    - 删除已不属于任何有效资源文件的预览（打包下载缓存除外）
+    - 按预算淘汰
+    """
+    root = settings.PREVIEW_DIR
+    if not os.path.isdir(root):
+        return
+    stale_before = time.time() - settings.PREVIEW_CONVERT_TIMEOUT_SECONDS * 2
+    orphans = 0
+    with os.scandir(root) as it:
+        for e in it:
+            try:
+                mtime = e.stat().st_mtime
+            except OSError:
+                continue
+            if e.name.startswith(".job_"):
+                if mtime < stale_before:
+                    _delete(e.path)
+                continue
+            if e.name.startswith(".") or e.name.startswith(EXPORT_PREFIX):
+                continue
+            if _owner_file_id(e.name, live_file_ids) is None:
+                _delete(e.path)
+                orphans += 1
+    enforce_budget()
+    logger.info("Preview cache reconciled: removed %s orphan entries", orphans)
+
+
+def stats() -> dict:
+    entries = _entries()
+    with _lock:
+        data = dict(_stats)
+    lookups = data["hits"] + data["misses"]
+    data.update(
+        {
+            "hit_rate": round(data["hits"] / lookups, 4) if lookups else None,
+            "size_bytes": sum(size for _, size, _ in entries),
+            "entries": len(entries),
+            "budget_bytes": _budget_bytes(),
+        }
+    )
+    return data
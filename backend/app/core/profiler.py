@@ -0,0 +1,450 @@
+"""
+按需性能剖析：管理员开启一个剖析会话后，对匹配的请求（可按路由模板、用户过滤）采集
+cProfile 统计（.pstats）或调用栈采样（collapsed stack，.folded，可直接生成火焰图），
+在会话时间窗口内或采满 max_requests 个请求后自动结束。
+
+- 关闭时零开销：只有会话进行中才把匹配路由的 endpoint（route.dependant.call）替换为包装函数，
+  会话结束即还原；平时请求路径上没有任何额外判断
+- 多 worker：会话写入 PROFILE_DIR/session.json，各 worker 的守护线程每秒检查一次并同步安装/卸载；
+  采集名额通过 O_EXCL 创建剖析文件抢占，多个进程合计不超过 max_requests
+- 只覆盖 endpoint 函数本身（依赖注入已完成，user_id 可用于过滤）；StreamingResponse 的生成器在
+  endpoint 返回后才执行，不在剖析范围内。异步 endpoint 运行在事件循环线程上，
+  剖析/采样结果会混入同时在事件循环上执行的其他协程
+"""
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from fastapi.routing import APIRoute
+from app.core.config import settings
+from app.core.request_id import current_context
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cprofile", "sample")
+SESSION_FILE = "session.json"
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{12}-\d{3}$")
+
+_lock = threading.Lock()
+_app = None
+_session: dict | None = None
+_session_stamp: tuple | None = None
+# (路由, 原 endpoint)；路由对象不可哈希，用列表保存
+_originals: list[tuple] = []
+_sampler: "_Sampler | None" = None
+
+
+class ProfilerError(Exception):
+    pass
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+_CWD = os.getcwd() + os.sep
+
+
+def _short_path(filename: str) -> str:
+    idx = filename.rfind("/site-packages/")
+    if idx >= 0:
+        return filename[idx + len("/site-packages/"):]
+    return filename[len(_CWD):] if filename.startswith(_CWD) else filename
+
+
+def _stack(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Sampler:
+    """按固定间隔对登记的线程取调用栈；只在采样会话进行中运行。"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets: dict[int, set["_Capture"]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def add(self, thread_id: int, capture: "_Capture") -> None:
+        with self._lock:
+            self._targets.setdefault(thread_id, set()).add(capture)
+
+    def remove(self, thread_id: int, capture: "_Capture") -> None:
+        with self._lock:
+            captures = self._targets.get(thread_id)
+            if captures is not None:
+                captures.discard(capture)
+                if not captures:
+                    del self._targets[thread_id]
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                if not self._targets:
+                    continue
+                targets = {tid: list(captures) for tid, captures in self._targets.items()}
+            frames = sys._current_frames()
+            for tid, captures in targets.items():
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = _stack(frame)
+                for capture in captures:
+                    capture.samples[stack] += 1
+
+
+class _Capture:
+    """一次请求的剖析：start/finish 必须在执行 endpoint 的同一线程中调用。"""
+
+    def __init__(self, session: dict, profile_id: str, route):
+        self.session = session
+        self.profile_id = profile_id
+        self.route = route
+        self.context = current_context()
+        self.samples: Counter = Counter()
+        self._profile: cProfile.Profile | None = None
+        self._thread_id = threading.get_ident()
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        if self.session["mode"] == "cprofile":
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # 同一线程上已有剖析在进行（如并发的异步请求）
+                self._profile = None
+        elif _sampler is not None:
+            _sampler.add(self._thread_id, self)
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+        elif _sampler is not None:
+            _sampler.remove(self._thread_id, self)
+        try:
+            self._write(elapsed)
+        except OSError:
+            logger.exception("Failed to write profile %s", self.profile_id)
+
+    def _write(self, elapsed: float) -> None:
+        base = profile_dir() / self.profile_id
+        if self.session["mode"] == "cprofile":
+            if self._profile is None:
+                data_file = None
+            else:
+                data_file = base.with_suffix(".pstats")
+                self._profile.dump_stats(str(data_file))
+        else:
+            data_file = base.with_suffix(".folded")
+            with open(data_file, "w", encoding="utf-8") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        meta = {
+            "id": self.profile_id,
+            "session_id": self.session["id"],
+            "mode": self.session["mode"],
+            "route": self.route.path,
+            "methods": sorted(self.route.methods or []),
+            "request_id": self.context.get("request_id"),
+            "user_id": self.context.get("user_id"),
+            "duration_ms": round(elapsed * 1000, 1),
+            "samples": sum(self.samples.values()) if self.session["mode"] == "sample" else None,
+            "file": data_file.name if data_file else None,
+            "created_at": int(time.time()),
+        }
+        tmp = base.with_name(f".{self.profile_id}.json.tmp")
+        tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, base.with_suffix(".json"))
+
+
+def _claim(session: dict) -> str | None:
+    """抢占一个采集名额：以 O_EXCL 创建 {会话}-{序号}.json，多个 worker 之间也不会超额。"""
+    for n in range(session["max_requests"]):
+        profile_id = f"{session['id']}-{n:03d}"
+        try:
+            fd = os.open(profile_dir() / f"{profile_id}.json", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return profile_id
+    return None
+
+
+def _begin(route) -> "_Capture | None":
+    session = _session
+    if session is None or time.time() >= session["until"]:
+        return None
+    if session.get("user_id") is not None and current_context().get("user_id") != session["user_id"]:
+        return None
+    try:
+        profile_id = _claim(session)
+    except OSError:
+        return None
+    if profile_id is None:
+        # 名额已满，结束会话
+        stop_session(session["id"])
+        return None
+    return _Capture(session, profile_id, route)
+
+
+def _wrap(route, call):
+    if inspect.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def async_wrapper(**kwargs):
+            capture = _begin(route)
+            if capture is None:
+                return await call(**kwargs)
+            capture.start()
+            try:
+                return await call(**kwargs)
+            finally:
+                capture.finish()
+
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(**kwargs):
+        capture = _begin(route)
+        if capture is None:
+            return call(**kwargs)
+        capture.start()
+        try:
+            return call(**kwargs)
+        finally:
+            capture.finish()
+
+    return wrapper
+
+
+def _iter_routes(routes):
+    """展开路由表：新版 FastAPI 的 include_router 不再复制路由，而是为每处包含生成带独立 dependant 的
+    effective route，需递归展开才能拿到实际执行的 dependant。"""
+    for r in routes:
+        if hasattr(r, "effective_candidates"):
+            yield from _iter_routes(r.effective_candidates())
+        elif isinstance(r, APIRoute) or isinstance(getattr(r, "original_route", None), APIRoute):
+            yield r
+
+
+def _routes(app, route_path: str | None) -> list:
+    return [
+        r
+        for r in _iter_routes(app.routes)
+        if (route_path is None or r.path == route_path)
+        # 生成器 endpoint 由 FastAPI 直接迭代，不能包装
+        and not inspect.isgeneratorfunction(r.dependant.call)
+        and not inspect.isasyncgenfunction(r.dependant.call)
+    ]
+
+
+def _install(session: dict) -> None:
+    global _session, _sampler
+    _uninstall()
+    if session["mode"] == "sample":
+        _sampler = _Sampler(session["interval_ms"] / 1000)
+    for route in _routes(_app, session.get("route")):
+        _originals.append((route, route.dependant.call))
+        route.dependant.call = _wrap(route, route.dependant.call)
+    _session = session
+    logger.info(
+        "Profiler session %s started: mode=%s route=%s user_id=%s routes=%s",
+        session["id"], session["mode"], session.get("route"), session.get("user_id"), len(_originals),
+    )
+
+
+def _uninstall() -> None:
+    global _session, _sampler
+    if _session is None and not _originals:
+        return
+    for route, call in _originals:
+        route.dependant.call = call
+    _originals.clear()
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+    if _session is not None:
+        logger.info("Profiler session %s stopped", _session["id"])
+    _session = None
+
+
+def _read_session() -> tuple[dict | None, tuple | None]:
+    path = profile_dir() / SESSION_FILE
+    try:
+        st = path.stat()
+        session = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None, None
+    return session, (st.st_ino, st.st_mtime_ns)
+
+
+def sync() -> None:
+    """按 session.json 安装或卸载本进程的包装函数；会话过期时删除会话文件。"""
+    global _session_stamp
+    if _app is None:
+        return
+    with _lock:
+        session, stamp = _read_session()
+        if session is not None and time.time() >= session["until"]:
+            try:
+                (profile_dir() / SESSION_FILE).unlink()
+            except FileNotFoundError:
+                pass
+            session, stamp = None, None
+        if stamp == _session_stamp:
+            return
+        _session_stamp = stamp
+        if session is None:
+            _uninstall()
+        else:
+            _install(session)
+
+
+def _prune() -> None:
+    """只保留最近 PROFILE_MAX_PROFILES 个剖析结果。"""
+    metas = sorted(profile_dir().glob("*-[0-9][0-9][0-9].json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for meta in metas[settings.PROFILE_MAX_PROFILES:]:
+        for path in profile_dir().glob(f"{meta.stem}.*"):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def start_session(
+    app,
+    mode: str,
+    route: str | None,
+    user_id: int | None,
+    duration_seconds: int,
+    max_requests: int,
+    interval_ms: int,
+) -> dict:
+    global _app
+    if mode not in MODES:
+        raise ProfilerError("mode 只能是 cprofile 或 sample")
+    if route is not None and not _routes(app, route):
+        raise ProfilerError("路由不存在或不支持剖析")
+    _app = app
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    _prune()
+    session = {
+        "id": uuid.uuid4().hex[:12],
+        "mode": mode,
+        "route": route,
+        "user_id": user_id,
+        "max_requests": max_requests,
+        "interval_ms": interval_ms,
+        "created_at": int(time.time()),
+        "until": int(time.time()) + duration_seconds,
+    }
+    tmp = directory / f".{SESSION_FILE}.tmp"
+    tmp.write_text(json.dumps(session), encoding="utf-8")
+    os.replace(tmp, directory / SESSION_FILE)
+    sync()
+    return session
+
+
+def stop_session(session_id: str | None = None) -> None:
+    """结束会话（指定 session_id 时只在它仍是当前会话时结束）。"""
+    current, _ = _read_session()
+    if current is not None and (session_id is None or current["id"] == session_id):
+        try:
+            (profile_dir() / SESSION_FILE).unlink()
+        except FileNotFoundError:
+            pass
+    sync()
+
+
+def current_session() -> dict | None:
+    session, _ = _read_session()
+    if session is None or time.time() >= session["until"]:
+        return None
+    return session
+
+
+def list_profiles() -> list[dict]:
+    items = []
+    for path in profile_dir().glob("*-[0-9][0-9][0-9].json"):
+        try:
+            items.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            # 已抢占名额、尚未写完的剖析
+            continue
+    items.sort(key=lambda x: x["created_at"], reverse=True)
+    return items
+
+
+def profile_file(profile_id: str) -> Path:
+    if not PROFILE_ID_RE.match(profile_id):
+        raise ProfilerError("剖析结果不存在")
+    try:
+        meta = json.loads((profile_dir() / f"{profile_id}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raise ProfilerError("剖析结果不存在")
+    if not meta.get("file") or not (profile_dir() / meta["file"]).exists():
+        raise ProfilerError("剖析结果不存在")
+    return profile_dir() / meta["file"]
+
+
+def pstats_summary(path: Path, limit: int = 40) -> str:
+    """pstats 文件按累计耗时排序的文本摘要。"""
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+class ProfilerWatcher:
+    """各 worker 中每秒同步一次剖析会话的守护线程。"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self, app) -> None:
+        global _app
+        _app = app
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="profiler-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with _lock:
+            _uninstall()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(1):
+            try:
+                sync()
+            except Exception:
+                logger.exception("Profiler sync failed")
+
+
+profiler_watcher = ProfilerWatcher()
@@ -0,0 +1,325 @@
+"""
+PostgreSQL 查询洞察（管理后台）：
+
+- 读取 pg_stat_statements（需已安装扩展并在 shared_preload_libraries 中加载），按总耗时 / 平均耗时 / 次数排行
+- 对选定语句执行 EXPLAIN (ANALYZE, BUFFERS)：只接受当前数据库中由应用自身角色执行过的单条 SELECT
+  （或只读 WITH），且只能调用白名单中的函数（READ ONLY 挡不住 pg_terminate_backend、pg_advisory_lock、
+  dblink、set_config 等有副作用的函数）；pg_stat_statements 中的常量已被替换为 $n，按参数类型填入中性的
+  样例值（或由管理员指定），不会带入真实用户数据；在只读事务中执行并设置 statement_timeout，结束后回滚
+- 索引提示：resources / resource_tags / download_logs / ai_chat_messages 上未被使用的索引、
+  缺少索引的外键列，以及以顺序扫描为主的表（统计自上次 reset 起）
+"""
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.session import engine
+
+INSIGHT_TABLES = ("resources", "resource_tags", "download_logs", "ai_chat_messages")
+
+_SORT_COLUMNS = {"total": "total_ms", "mean": "mean_ms", "calls": "calls"}
+_MAX_QUERY_CHARS = 4000
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_WRITE_RE = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|ALTER|DROP|CREATE|GRANT|REVOKE|COPY|CALL|DO|VACUUM|LOCK)\b", re.I
+)
+_LOCKING_RE = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b", re.I)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_QUOTED_IDENT_RE = re.compile(r'"((?:[^"]|"")*)"')
+# 紧跟左括号的标识符：函数调用（带 schema 前缀时取最后一段），或下面列出的关键字与类型名
+_CALL_RE = re.compile(r"([A-Za-z_][\w$]*)\s*\(")
+_CALL_KEYWORDS = {
+    "select", "from", "where", "join", "on", "using", "lateral", "with", "as", "recursive", "materialized",
+    "in", "exists", "any", "all", "some", "values", "row", "array", "and", "or", "not", "is", "distinct",
+    "like", "ilike", "between", "case", "when", "then", "else", "union", "intersect", "except",
+    "over", "filter", "within", "group", "by", "partition", "order", "having", "window", "limit", "offset",
+    "cast", "extract", "substring", "position", "trim", "overlay",
+    "numeric", "decimal", "varchar", "character", "char", "varying", "timestamp", "time", "interval", "bit", "float",
+}
+# 应用语句会用到的无副作用函数（聚合、窗口、字符串、时间、数组、JSON）
+_ALLOWED_FUNCTIONS = {
+    "count", "sum", "avg", "min", "max", "bool_and", "bool_or", "every", "string_agg", "array_agg",
+    "json_agg", "jsonb_agg", "json_object_agg", "jsonb_object_agg",
+    "row_number", "rank", "dense_rank", "percent_rank", "cume_dist", "ntile", "lag", "lead",
+    "first_value", "last_value", "nth_value",
+    "coalesce", "nullif", "greatest", "least", "abs", "round", "ceil", "ceiling", "floor", "trunc", "mod",
+    "lower", "upper", "length", "char_length", "character_length", "octet_length", "substr", "strpos",
+    "btrim", "ltrim", "rtrim", "replace", "concat", "concat_ws", "left", "right", "split_part", "md5",
+    "to_char", "to_date", "to_timestamp", "to_number", "date_trunc", "date_part", "age", "now",
+    "array_length", "array_position", "cardinality", "unnest", "generate_series",
+    "json_build_object", "jsonb_build_object", "json_build_array", "jsonb_build_array",
+    "json_extract_path_text", "jsonb_extract_path_text", "jsonb_array_length", "json_array_length",
+    "to_tsvector", "to_tsquery", "plainto_tsquery", "websearch_to_tsquery", "ts_rank",
+}
+
+_INT_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision"}
+_TEXT_TYPES = {"text", "character varying", "character", "name", "unknown"}
+_TIME_TYPES = {"timestamp with time zone", "timestamp without time zone", "date"}
+
+
+class QueryInsightsError(Exception):
+    pass
+
+
+class QueryInsightsUnavailable(QueryInsightsError):
+    pass
+
+
+def _ensure_postgres() -> None:
+    if engine.dialect.name != "postgresql":
+        raise QueryInsightsUnavailable("查询洞察仅支持 PostgreSQL")
+
+
+def _server_version(db: Session) -> int:
+    return int(db.execute(text("SHOW server_version_num")).scalar())
+
+
+def _ensure_pg_stat_statements(db: Session) -> None:
+    _ensure_postgres()
+    installed = db.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")).first()
+    if not installed:
+        raise QueryInsightsUnavailable("数据库未安装 pg_stat_statements 扩展")
+
+
+def top_statements(db: Session, sort: str = "total", limit: int = 20) -> list[dict]:
+    """当前数据库中按 total（总耗时）/ mean（平均耗时）/ calls（次数）排序的语句。"""
+    _ensure_pg_stat_statements(db)
+    # PostgreSQL 13 起耗时列改名为 *_exec_time
+    suffix = "exec_time" if _server_version(db) >= 130000 else "time"
+    sql = f"""
+        SELECT queryid, query, calls, rows,
+               total_{suffix} AS total_ms, mean_{suffix} AS mean_ms, max_{suffix} AS max_ms,
+               shared_blks_hit, shared_blks_read
+        FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        ORDER BY {_SORT_COLUMNS[sort]} DESC
+        LIMIT :limit
+    """
+    try:
+        rows = db.execute(text(sql), {"limit": limit}).mappings().all()
+    except DBAPIError as e:
+        # 扩展已创建但未在 shared_preload_libraries 中加载时，查询视图会报错
+        db.rollback()
+        raise QueryInsightsUnavailable(f"pg_stat_statements 不可用: {e.orig}")
+    items = []
+    for r in rows:
+        blocks = (r["shared_blks_hit"] or 0) + (r["shared_blks_read"] or 0)
+        items.append(
+            {
+                "queryid": str(r["queryid"]),
+                "query": r["query"][:_MAX_QUERY_CHARS],
+                "calls": r["calls"],
+                "rows": r["rows"],
+                "total_ms": round(r["total_ms"], 1),
+                "mean_ms": round(r["mean_ms"], 2),
+                "max_ms": round(r["max_ms"], 1),
+                "cache_hit_ratio": round(r["shared_blks_hit"] / blocks, 4) if blocks else None,
+            }
+        )
+    return items
+
+
+def _called_functions(sql: str) -> set[str]:
+    """语句中调用的函数名（小写）；字符串常量不参与匹配，带引号的标识符按名字本身匹配。"""
+    sql = _STRING_RE.sub("''", sql)
+    sql = _QUOTED_IDENT_RE.sub(lambda m: re.sub(r"\W", "_", m.group(1)), sql)
+    return {name.lower() for name in _CALL_RE.findall(sql)} - _CALL_KEYWORDS
+
+
+def _sanitize(query: str) -> str:
+    """只允许单条只读 SELECT，且只能调用白名单中的函数；去掉注释与末尾分号。"""
+    sql = _COMMENT_RE.sub(" ", query).strip().rstrip(";").strip()
+    if ";" in sql:
+        raise QueryInsightsError("只能分析单条语句")
+    if not re.match(r"(SELECT|WITH)\b", sql, re.I):
+        raise QueryInsightsError("只能分析 SELECT 语句")
+    if _WRITE_RE.search(sql) or _LOCKING_RE.search(sql):
+        raise QueryInsightsError("语句包含写入或加锁操作，不能执行 EXPLAIN ANALYZE")
+    # 只读事务仍可执行有副作用的函数（结束连接、咨询锁、dblink、修改会话参数等）
+    disallowed = sorted(_called_functions(sql) - _ALLOWED_FUNCTIONS)
+    if disallowed:
+        raise QueryInsightsError(f"语句调用了不在白名单中的函数（{', '.join(disallowed)}），不能执行 EXPLAIN ANALYZE")
+    return sql
+
+
+def _sample_value(type_name: str):
+    if type_name in _INT_TYPES:
+        return 1
+    if type_name == "boolean":
+        return True
+    if type_name in _TEXT_TYPES:
+        return ""
+    if type_name in _TIME_TYPES:
+        return datetime.now(timezone.utc)
+    if type_name in ("json", "jsonb"):
+        return "{}"
+    return None
+
+
+def explain_statement(db: Session, queryid: str, params: list | None = None) -> dict:
+    """
+    对 pg_stat_statements 中的语句执行 EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)。
+    只查找当前数据库中由应用自身角色（current_user）执行过的语句，其他角色或数据库的语句视为不存在。
+    params 按 $1..$n 顺序给出样例值；未给出的参数按类型取中性值（数字 1、空字符串、当前时间等）。
+    """
+    _ensure_pg_stat_statements(db)
+    try:
+        query = db.execute(
+            text(
+                """
+                SELECT query FROM pg_stat_statements
+                WHERE queryid = :qid
+                  AND userid = (SELECT oid FROM pg_roles WHERE rolname = current_user)
+                  AND dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                LIMIT 1
+                """
+            ),
+            {"qid": int(queryid)},
+        ).scalar()
+    except ValueError:
+        raise QueryInsightsError("queryid 无效")
+    except DBAPIError as e:
+        db.rollback()
+        raise QueryInsightsUnavailable(f"pg_stat_statements 不可用: {e.orig}")
+    if query is None:
+        raise QueryInsightsError("语句不存在（统计可能已被重置）")
+    sql = _sanitize(query)
+
+    # 每次使用不同的名字，即使上次 DEALLOCATE 失败也不会冲突
+    name = f"query_insights_{uuid.uuid4().hex[:12]}"
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.QUERY_EXPLAIN_TIMEOUT_MS)}")
+            # 无参数执行，语句中的 % 不会被驱动当作占位符
+            conn.exec_driver_sql(f"PREPARE {name} AS {sql}")
+            types = [
+                t
+                for (t,) in conn.exec_driver_sql(
+                    "SELECT t::text FROM pg_prepared_statements, unnest(parameter_types) WITH ORDINALITY AS p(t, n) "
+                    f"WHERE name = '{name}' ORDER BY n"
+                )
+            ]
+            values = [
+                params[i] if params is not None and i < len(params) else _sample_value(t)
+                for i, t in enumerate(types)
+            ]
+            args = ", ".join(f"%(p{i})s" for i in range(len(values)))
+            explain_sql = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) EXECUTE {name}"
+            if values:
+                plan = conn.exec_driver_sql(
+                    f"{explain_sql}({args})", {f"p{i}": v for i, v in enumerate(values)}
+                ).scalar()
+            else:
+                plan = conn.exec_driver_sql(explain_sql).scalar()
+        except DBAPIError as e:
+            raise QueryInsightsError(f"EXPLAIN 执行失败: {e.orig}")
+        finally:
+            trans.rollback()
+            # PREPARE 不随事务回滚，连接归还连接池前释放
+            try:
+                conn.exec_driver_sql(f"DEALLOCATE {name}")
+                conn.commit()
+            except DBAPIError:
+                conn.rollback()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0] if plan else {}
+    return {
+        "queryid": str(queryid),
+        "query": sql[:_MAX_QUERY_CHARS],
+        "parameter_types": types,
+        "parameters": [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        "planning_ms": top.get("Planning Time"),
+        "execution_ms": top.get("Execution Time"),
+        "plan": top.get("Plan"),
+    }
+
+
+def index_hints(db: Session) -> dict:
+    """关注表上的未使用索引、缺索引的外键与顺序扫描为主的表。"""
+    _ensure_postgres()
+    tables = list(INSIGHT_TABLES)
+    unused = db.execute(
+        text(
+            """
+            SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan,
+                   pg_relation_size(s.indexrelid) AS size_bytes, pg_get_indexdef(s.indexrelid) AS definition
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            WHERE s.relname = ANY(:tables) AND s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+            ORDER BY pg_relation_size(s.indexrelid) DESC
+            """
+        ),
+        {"tables": tables},
+    ).mappings().all()
+    unindexed_fks = db.execute(
+        text(
+            """
+            SELECT cl.relname AS table_name, c.conname AS constraint_name,
+                   array_agg(a.attname::text ORDER BY k.n) AS columns
+            FROM pg_constraint c
+            JOIN pg_class cl ON cl.oid = c.conrelid
+            CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, n)
+            JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+            WHERE c.contype = 'f' AND cl.relname = ANY(:tables)
+              AND NOT EXISTS (
+                  SELECT 1 FROM pg_index i
+                  WHERE i.indrelid = c.conrelid
+                    AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] @> c.conkey
+                    AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] <@ c.conkey
+              )
+            GROUP BY cl.relname, c.conname
+            ORDER BY cl.relname, c.conname
+            """
+        ),
+        {"tables": tables},
+    ).mappings().all()
+    scans = db.execute(
+        text(
+            """
+            SELECT relname AS table_name, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan, n_live_tup
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(:tables)
+            ORDER BY relname
+            """
+        ),
+        {"tables": tables},
+    ).mappings().all()
+
+    missing = []
+    for fk in unindexed_fks:
+        cols = list(fk["columns"])
+        missing.append(
+            {
+                "table": fk["table_name"],
+                "columns": cols,
+                "reason": f"外键 {fk['constraint_name']} 没有以其列开头的索引，按外键过滤、关联与级联删除都需扫表",
+                "suggestion": f"CREATE INDEX CONCURRENTLY ix_{fk['table_name']}_{'_'.join(cols)} "
+                f"ON {fk['table_name']} ({', '.join(cols)})",
+            }
+        )
+    for s in scans:
+        if s["n_live_tup"] >= 10000 and s["seq_scan"] > s["idx_scan"]:
+            missing.append(
+                {
+                    "table": s["table_name"],
+                    "columns": [],
+                    "reason": f"顺序扫描 {s['seq_scan']} 次（读取 {s['seq_tup_read']} 行）多于索引扫描 "
+                    f"{s['idx_scan']} 次，结合耗时靠前的语句检查 WHERE / ORDER BY 列是否缺少索引",
+                    "suggestion": None,
+                }
+            )
+    return {
+        "tables": tables,
+        "unused_indexes": [dict(r) for r in unused],
+        "missing_index_hints": missing,
+        "table_scans": [dict(r) for r in scans],
+    }
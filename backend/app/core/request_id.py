@@ -1,12 +1,158 @@
+import logging
+import time
 import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from contextlib import contextmanager
+from contextvars import ContextVar
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core import metrics, sql_monitor
 
+# 当前请求的上下文（request_id / user_id / ASGI scope / 耗时累计），日志记录入队前据此补充字段。
+# 存放可变 dict：同步依赖在线程池中执行，对 ContextVar 的 set 不会传回，但对同一个 dict 的修改可见。
+request_context: ContextVar[dict | None] = ContextVar("request_context", default=None)
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request.state.request_id = f"req_{uuid.uuid4().hex}"
-        response: Response = await call_next(request)
-        response.headers["X-Request-ID"] = request.state.request_id
-        return response
+access_logger = logging.getLogger("app.access")
+
+def current_context() -> dict:
+    """当前请求的 request_id、路由模板与用户 id（不在请求中时为空 dict）。"""
+    ctx = request_context.get()
+    if not ctx:
+        return {}
+    return {
+        "request_id": ctx["request_id"],
+        "route": _route_path(ctx["scope"]),
+        "user_id": ctx.get("user_id"),
+    }
+
+
+def set_user_id(user_id: int) -> None:
+    ctx = request_context.get()
+    if ctx is not None:
+        ctx["user_id"] = user_id
+
+
+def record_db_query(elapsed: float, fingerprint: str) -> None:
+    """由 SQLAlchemy 事件调用：把一次 SQL 执行的耗时（秒）与语句指纹计入当前请求。"""
+    ctx = request_context.get()
+    if ctx is not None:
+        ctx["db_queries"] += 1
+        ctx["db_seconds"] += elapsed
+        fingerprints = ctx["fingerprints"]
+        fingerprints[fingerprint] = fingerprints.get(fingerprint, 0) + 1
+
+
+@contextmanager
+def track_external(kind: str, name: str):
+    """
+    统计一次外部调用（kind 为 oss / ai / subprocess，name 为具体操作或程序）的耗时：
+    总是计入 metrics；在请求中时同时计入当前请求的 Server-Timing。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe_external(kind, name, elapsed)
+        ctx = request_context.get()
+        if ctx is not None:
+            ctx["external"][kind] = ctx["external"].get(kind, 0.0) + elapsed
+
+
+def _route_path(scope: Scope) -> str | None:
+    route = scope.get("route")
+    return getattr(route, "path", None)
+
+
+def _server_timing(ctx: dict, elapsed: float) -> str:
+    parts = [f"app;dur={elapsed * 1000:.1f}", f"db;dur={ctx['db_seconds'] * 1000:.1f}"]
+    for kind, seconds in ctx["external"].items():
+        parts.append(f"{kind};dur={seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class RequestIdMiddleware:
+    """
+    纯 ASGI 中间件（不经过 BaseHTTPMiddleware，不缓冲、不改写响应体，流式响应原样透传）：
+    - 分配 request_id（request.state.request_id 与 X-Request-ID 响应头）
+    - 统计总耗时、SQL 次数与耗时、外部调用耗时，在响应头中输出 Server-Timing 与 X-DB-Queries
+    - 统计请求体与响应体字节数（上传 / 下载流量）
+    - 请求结束后写访问日志（app.access）、计入 metrics，并检测疑似 N+1 查询
+
+    响应头在响应开始时发出，Server-Timing 反映的是截至响应头的耗时；流式响应的完整耗时
+    以访问日志与 metrics 为准。
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = f"req_{uuid.uuid4().hex}"
+        scope.setdefault("state", {})["request_id"] = request_id
+        ctx = {
+            "request_id": request_id,
+            "user_id": None,
+            "scope": scope,
+            "db_queries": 0,
+            "db_seconds": 0.0,
+            "fingerprints": {},
+            "external": {},
+        }
+        token = request_context.set(ctx)
+        started = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            elif message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["X-DB-Queries"] = str(ctx["db_queries"])
+                headers["Server-Timing"] = _server_timing(ctx, time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = _route_path(scope)
+            access_logger.info(
+                "%s %s %s",
+                scope["method"],
+                scope["path"],
+                status,
+                extra={
+                    "status": status,
+                    "latency_ms": round(elapsed * 1000, 1),
+                    "db_ms": round(ctx["db_seconds"] * 1000, 1),
+                    "db_queries": ctx["db_queries"],
+                },
+            )
+            metrics.observe_request(
+                scope["method"],
+                route,
+                status,
+                elapsed,
+                ctx["db_seconds"],
+                ctx["db_queries"],
+                ctx["external"],
+                request_bytes,
+                response_bytes,
+            )
+            sql_monitor.finish_request(scope["method"], route, ctx["fingerprints"])
+            request_context.reset(token)
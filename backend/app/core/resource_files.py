@@ -0,0 +1,116 @@
+"""资源文件的公共规则与入库后的后台任务，供资源接口与批量导入共用。"""
+import logging
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from sqlalchemy.orm import Session
+from app.core import hls, thumbnails
+from app.core.config import settings
+from app.core.errors import validation_error
+from app.core.faststart import request_remux
+from app.core.jobs import JobQueueFull
+from app.core.media import SharedSource
+from app.core.preview import OFFICE_EXTS, request_preview
+from app.core.storage import is_oss_enabled
+from app.models.resource import Resource
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_TYPES = {
+    "text": "文本",
+    "slide": "课件",
+    "video": "视频",
+    "audio": "音频",
+    "image": "图片",
+    "doc": "文档",
+    "policy": "政策",
+    "practice": "案例",
+    "link": "链接",
+}
+DEFAULT_COVERS = {
+    "text": "/sample-covers/text.jpg",
+    "slide": "/sample-covers/slide.jpg",
+    "video": "/sample-covers/video.jpg",
+    "audio": "/sample-covers/audio.jpg",
+    "image": "/sample-covers/image.jpg",
+    "doc": "/sample-covers/doc.jpg",
+    "policy": "/sample-covers/policy.jpg",
+    "practice": "/sample-covers/practice.jpg",
+    "link": "/sample-covers/link.jpg",
+}
+DEFAULT_COVER_FALLBACK = "/sample-covers/default-cover.jpg"
+
+
+def default_cover(rt: str | None) -> str:
+    return DEFAULT_COVERS.get(rt or "", DEFAULT_COVER_FALLBACK)
+
+
+def safe_filename(name: str) -> str:
+    cleaned = name.replace("\\", "_").replace("/", "_").replace("..", "_")
+    return cleaned.strip() or "file"
+
+
+def allowed_exts() -> set[str]:
+    return {x.strip().lower() for x in settings.ALLOWED_FILE_EXT.split(",") if x.strip()}
+
+
+def validate_external_url(url: str) -> None:
+    if not url or len(url) > 2048:
+        raise validation_error("外链地址不合法")
+    lowered = url.strip().lower()
+    if lowered.startswith("javascript:") or lowered.startswith("data:"):
+        raise validation_error("外链协议不合法")
+    parsed = urlparse(url)
+    if parsed.scheme not in {"http", "https"} or not parsed.netloc:
+        raise validation_error("外链仅支持 http:// 或 https://")
+
+
+def request_hls(db: Session, r: Resource, source: SharedSource | None = None) -> None:
+    """
+    mp4 入队 HLS 切片：先提交 pending 状态与租约起点再入队，避免任务先完成后被覆盖；
+    队列已满时清空状态，下次查看再试。
+    """
+    r.hls_status = hls.STATUS_PENDING
+    r.hls_pending_since = datetime.now(timezone.utc)
+    db.commit()
+    try:
+        hls.request_package(r.file_id, r.file_name, r.media_info, source)
+    except JobQueueFull:
+        r.hls_status = None
+        r.hls_pending_since = None
+        db.commit()
+
+
+def enqueue_file_jobs(db: Session, r: Resource, ext: str, needs_remux: bool) -> None:
+    """
+    主文件入库后排队的后台任务（faststart、海报帧与雪碧图、HLS、办公文档 PDF 预览）。
+    OSS 存储时音视频任务共用一份下载的源文件，而不是各自完整下载一次。
+    """
+    source = SharedSource(r.file_id, r.file_name) if is_oss_enabled() else None
+    if source is not None:
+        # 入队期间先持有一个引用，避免前一个任务很快结束时副本被提前删除
+        source.attach()
+    try:
+        if needs_remux and settings.FASTSTART_ENABLED:
+            # moov 在文件尾：后台流复制重封装，浏览器无需先取文件尾即可起播
+            try:
+                request_remux(r.file_id, r.file_name, source)
+            except JobQueueFull:
+                logger.warning("Media queue full, skip faststart remux of %s", r.file_id)
+        if ext in hls.HLS_EXTS and settings.THUMBNAILS_ENABLED:
+            # 海报帧（无封面时设为封面）与拖动预览雪碧图，比切片快得多，先于 HLS 入队
+            try:
+                thumbnails.request_thumbnails(r.id, r.file_id, r.file_name, r.media_info, source)
+            except JobQueueFull:
+                logger.warning("Media queue full, skip thumbnails of %s", r.file_id)
+        if ext in hls.HLS_EXTS and settings.HLS_ENABLED:
+            # 上传后即排队切片，完成后预览切换为自适应码率播放
+            request_hls(db, r, source)
+    finally:
+        if source is not None:
+            source.release()
+    if ext in OFFICE_EXTS:
+        # 上传后即预先排队转换 PDF 预览，首次查看时无需等待
+        try:
+            request_preview(r.file_id, r.file_name)
+        except JobQueueFull:
+            pass
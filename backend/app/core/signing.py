@@ -0,0 +1,43 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from app.core.config import settings
+from app.core.security import sign_download
+
+_CACHE_MAX_ENTRIES = 8192
+_cache: "OrderedDict[tuple, object]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def bucketed_expiry(ttl: int, now: int | None = None) -> int:
+    """
+    把过期时间对齐到时间窗口：exp = (floor(now / W) + 1) * W + ttl。
+    同一窗口内对同一对象签出的地址完全相同（浏览器与 CDN 可以缓存），且剩余有效期始终不少于 ttl。
+    窗口取 SIGNED_URL_BUCKET_SECONDS 与 ttl 的较小值，短时效链接不会被明显拉长。
+    """
+    now = int(time.time()) if now is None else now
+    window = max(1, min(settings.SIGNED_URL_BUCKET_SECONDS, ttl))
+    return (now // window + 1) * window + ttl
+
+
+def cached(key: tuple, factory: Callable[[], object]):
+    """按 key（需包含对齐后的过期时间）复用签名结果，过期窗口的条目随 LRU 自然淘汰。"""
+    with _lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+            return value
+    value = factory()
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return value
+
+
+def signed_download(subject: str, ttl: int, user_id: int | None = None) -> tuple[int, str]:
+    """窗口对齐的下载签名，返回 (exp, sig)。"""
+    exp_ts = bucketed_expiry(ttl)
+    sig = cached(("download", subject, exp_ts, user_id), lambda: sign_download(subject, exp_ts, user_id))
+    return exp_ts, sig
@@ -0,0 +1,143 @@
+"""
+SQL 慢查询日志与 N+1 检测（基于 SQLAlchemy before/after_cursor_execute 事件，见 app/db/session.py）。
+
+- 指纹：把语句中的字面量、绑定参数与展开后的 IN 列表统一替换为占位符，同一类查询得到同一个指纹
+- 慢查询：单条语句超过 SLOW_QUERY_MS 时记 WARNING 日志（只记语句模板，不记参数；
+  request_id / route 由日志上下文自动带上）
+- N+1：同一请求内同一指纹执行次数超过 N_PLUS_ONE_THRESHOLD 时记 WARNING 日志并计数
+- 按指纹汇总次数、耗时、慢查询次数、N+1 次数与来源路由，供 /admin/metrics/queries 查看
+  （当前 worker 进程自启动以来的数据）
+"""
+import hashlib
+import logging
+import re
+import threading
+from functools import lru_cache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_FINGERPRINTS = 2000
+_MAX_STATEMENT_CHARS = 2000
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"%\([^)]+\)s|%s|\?|\$\d+")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*(\((?:\s*\?\s*,?)+\)\s*,?\s*)+", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> tuple[str, str]:
+    """返回 (指纹, 归一化语句)。SQLAlchemy 语句文本大多重复出现，结果按原文缓存。"""
+    text = _SPACE_RE.sub(" ", statement).strip()
+    text = _STRING_RE.sub("?", text)
+    text = _PARAM_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    text = _VALUES_RE.sub("VALUES (...)", text)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16], text[:_MAX_STATEMENT_CHARS]
+
+
+def _entry(fp: str, text: str) -> dict | None:
+    entry = _stats.get(fp)
+    if entry is None:
+        if len(_stats) >= _MAX_FINGERPRINTS:
+            return None
+        entry = _stats[fp] = {
+            "statement": text,
+            "calls": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+            "slow": 0,
+            "n_plus_one": 0,
+            "routes": {},
+        }
+    return entry
+
+
+def record_query(statement: str, elapsed: float) -> str:
+    """记录一次语句执行，返回其指纹；超过阈值时写慢查询日志。"""
+    fp, text = fingerprint(statement)
+    slow = elapsed * 1000 >= settings.SLOW_QUERY_MS
+    with _lock:
+        entry = _entry(fp, text)
+        if entry is not None:
+            entry["calls"] += 1
+            entry["total_seconds"] += elapsed
+            if elapsed > entry["max_seconds"]:
+                entry["max_seconds"] = elapsed
+            if slow:
+                entry["slow"] += 1
+    if slow:
+        logger.warning(
+            "Slow query %.1f ms fp=%s: %s",
+            elapsed * 1000,
+            fp,
+            text,
+            extra={"duration_ms": round(elapsed * 1000, 1), "fingerprint": fp},
+        )
+    return fp
+
+
+def finish_request(method: str, route: str | None, fingerprints: dict[str, int]) -> None:
+    """请求结束时调用：按指纹累计来源路由，同一指纹执行次数超过阈值时标记为疑似 N+1。"""
+    if not fingerprints:
+        return
+    route_key = f"{method} {route or 'unmatched'}"
+    flagged = []
+    with _lock:
+        for fp, count in fingerprints.items():
+            entry = _stats.get(fp)
+            if entry is None:
+                continue
+            entry["routes"][route_key] = entry["routes"].get(route_key, 0) + count
+            if count > settings.N_PLUS_ONE_THRESHOLD:
+                entry["n_plus_one"] += 1
+                flagged.append((fp, count, entry["statement"]))
+    for fp, count, text in flagged:
+        logger.warning(
+            "Possible N+1: %s executed %s times in one request fp=%s: %s",
+            route_key,
+            count,
+            fp,
+            text,
+            extra={"fingerprint": fp, "executions": count},
+        )
+
+
+def top_queries(sort: str = "total", limit: int = 20) -> list[dict]:
+    """按 total（总耗时）/ mean / max / calls / slow / n_plus_one 排序的查询指纹。"""
+    with _lock:
+        snapshot = [(fp, {**entry, "routes": dict(entry["routes"])}) for fp, entry in _stats.items()]
+    items = []
+    for fp, entry in snapshot:
+        calls = entry["calls"]
+        routes = sorted(entry["routes"].items(), key=lambda x: x[1], reverse=True)[:5]
+        items.append(
+            {
+                "fingerprint": fp,
+                "statement": entry["statement"],
+                "calls": calls,
+                "total_ms": round(entry["total_seconds"] * 1000, 1),
+                "mean_ms": round(entry["total_seconds"] * 1000 / calls, 2) if calls else 0,
+                "max_ms": round(entry["max_seconds"] * 1000, 1),
+                "slow": entry["slow"],
+                "n_plus_one": entry["n_plus_one"],
+                "routes": [{"route": r, "calls": c} for r, c in routes],
+            }
+        )
+    key = {
+        "total": "total_ms",
+        "mean": "mean_ms",
+        "max": "max_ms",
+        "calls": "calls",
+        "slow": "slow",
+        "n_plus_one": "n_plus_one",
+    }[sort]
+    items.sort(key=lambda x: x[key], reverse=True)
+    return items[:limit]
@@ -1,9 +1,15 @@
+import io
 import os
 import hashlib
-from typing import Optional
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
 import tempfile
+import time
 import oss2
 from app.core.config import settings
+from app.core.request_id import track_external
+from app.core.signing import bucketed_expiry, cached
 
 
 def is_oss_enabled() -> bool:
@@ -53,14 +59,55 @@ def save_file_oss(file_obj, key: str) -> tuple[int, str]:
     size = len(data)
     sha = hashlib.sha256(data).hexdigest()
     bucket = _get_oss_bucket()
-    bucket.put_object(key, data)
+    with track_external("oss", "put"):
+        bucket.put_object(key, data)
     return size, sha
 
 
-def generate_oss_signed_url(key: str, expires: int) -> str:
+def save_path_oss(path: str, key: str) -> None:
+    """把已落地的本地文件上传到 OSS（分块读取，不整体载入内存）。"""
     bucket = _get_oss_bucket()
-    url = bucket.sign_url("GET", key, expires)
-    return url
+    with track_external("oss", "put"):
+        bucket.put_object_from_file(key, path)
+
+
+@contextmanager
+def spool_upload(file_obj, max_bytes: int, suffix: str = "") -> Iterator[tuple[str, int, str]]:
+    """
+    将上传流落地到本地临时文件，同时计算大小与 sha256。
+    产出 (tmp_path, size, sha256)；退出上下文时无论成功与否都会删除临时文件。
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix="spool_", suffix=suffix)
+    os.close(fd)
+    try:
+        size, sha = save_file_local(file_obj, tmp_path, max_bytes)
+        yield tmp_path, size, sha
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def generate_oss_signed_url(key: str, expires: int, params: dict | None = None) -> str:
+    """
+    OSS 签名地址，过期时间按窗口对齐（见 signing.bucketed_expiry）：同一对象在同一窗口内
+    得到完全相同的地址，可被浏览器/CDN 缓存，且进程内复用、不必每次重新计算签名。
+    """
+    exp_ts = bucketed_expiry(expires)
+    cache_key = ("oss", key, tuple(sorted((params or {}).items())), exp_ts)
+    return cached(cache_key, lambda: _sign_oss_url(key, exp_ts, params))
+
+
+def _sign_oss_url(key: str, exp_ts: int, params: dict | None) -> str:
+    # oss2 只接受相对有效期（内部加上当前秒），签名期间跨秒则重签，保证 Expires 恰好是 exp_ts，
+    # 多个进程对同一对象签出的地址一致
+    bucket = _get_oss_bucket()
+    while True:
+        now = int(time.time())
+        url = bucket.sign_url("GET", key, exp_ts - now, params=dict(params) if params else None)
+        if int(time.time()) == now:
+            return url
 
 
 def build_oss_url(key: str) -> str:
@@ -75,5 +122,120 @@ def download_oss_to_temp(key: str) -> str:
     tmp = tempfile.NamedTemporaryFile(delete=False)
     tmp_path = tmp.name
     tmp.close()
-    bucket.get_object_to_file(key, tmp_path)
+    with track_external("oss", "get"):
+        bucket.get_object_to_file(key, tmp_path)
     return tmp_path
+
+
+def download_oss_to_path(key: str, path: str) -> str:
+    bucket = _get_oss_bucket()
+    with track_external("oss", "get"):
+        bucket.get_object_to_file(key, path)
+    return path
+
+
+def open_oss_stream(key: str):
+    """流式读取 OSS 对象（read(n) 按需拉取），用完需 close。"""
+    bucket = _get_oss_bucket()
+    with track_external("oss", "get"):
+        return bucket.get_object(key)
+
+
+def local_cover_path(filename: str) -> Path:
+    """本地封面文件存储路径（UPLOAD_DIR/covers/filename）。"""
+    base = Path(settings.UPLOAD_DIR) / "covers"
+    base.mkdir(parents=True, exist_ok=True)
+    return base / filename
+
+
+def local_upload_path(file_id: str, file_name: str) -> str:
+    """本地存储下的文件路径：UPLOAD_DIR/{file_id}_{file_name}。"""
+    return os.path.join(settings.UPLOAD_DIR, f"{file_id}_{file_name}")
+
+
+def upload_dir_oss(local_dir: str, prefix: str) -> int:
+    """把本地目录下的全部文件按相对路径上传到 OSS 的 prefix 下，返回上传的文件数。"""
+    bucket = _get_oss_bucket()
+    count = 0
+    for root, _, files in os.walk(local_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, local_dir).replace(os.sep, "/")
+            with track_external("oss", "put"):
+                bucket.put_object_from_file(f"{prefix.rstrip('/')}/{rel}", path)
+            count += 1
+    return count
+
+
+def read_oss_object(key: str) -> bytes:
+    bucket = _get_oss_bucket()
+    with track_external("oss", "get"):
+        return bucket.get_object(key).read()
+
+
+def delete_oss_keys(keys: list[str]) -> None:
+    """批量删除 OSS 对象（每次最多 1000 个）。"""
+    bucket = _get_oss_bucket()
+    for i in range(0, len(keys), 1000):
+        with track_external("oss", "delete"):
+            bucket.batch_delete_objects(keys[i : i + 1000])
+
+
+def delete_oss_prefix(prefix: str) -> None:
+    """删除 OSS 上某个前缀下的全部对象。"""
+    bucket = _get_oss_bucket()
+    with track_external("oss", "list"):
+        keys = [obj.key for obj in oss2.ObjectIterator(bucket, prefix=prefix)]
+    delete_oss_keys(keys)
+
+
+class OssRangeReader(io.RawIOBase):
+    """
+    OSS 对象的只读、可 seek 文件对象：每次 read 转成一次 Range 请求。
+    配合 io.BufferedReader 使用（open_oss_ranged），让 zipfile 等只读取需要的字节区间。
+    """
+
+    def __init__(self, key: str):
+        self._bucket = _get_oss_bucket()
+        self._key = key
+        with track_external("oss", "head"):
+            self._size = self._bucket.head_object(key).content_length
+        self._pos = 0
+        self.requests = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self._size + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def readinto(self, buf) -> int:
+        if self._pos >= self._size or len(buf) == 0:
+            return 0
+        end = min(self._pos + len(buf), self._size) - 1
+        with track_external("oss", "get"):
+            data = self._bucket.get_object(
+                self._key, byte_range=(self._pos, end), headers={"x-oss-range-behavior": "standard"}
+            ).read()
+        self.requests += 1
+        n = len(data)
+        buf[:n] = data
+        self._pos += n
+        return n
+
+
+def open_oss_ranged(key: str, buffer_size: int = 256 * 1024) -> io.BufferedReader:
+    return io.BufferedReader(OssRangeReader(key), buffer_size=buffer_size)
@@ -0,0 +1,207 @@
+import logging
+import math
+import os
+import shutil
+import tempfile
+import uuid
+from app.core.config import settings
+from app.core import hls
+from app.core.hot_cache import invalidate_cover
+from app.core.images import DERIVATIVE_WIDTHS, generate_all as generate_image_derivatives
+from app.core.media import SharedSource, media_jobs, run_ffmpeg, submit_media_job
+from app.core.storage import is_oss_enabled, local_cover_path, save_path_oss, upload_dir_oss
+
+logger = logging.getLogger(__name__)
+
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+VTT_NAME = "thumbs.vtt"
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+# 自动截取的海报帧作为封面时使用的文件名前缀，用来区分教师上传的封面（上传新视频时可被替换）
+POSTER_COVER_PREFIX = "poster_"
+
+
+def is_auto_poster(cover_url: str | None) -> bool:
+    if not cover_url:
+        return False
+    name = cover_url.split(":", 1)[-1]
+    return name.startswith(POSTER_COVER_PREFIX) or name.startswith(f"cover_{POSTER_COVER_PREFIX}")
+
+
+def is_replaceable_cover(cover_url: str | None) -> bool:
+    """没有封面、使用按类型的静态默认封面（/sample-covers/...）或上一次自动截取的海报时，可用海报帧替换。"""
+    return not cover_url or cover_url.startswith("/sample-covers/") or is_auto_poster(cover_url)
+
+
+def request_thumbnails(
+    resource_id: int, file_id: str, file_name: str, media_info: dict | None, source: SharedSource | None = None
+) -> None:
+    """把海报帧 + 雪碧图任务加入后台队列（同一 file_id 单飞）；队列已满时抛出 JobQueueFull。"""
+    submit_media_job(f"thumbs:{file_id}", source, _generate, resource_id, file_id, file_name, media_info)
+
+
+def is_pending(file_id: str) -> bool:
+    return media_jobs.is_pending(f"thumbs:{file_id}")
+
+
+def is_available(file_id: str, media_info: dict | None) -> bool:
+    """雪碧图已生成且（本地存储时）目录仍在。"""
+    if ((media_info or {}).get("thumbnails") or {}).get("status") != STATUS_READY:
+        return False
+    return is_oss_enabled() or os.path.exists(os.path.join(hls.thumbs_dir(file_id), VTT_NAME))
+
+
+def _thumb_size(media_info: dict | None) -> tuple[int, int]:
+    width = DERIVATIVE_WIDTHS["thumb"]
+    video = (media_info or {}).get("video") or {}
+    if video.get("width") and video.get("height"):
+        return width, max(2, int(round(width * video["height"] / video["width"] / 2)) * 2)
+    return width, width * 9 // 16 // 2 * 2
+
+
+def build_vtt(duration: float, interval: int, width: int, height: int) -> str:
+    """WebVTT 缩略图轨：每个区间指向雪碧图中对应的格子（sprite_001.jpg#xywh=x,y,w,h）。"""
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+    count = max(1, math.ceil(duration / interval))
+    lines = ["WEBVTT", ""]
+    for i in range(count):
+        start, end = i * interval, min((i + 1) * interval, duration)
+        sheet, cell = divmod(i, per_sheet)
+        row, col = divmod(cell, SPRITE_COLUMNS)
+        lines += [
+            f"{_vtt_time(start)} --> {_vtt_time(end)}",
+            f"sprite_{sheet + 1:03d}.jpg#xywh={col * width},{row * height},{width},{height}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+def _vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    h, rem = divmod(ms, 3600 * 1000)
+    m, rem = divmod(rem, 60 * 1000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+
+
+def _extract_poster(src_path: str, out_path: str, duration: float | None) -> None:
+    """在前 10%（最多 30 秒）处附近用 thumbnail 滤镜挑一帧代表性画面，避开片头黑屏。"""
+    seek = min(duration * 0.1, 30) if duration else 0
+    run_ffmpeg(
+        [
+            "-ss", f"{seek:.2f}", "-i", src_path,
+            "-vf", f"thumbnail=50,scale='min({DERIVATIVE_WIDTHS['detail']},iw)':-2",
+            "-frames:v", "1", "-q:v", "3",
+            out_path,
+        ],
+        settings.THUMBNAIL_TIMEOUT_SECONDS,
+    )
+
+
+def _generate_sprites(src_path: str, out_dir: str, interval: int, width: int, height: int) -> None:
+    """只解码关键帧（-skip_frame nokey），长视频也能快速出图；拖动预览允许几秒的偏差。"""
+    run_ffmpeg(
+        [
+            "-skip_frame", "nokey", "-i", src_path,
+            "-an",
+            "-vf", f"fps=1/{interval},scale={width}:{height},tile={SPRITE_COLUMNS}x{SPRITE_ROWS}",
+            "-q:v", "5",
+            os.path.join(out_dir, "sprite_%03d.jpg"),
+        ],
+        settings.THUMBNAIL_TIMEOUT_SECONDS,
+    )
+
+
+def _set_poster_cover(db, resource, poster_path: str) -> None:
+    """资源没有自定义封面时把海报帧设为封面，复用封面的衍生图与签名逻辑。"""
+    if not is_replaceable_cover(resource.cover_url):
+        return
+    if resource.cover_url and resource.cover_url.startswith("local:"):
+        _remove_local_cover(resource.cover_url.replace("local:", "", 1))
+    name = f"{POSTER_COVER_PREFIX}{resource.id}_{uuid.uuid4().hex}.jpg"
+    if is_oss_enabled():
+        key = f"cover_{name}"
+        save_path_oss(poster_path, key)
+        resource.cover_url = f"oss:{key}"
+    else:
+        dst = local_cover_path(name)
+        shutil.copyfile(poster_path, dst)
+        try:
+            generate_image_derivatives(str(dst), str(dst.parent), dst.stem)
+        except Exception:
+            logger.warning("Poster derivatives failed for %s", name, exc_info=True)
+        resource.cover_url = f"local:{name}"
+
+
+def _remove_local_cover(name: str) -> None:
+    """删除旧的自动海报及其衍生图（{stem}_w{宽度}.{格式}）。"""
+    path = local_cover_path(name)
+    for p in path.parent.glob(f"{path.stem}*"):
+        try:
+            p.unlink()
+        except OSError:
+            pass
+
+
+def _generate(
+    resource_id: int, file_id: str, file_name: str, media_info: dict | None, source: SharedSource | None = None
+) -> None:
+    """
+    截取海报帧并按固定间隔生成缩略图雪碧图（每张 10x10 格）与 WebVTT 缩略图轨。
+    产物与 HLS 放在同一命名空间下（本地 HLS_DIR/{file_id}.thumbs/，OSS hls/{file_id}/thumbs/），
+    通过同一个路径签名接口访问；几何信息写入 media_info.thumbnails。
+    """
+    from app.db.session import SessionLocal
+    from app.models.resource import Resource
+
+    duration = (media_info or {}).get("duration_seconds")
+    interval = max(1, settings.THUMBNAIL_INTERVAL_SECONDS)
+    width, height = _thumb_size(media_info)
+    work_dir = tempfile.mkdtemp(prefix=".job_thumbs_", dir=_ensure_dir(settings.HLS_DIR))
+    db = SessionLocal()
+    try:
+        src_path = hls.fetch_source(file_id, file_name, work_dir, source)
+        out_dir = os.path.join(work_dir, "out")
+        os.makedirs(out_dir)
+        poster_path = os.path.join(work_dir, "poster.jpg")
+        _extract_poster(src_path, poster_path, duration)
+        thumbnails = None
+        if duration:
+            _generate_sprites(src_path, out_dir, interval, width, height)
+            with open(os.path.join(out_dir, VTT_NAME), "w") as f:
+                f.write(build_vtt(duration, interval, width, height))
+            if is_oss_enabled():
+                upload_dir_oss(out_dir, hls.oss_key(file_id, "thumbs"))
+            else:
+                shutil.rmtree(hls.thumbs_dir(file_id), ignore_errors=True)
+                os.replace(out_dir, hls.thumbs_dir(file_id))
+            thumbnails = {"status": STATUS_READY, "interval": interval, "width": width, "height": height}
+
+        r = db.query(Resource).filter(Resource.id == resource_id, Resource.file_id == file_id).first()
+        if r is None:
+            return  # 文件已被替换或删除
+        old_cover = r.cover_url
+        if os.path.exists(poster_path):
+            _set_poster_cover(db, r, poster_path)
+        if thumbnails:
+            r.media_info = {**(r.media_info or {}), "thumbnails": thumbnails}
+        db.commit()
+        if r.cover_url != old_cover:
+            invalidate_cover(resource_id)
+    except Exception as exc:
+        db.rollback()
+        r = db.query(Resource).filter(Resource.id == resource_id, Resource.file_id == file_id).first()
+        if r is not None:
+            r.media_info = {**(r.media_info or {}), "thumbnails": {"status": STATUS_FAILED, "error": str(exc)[:200]}}
+            db.commit()
+        raise
+    finally:
+        db.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _ensure_dir(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,164 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from contextlib import closing
+from typing import Iterator
+from app.core.config import settings
+from app.core import preview_cache
+from app.core.jobs import JobPool
+from app.core.storage import is_oss_enabled, local_upload_path, open_oss_stream
+
+logger = logging.getLogger(__name__)
+
+export_jobs = JobPool("export", 1, 8)
+
+# 本身已压缩的格式用 stored（不再压缩），省 CPU 且几乎不增大体积
+STORED_EXTS = {
+    "mp4", "m4a", "mp3", "mov", "wav",
+    "jpg", "jpeg", "png", "gif", "webp",
+    "zip", "rar", "7z", "gz",
+    "pptx", "docx", "xlsx",
+}
+_CHUNK = 1024 * 1024
+_FLUSH_BYTES = 256 * 1024
+# 边读边打包时未能完整写入的文件清单，附在压缩包中
+SKIPPED_NOTE = "未能打包的文件.txt"
+
+
+class StreamSink(io.RawIOBase):
+    """不可 seek 的写入端：zipfile 写入的字节暂存在这里，由生成器分块取走。"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self.pending = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self.pending += len(b)
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def _open_source(member: dict):
+    if is_oss_enabled():
+        return closing(open_oss_stream(member["file_id"]))
+    return open(local_upload_path(member["file_id"], member["file_name"]), "rb")
+
+
+def source_exists(file_id: str, file_name: str) -> bool:
+    """本地存储下检查文件是否还在（OSS 不逐个检查，打包时打开或读取失败的文件记入说明文件）。"""
+    return is_oss_enabled() or os.path.exists(local_upload_path(file_id, file_name))
+
+
+def stream_zip(members: list[dict], texts: dict[str, str] | None = None, strict: bool = False) -> Iterator[bytes]:
+    """
+    边读边打包：members 为 {arcname, file_id, file_name, size}，逐个从本地或 OSS 流式读取写入 zip，
+    不在磁盘上暂存。输出不可 seek，条目大小与 CRC 写在数据描述符中；超过 2GB 的条目使用 zip64。
+    每个文件先打开并读出第一块、确认可读后才在 zip 中开始该条目。响应已开始后无法再返回错误：
+    打不开的文件跳过，条目写到一半读取失败时按已读内容结束该条目（zip 结构保持完整），
+    两者都记入 SKIPPED_NOTE。strict=True（构建缓存）时任何打开或读取错误直接抛出。
+    texts 为附带的文本文件（如外链清单）。
+    """
+    sink = StreamSink()
+    date_time = time.localtime()[:6]
+    skipped: list[str] = []
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for m in members:
+            ext = m["file_name"].rsplit(".", 1)[-1].lower() if "." in m["file_name"] else ""
+            info = zipfile.ZipInfo(m["arcname"], date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTS else zipfile.ZIP_DEFLATED
+            try:
+                src = _open_source(m)
+            except Exception:
+                if strict:
+                    raise
+                logger.warning("Export: skip unopenable %s", m["file_id"], exc_info=True)
+                skipped.append(f"{m['arcname']}\t无法读取，未打包")
+                continue
+            with src as f:
+                try:
+                    chunk = f.read(_CHUNK)
+                except Exception:
+                    if strict:
+                        raise
+                    logger.warning("Export: skip unreadable %s", m["file_id"], exc_info=True)
+                    skipped.append(f"{m['arcname']}\t无法读取，未打包")
+                    continue
+                size = m.get("size")
+                with zf.open(info, "w", force_zip64=size is None or size >= zipfile.ZIP64_LIMIT) as dst:
+                    while chunk:
+                        dst.write(chunk)
+                        if sink.pending >= _FLUSH_BYTES:
+                            yield sink.drain()
+                        try:
+                            chunk = f.read(_CHUNK)
+                        except Exception:
+                            if strict:
+                                raise
+                            logger.warning("Export: read of %s failed mid-entry", m["file_id"], exc_info=True)
+                            skipped.append(f"{m['arcname']}\t读取中断，压缩包中的该文件不完整")
+                            break
+            yield sink.drain()
+        texts = dict(texts or {})
+        if skipped:
+            texts[SKIPPED_NOTE] = "\n".join(skipped) + "\n"
+        for name, text in texts.items():
+            zf.writestr(zipfile.ZipInfo(name, date_time=date_time), text.encode("utf-8"), zipfile.ZIP_DEFLATED)
+    yield sink.drain()
+
+
+def package_digest(members: list[dict], texts: dict[str, str] | None = None) -> str:
+    """打包内容的指纹：文件、条目名或附带文本变化时得到新的缓存条目。"""
+    payload = json.dumps(
+        [[m["arcname"], m["file_id"], m.get("size")] for m in members] + sorted((texts or {}).items()),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def cached_path(digest: str) -> str:
+    """大包的缓存构建结果：PREVIEW_DIR/export_{digest}.zip，参与预览缓存的容量管理。"""
+    return os.path.join(settings.PREVIEW_DIR, f"{preview_cache.EXPORT_PREFIX}{digest}.zip")
+
+
+def should_cache(total_bytes: int) -> bool:
+    """达到阈值的大包才缓存；超过预览缓存一半容量的包不缓存，避免把其他预览全部挤出。"""
+    budget = settings.PREVIEW_CACHE_MAX_MB * 1024 * 1024
+    return total_bytes >= settings.EXPORT_CACHE_MIN_MB * 1024 * 1024 and total_bytes <= budget // 2
+
+
+def request_build(digest: str, members: list[dict], texts: dict[str, str] | None = None) -> None:
+    """后台把整个包写入缓存（同一 digest 单飞）；队列已满时抛出 JobQueueFull。"""
+    export_jobs.submit(f"export:{digest}", _build, digest, members, texts)
+
+
+def _build(digest: str, members: list[dict], texts: dict[str, str] | None) -> None:
+    """构建缓存包：任一文件打开或读取失败时任务失败，不缓存不完整的包（之后的下载继续边读边打包）。"""
+    path = cached_path(digest)
+    if os.path.exists(path):
+        return
+    os.makedirs(settings.PREVIEW_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".job_export_", dir=settings.PREVIEW_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in stream_zip(members, texts, strict=True):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    preview_cache.add(path)
+    logger.info("Export package %s cached (%s bytes)", digest, os.path.getsize(path))
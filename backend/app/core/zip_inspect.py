@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Iterator
+from app.core.config import settings
+from app.core import preview_cache
+from app.core.storage import is_oss_enabled, local_upload_path, open_oss_ranged
+
+logger = logging.getLogger(__name__)
+
+_CACHE_MAX_ENTRIES = 64
+_cache: "OrderedDict[str, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+_STREAM_CHUNK = 64 * 1024
+# 中央目录单条记录的合理上限（46 字节定长部分 + 文件名 + 扩展字段），用来约束 EOCD 声明的目录大小
+_MAX_CENTRAL_DIR_BYTES_PER_ENTRY = 2048
+
+# 可在浏览器中直接打开的成员类型，其余一律以附件下载（避免压缩包里的 HTML/SVG 在站点域名下执行）
+INLINE_MIMES = {
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "application/pdf",
+    "text/plain",
+    "text/csv",
+    "text/markdown",
+    "video/mp4",
+    "audio/mpeg",
+}
+
+
+class ZipInspectError(Exception):
+    """压缩包损坏、格式或压缩方式不支持。"""
+
+
+class ZipNotFound(ZipInspectError):
+    """源文件或成员不存在。"""
+
+
+class ZipUnavailable(ZipInspectError):
+    """存储暂时不可读（如 OSS 请求失败）。"""
+
+
+class ZipTooManyEntries(ZipInspectError):
+    """条目数超过在线浏览上限。"""
+
+
+def signature_subject(file_id: str) -> str:
+    # 与下载签名区分，成员地址的签名不能用于下载整个压缩包
+    return f"zip/{file_id}"
+
+
+def display_name(info: zipfile.ZipInfo) -> str:
+    """未设置 UTF-8 标志的条目按 cp437 解码，中文 Windows 打包的通常是 GBK，尝试纠正。"""
+    name = info.filename
+    if info.flag_bits & 0x800:
+        return name
+    try:
+        return name.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return name
+
+
+def _check_central_directory(fileobj) -> None:
+    """
+    zipfile.ZipFile() 构造时就会解析整个中央目录，条目数来自文件尾的 EOCD（zip64 时为 zip64 EOCD），
+    先只读这一小段，条目数或目录大小超限时直接拒绝，不再解析。
+    """
+    endrec = zipfile._EndRecData(fileobj)
+    if endrec is None:
+        return  # 交给 ZipFile 报告格式错误
+    total = endrec[zipfile._ECD_ENTRIES_TOTAL]
+    size = endrec[zipfile._ECD_SIZE]
+    if total > settings.ZIP_MAX_ENTRIES or size > settings.ZIP_MAX_ENTRIES * _MAX_CENTRAL_DIR_BYTES_PER_ENTRY:
+        raise ZipTooManyEntries(f"压缩包条目过多（{total} 项），超过在线浏览上限 {settings.ZIP_MAX_ENTRIES} 项，请下载后查看")
+
+
+@contextmanager
+def open_archive(file_id: str, file_name: str) -> Iterator[zipfile.ZipFile]:
+    """本地直接打开；OSS 通过 Range 读取，只拉取中央目录与需要的成员数据。"""
+    try:
+        if is_oss_enabled():
+            fileobj = open_oss_ranged(file_id)
+        else:
+            path = local_upload_path(file_id, file_name)
+            if not os.path.exists(path):
+                raise ZipNotFound("源文件不存在")
+            fileobj = open(path, "rb")
+    except ZipInspectError:
+        raise
+    except Exception as exc:
+        raise ZipUnavailable(f"无法读取压缩包: {exc}")
+    try:
+        try:
+            _check_central_directory(fileobj)
+            zf = zipfile.ZipFile(fileobj)
+        except (zipfile.BadZipFile, OSError) as exc:
+            raise ZipInspectError(f"压缩包已损坏或格式不支持: {exc}")
+        with zf:
+            yield zf
+    finally:
+        fileobj.close()
+
+
+def _read_listing(file_id: str, file_name: str) -> dict:
+    entries = []
+    truncated = False
+    with open_archive(file_id, file_name) as zf:
+        for info in zf.infolist():
+            if len(entries) >= settings.ZIP_MAX_ENTRIES:
+                truncated = True
+                break
+            name = display_name(info).replace("\\", "/")
+            # 跳过 macOS 打包产生的元数据目录
+            if name.startswith("__MACOSX/") or name.rsplit("/", 1)[-1] == ".DS_Store":
+                continue
+            is_dir = info.is_dir()
+            try:
+                modified = datetime(*info.date_time).isoformat()
+            except ValueError:
+                modified = None
+            entries.append(
+                {
+                    "path": name.rstrip("/"),
+                    "name": info.filename,
+                    "is_dir": is_dir,
+                    "size": 0 if is_dir else info.file_size,
+                    "compressed_size": 0 if is_dir else info.compress_size,
+                    "modified": modified,
+                    "encrypted": bool(info.flag_bits & 0x1),
+                }
+            )
+    return {"entries": entries, "truncated": truncated}
+
+
+def _disk_cache_path(file_id: str) -> str:
+    return os.path.join(settings.PREVIEW_DIR, f"{file_id}.zip.json")
+
+
+def listing(file_id: str, file_name: str, sha256: str | None) -> dict:
+    """
+    压缩包条目清单：按 sha256 缓存在进程内（同内容的压缩包共享），
+    并落盘到预览缓存（{file_id}.zip.json，受预览缓存容量管理），重启后无需再读中央目录。
+    """
+    if sha256:
+        with _cache_lock:
+            data = _cache.get(sha256)
+            if data is not None:
+                _cache.move_to_end(sha256)
+                return data
+    disk_path = _disk_cache_path(file_id)
+    try:
+        with open(disk_path) as f:
+            data = json.load(f)
+        preview_cache.record_hit(disk_path)
+    except (FileNotFoundError, ValueError):
+        preview_cache.record_miss()
+        data = _read_listing(file_id, file_name)
+        os.makedirs(settings.PREVIEW_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".job_", dir=settings.PREVIEW_DIR)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, disk_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        preview_cache.add(disk_path)
+    if sha256:
+        with _cache_lock:
+            _cache[sha256] = data
+            _cache.move_to_end(sha256)
+            while len(_cache) > _CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return data
+
+
+def children(data: dict, path: str, page: int, page_size: int) -> dict:
+    """
+    某个目录下的直接子项（目录在前，按名称排序）并分页；目录的大小与文件数为其下全部文件之和。
+    压缩包中未显式记录的中间目录也会被补全。
+    """
+    prefix = path.strip("/")
+    prefix = f"{prefix}/" if prefix else ""
+    dirs: dict[str, dict] = {}
+    files = []
+    for e in data["entries"]:
+        p = e["path"]
+        if not p.startswith(prefix) or p == prefix.rstrip("/"):
+            continue
+        rest = p[len(prefix):]
+        head, sep, _ = rest.partition("/")
+        if sep or e["is_dir"]:
+            d = dirs.setdefault(head, {"name": head, "path": prefix + head, "is_dir": True, "size": 0, "file_count": 0})
+            if not e["is_dir"]:
+                d["size"] += e["size"]
+                d["file_count"] += 1
+        else:
+            files.append(
+                {
+                    "name": head,
+                    "path": p,
+                    "is_dir": False,
+                    "size": e["size"],
+                    "compressed_size": e["compressed_size"],
+                    "modified": e["modified"],
+                    "encrypted": e["encrypted"],
+                }
+            )
+    items = sorted(dirs.values(), key=lambda x: x["name"].lower()) + sorted(files, key=lambda x: x["name"].lower())
+    start = (page - 1) * page_size
+    return {
+        "path": prefix.rstrip("/"),
+        "total": len(items),
+        "page": page,
+        "page_size": page_size,
+        "items": items[start : start + page_size],
+    }
+
+
+def find_entry(data: dict, path: str) -> dict | None:
+    path = path.strip("/")
+    return next((e for e in data["entries"] if e["path"] == path and not e["is_dir"]), None)
+
+
+class MemberReader:
+    """已打开的压缩包成员；close 时一并关闭压缩包与底层文件。"""
+
+    def __init__(self, member, stack: ExitStack):
+        self._member = member
+        self._stack = stack
+
+    def read(self, size: int = -1) -> bytes:
+        return self._member.read(size)
+
+    def close(self) -> None:
+        self._stack.close()
+
+
+def open_member(file_id: str, file_name: str, member_name: str) -> MemberReader:
+    """
+    打开压缩包中的单个成员（读取本地文件头并初始化解压器）。在返回响应前调用，
+    源文件缺失、存储错误、压缩包损坏或压缩方式不支持（如 deflate64）都在此时以 ZipInspectError 抛出。
+    """
+    stack = ExitStack()
+    try:
+        zf = stack.enter_context(open_archive(file_id, file_name))
+        try:
+            member = stack.enter_context(zf.open(member_name))
+        except KeyError:
+            raise ZipNotFound("压缩包中不存在该文件")
+        except (RuntimeError, NotImplementedError, zipfile.BadZipFile) as exc:
+            raise ZipInspectError(f"无法解压该文件: {exc}")
+        except ZipInspectError:
+            raise
+        except Exception as exc:
+            raise ZipUnavailable(f"无法读取压缩包: {exc}")
+    except BaseException:
+        stack.close()
+        raise
+    return MemberReader(member, stack)
+
+
+def stream_member(reader: MemberReader) -> Iterator[bytes]:
+    """逐块解压已打开的成员并产出数据，只读取该成员在压缩包中的字节区间；结束或中断时关闭。"""
+    try:
+        while True:
+            chunk = reader.read(_STREAM_CHUNK)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        reader.close()
@@ -38,6 +38,10 @@ def migrate_resource_columns():
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS cover_url VARCHAR(500)",
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS duration_seconds INTEGER",
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS duration_source VARCHAR(20)",
+        "ALTER TABLE resources ADD COLUMN IF NOT EXISTS media_info JSON",
+        "ALTER TABLE resources ADD COLUMN IF NOT EXISTS hls_status VARCHAR(20)",
+        "ALTER TABLE resources ADD COLUMN IF NOT EXISTS hls_pending_since TIMESTAMP WITH TIME ZONE",
+        "CREATE INDEX IF NOT EXISTS ix_resources_file_sha256 ON resources (file_sha256)",
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS audience VARCHAR(100)",
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS view_count INTEGER NOT NULL DEFAULT 0",
         "ALTER TABLE resources ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE",
@@ -1,11 +1,49 @@
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from app.core import metrics, sql_monitor
 from app.core.config import settings
+from app.core.request_id import record_db_query
 
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # SQL 次数与耗时计入当前请求（Server-Timing / X-DB-Queries），按指纹汇总并检测慢查询；
+    # 执行失败的语句不计入
+    started = conn.info.pop("query_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        record_db_query(elapsed, sql_monitor.record_query(statement, elapsed))
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    metrics.DB_POOL_CONNECTIONS.inc()
+
+
+@event.listens_for(engine, "close")
+def _on_close(dbapi_connection, connection_record):
+    metrics.DB_POOL_CONNECTIONS.dec()
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    metrics.DB_POOL_CHECKED_OUT.dec()
+
+
 def get_db():
     db = SessionLocal()
     try:
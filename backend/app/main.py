@@ -1,14 +1,24 @@
+import hmac
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from app.core.config import settings
 from app.core.logging import setup_logging
 from app.core.request_id import RequestIdMiddleware
 from app.core.response import err
-from app.core.errors import AppError
+from app.core.errors import AppError, auth_required, not_found
+from app.core.jobs import shutdown_all as shutdown_jobs
+from app.core.office import office_pool
+from app.core import metrics, preview_cache
+from app.core.log_index import log_indexer
+from app.core.profiler import profiler_watcher
 from app.api.routes import auth, meta, resources, admin, files, ai
 from app.db.auto_migrate import run_migrations_safely
+from app.db.session import SessionLocal
+from app.models.resource import Resource
 import logging
+import threading
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -34,10 +44,38 @@ app.include_router(admin.router)
 app.include_router(ai.router)
 
 
+def _reconcile_preview_cache():
+    # 在后台线程中运行，数据库不可用等任何异常都只记录日志
+    try:
+        db = SessionLocal()
+        try:
+            rows = db.query(Resource.file_id).filter(Resource.file_id.isnot(None), Resource.deleted_at.is_(None)).all()
+            live = {fid for (fid,) in rows}
+        finally:
+            db.close()
+        preview_cache.reconcile(live)
+    except Exception:
+        logger.exception("Preview cache reconciliation failed")
+
+
 @app.on_event("startup")
 async def startup_migrate():
     # 启动时自动执行轻量迁移，避免版本升级后遗漏新列/表
     run_migrations_safely()
+    # 后台预热常驻 LibreOffice 实例，不阻塞启动
+    threading.Thread(target=office_pool.start, name="office-warmup", daemon=True).start()
+    threading.Thread(target=_reconcile_preview_cache, name="preview-cache-reconcile", daemon=True).start()
+    log_indexer.start()
+    profiler_watcher.start(app)
+
+
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    shutdown_jobs()
+    office_pool.shutdown()
+    log_indexer.stop()
+    profiler_watcher.stop()
+    metrics.mark_process_dead()
 
 
 @app.exception_handler(AppError)
@@ -59,3 +97,16 @@ async def internal_handler(request: Request, exc: Exception):
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    # 指标含路由、流量与错误率等内部信息：默认必须配置 token，未配置时视为未开启
+    if not settings.METRICS_TOKEN and not settings.METRICS_PUBLIC:
+        raise not_found()
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected.encode()):
+            raise auth_required()
+    body, content_type = metrics.render_latest()
+    return Response(body, media_type=content_type)
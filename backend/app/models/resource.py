@@ -6,6 +6,7 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Text,
+    JSON,
     Table,
     Column,
 )
@@ -36,6 +37,10 @@ class Resource(Base):
     cover_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
     duration_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
     duration_source: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    media_info: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    hls_status: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    # 切片任务的租约：pending 状态自此时刻起算，超时未完成（进程崩溃等）视为失效，可由任一 worker 重新排队
+    hls_pending_since: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     audience: Mapped[str | None] = mapped_column(String(100), nullable=True)
     status: Mapped[str] = mapped_column(String(20), default="draft", nullable=False)
     owner_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -45,7 +50,7 @@ class Resource(Base):
     file_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
     file_size_bytes: Mapped[int | None] = mapped_column(Integer, nullable=True)
     file_mime: Mapped[str | None] = mapped_column(String(100), nullable=True)
-    file_sha256: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    file_sha256: Mapped[str | None] = mapped_column(String(128), nullable=True, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     published_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -84,3 +84,18 @@ class TagPatchIn(BaseModel):
     name: str | None = None
     sort_order: int | None = None
     is_active: bool | None = None
+
+
+class QueryExplainIn(BaseModel):
+    queryid: str
+    # 按 $1..$n 顺序的样例参数，未给出的按参数类型取中性值
+    params: list[str | int | float | bool | None] | None = None
+
+
+class ProfileSessionIn(BaseModel):
+    mode: Literal["cprofile", "sample"] = "sample"
+    route: str | None = None  # 路由模板，如 /api/v1/resources/{rid}/preview；不填则匹配全部路由
+    user_id: int | None = None
+    duration_seconds: int = 60
+    max_requests: int = 10
+    interval_ms: int = 5  # 采样间隔（仅 sample 模式）
@@ -0,0 +1,100 @@
+"""
+Office -> PDF 转换耗时对比：冷启动 soffice 命令行 vs 常驻 LibreOffice 实例（UNO）。
+
+用法（在 backend 目录下，需已安装 LibreOffice 与 python3-uno）：
+    python -m benchmarks.bench_office_convert [文件 ...] [--runs 5]
+
+不传文件时使用仓库自带的示例 docx/pptx（frontend/public/sample-files）。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Settings 要求的必填项，基准测试不会连接数据库
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("SIGNED_URL_SECRET", "bench")
+
+from app.core.office import OfficePool, OfficeUnavailable  # noqa: E402
+from app.core.preview import PreviewError, _soffice_convert  # noqa: E402
+
+SAMPLE_DIR = Path(__file__).resolve().parents[2] / "frontend" / "public" / "sample-files"
+
+
+def _default_files() -> list[Path]:
+    return sorted(p for p in SAMPLE_DIR.glob("*") if p.suffix.lower() in {".docx", ".pptx", ".xlsx"})
+
+
+def _summary(label: str, samples: list[float]) -> str:
+    if not samples:
+        return f"{label:<28} n/a"
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(len(ordered) * 0.95)) - 1)]
+    return (
+        f"{label:<28} min {min(samples) * 1000:8.0f} ms   median {statistics.median(samples) * 1000:8.0f} ms"
+        f"   p95 {p95 * 1000:8.0f} ms"
+    )
+
+
+def bench_cli(src: Path, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as job_dir:
+            start = time.perf_counter()
+            _soffice_convert(str(src), job_dir, os.path.join(job_dir, "profile"))
+            out.append(time.perf_counter() - start)
+    return out
+
+
+def bench_pool(pool: OfficePool, src: Path, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as job_dir:
+            start = time.perf_counter()
+            pool.convert(str(src), os.path.join(job_dir, "out.pdf"), timeout=120)
+            out.append(time.perf_counter() - start)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    files = args.files or _default_files()
+    if not files:
+        print("没有可用的示例文件", file=sys.stderr)
+        return 1
+
+    pool = OfficePool(1)
+    if not pool.enabled:
+        print("python3-uno 不可用：只测试命令行冷启动路径")
+    else:
+        start = time.perf_counter()
+        pool.start()
+        print(f"常驻实例启动耗时（一次性）: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    try:
+        for src in files:
+            print(f"\n== {src.name} ({src.stat().st_size / 1024:.0f} KB), runs={args.runs}")
+            try:
+                print(_summary("cold soffice CLI", bench_cli(src, args.runs)))
+            except PreviewError as exc:
+                print(f"cold soffice CLI failed: {exc}")
+            if pool.enabled:
+                try:
+                    print(_summary("warm UNO instance", bench_pool(pool, src, args.runs)))
+                except OfficeUnavailable as exc:
+                    print(f"warm UNO instance failed: {exc}")
+    finally:
+        pool.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+资源报表导出吞吐：服务端游标 + 增量写出 CSV / XLSX 的行/秒与内存占用。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_report_export [--rows 200000] [--chunk-size 2000] [--database-url URL]
+
+不传 --database-url 时在临时 SQLite 文件中生成测试数据；传入已有库（如 PostgreSQL 副本）时
+只读取、不写入任何数据。峰值 RSS 在导出前后各取一次，内存应与行数无关。
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--rows", type=int, default=200000)
+parser.add_argument("--chunk-size", type=int, default=2000)
+parser.add_argument("--database-url")
+args = parser.parse_args()
+
+_tmp_dir = None
+if args.database_url:
+    os.environ["DATABASE_URL"] = args.database_url
+else:
+    _tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir.name}/bench.db"
+# Settings 要求的必填项
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("SIGNED_URL_SECRET", "bench")
+
+from sqlalchemy import insert  # noqa: E402
+from app.core import report_export  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.models import download, resource_attachment, audit  # noqa: E402,F401
+from app.models.base import Base  # noqa: E402
+from app.models.meta import Course, IdeologyTag, Major, ProfessionalGroup  # noqa: E402
+from app.models.resource import Resource, resource_tags  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+
+def _max_rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(rows: int) -> None:
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        group = ProfessionalGroup(name="基准专业群")
+        db.add(group)
+        db.flush()
+        majors = [Major(group_id=group.id, name=f"专业{i}") for i in range(10)]
+        db.add_all(majors)
+        db.flush()
+        courses = [Course(major_id=majors[i % 10].id, name=f"课程{i}") for i in range(50)]
+        owners = [User(username=f"bench{i}", name=f"教师{i}", role="teacher", password_hash="x") for i in range(20)]
+        tags = [IdeologyTag(name=f"标签{i}") for i in range(8)]
+        db.add_all(courses + owners + tags)
+        db.flush()
+        batch = 10000
+        for start in range(0, rows, batch):
+            n = min(batch, rows - start)
+            ids = db.execute(
+                insert(Resource).returning(Resource.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "title": f"基准资源 {start + i}：课程思政案例",
+                        "major_id": majors[(start + i) % 10].id,
+                        "course_id": courses[(start + i) % 50].id,
+                        "resource_type": "doc",
+                        "source_type": "upload",
+                        "file_type": "pdf",
+                        "status": "published",
+                        "owner_user_id": owners[(start + i) % 20].id,
+                        "download_count": (start + i) % 97,
+                    }
+                    for i in range(n)
+                ],
+            ).scalars().all()
+            db.execute(
+                resource_tags.insert(),
+                [{"resource_id": rid, "tag_id": tags[rid % 8].id} for rid in ids if rid % 3],
+            )
+        db.commit()
+
+
+def bench(fmt: str, chunk_size: int) -> None:
+    writer = report_export.stream_xlsx if fmt == "xlsx" else report_export.stream_csv
+    stmt = report_export.report_query()
+    counted = 0
+
+    def counting(rows):
+        nonlocal counted
+        for row in rows:
+            counted += 1
+            yield row
+
+    size = 0
+    rss_before = _max_rss_mb()
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        for chunk in writer(counting(report_export.iter_rows(db, stmt, chunk_size))):
+            size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{fmt:<5} {counted:>9} 行  {elapsed:7.2f} s  {counted / elapsed:>10.0f} 行/秒"
+        f"  输出 {size / 1024 / 1024:8.1f} MB  峰值 RSS {rss_before:.0f} -> {_max_rss_mb():.0f} MB"
+    )
+
+
+def main() -> int:
+    if not args.database_url:
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"生成 {args.rows} 行测试数据: {time.perf_counter() - start:.1f} s")
+    for fmt in ("csv", "xlsx"):
+        bench(fmt, args.chunk_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+mp4 起播耗时对比：moov 在文件尾 vs faststart（moov 在文件头）。
+
+在本地起一个限速、带往返延迟、支持 Range 的 HTTP 服务模拟弱网，用 ffprobe 作为“播放器”
+请求第一帧视频，记录从发起请求到拿到第一帧的耗时和期间传输的字节数。
+
+用法（在 backend 目录下，需已安装 ffmpeg/ffprobe）：
+    python -m benchmarks.bench_time_to_first_frame [视频.mp4] [--kbps 2000] [--rtt-ms 80] [--runs 3]
+
+不传文件时用 ffmpeg 生成一段 60 秒的测试视频（默认封装即 moov 在文件尾）。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Settings 要求的必填项，基准测试不会连接数据库
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ.setdefault("SIGNED_URL_SECRET", "bench")
+
+from app.core.faststart import moov_before_mdat  # noqa: E402
+from app.core.media import run_ffmpeg  # noqa: E402
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes_sent = 0
+        self.requests = 0
+
+    def reset(self):
+        with self.lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+
+def _make_handler(root: Path, kbps: int, rtt_ms: int, stats: _Stats):
+    chunk = 16 * 1024
+    bytes_per_sec = kbps * 1000 / 8
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(rtt_ms / 1000)
+            path = root / self.path.lstrip("/")
+            if not path.is_file():
+                self.send_error(404)
+                return
+            total = path.stat().st_size
+            start, end = 0, total - 1
+            range_header = self.headers.get("Range")
+            if range_header and range_header.startswith("bytes="):
+                first, _, last = range_header[6:].split(",")[0].partition("-")
+                start = int(first) if first else max(0, total - int(last))
+                end = int(last) if first and last else total - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+            else:
+                self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            with stats.lock:
+                stats.requests += 1
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                try:
+                    while remaining > 0:
+                        data = f.read(min(chunk, remaining))
+                        if not data:
+                            break
+                        self.wfile.write(data)
+                        remaining -= len(data)
+                        with stats.lock:
+                            stats.bytes_sent += len(data)
+                        time.sleep(len(data) / bytes_per_sec)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+    return Handler
+
+
+def time_to_first_frame(url: str) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-select_streams", "v:0",
+            "-read_intervals", "%+#1",
+            "-show_entries", "frame=pts_time",
+            "-of", "csv=p=0",
+            url,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        timeout=600,
+    )
+    return time.perf_counter() - start
+
+
+def _make_sample(path: str) -> None:
+    run_ffmpeg(
+        [
+            "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=25",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+            "-t", "60", "-c:v", "libx264", "-preset", "veryfast", "-b:v", "2500k",
+            "-c:a", "aac", "-shortest", path,
+        ],
+        600,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", type=Path)
+    parser.add_argument("--kbps", type=int, default=2000, help="限速（千比特/秒）")
+    parser.add_argument("--rtt-ms", type=int, default=80, help="每个请求额外的往返延迟")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        src_path = str(args.file.resolve()) if args.file else os.path.join(root, "source.mp4")
+        if not args.file:
+            _make_sample(src_path)
+        # 同一份内容分别封装为 moov 在尾（ffmpeg 默认）和 faststart 两个版本
+        run_ffmpeg(["-i", src_path, "-map", "0", "-c", "copy", os.path.join(root, "moov_end.mp4")], 600)
+        fast_path = os.path.join(root, "faststart.mp4")
+        run_ffmpeg(["-i", src_path, "-map", "0", "-c", "copy", "-movflags", "+faststart", fast_path], 600)
+
+        stats = _Stats()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(Path(root), args.kbps, args.rtt_ms, stats))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        size_mb = os.path.getsize(fast_path) / 1024 / 1024
+        print(f"文件 {size_mb:.1f} MB，限速 {args.kbps} kbps，RTT {args.rtt_ms} ms，runs={args.runs}\n")
+        try:
+            for label, name in (("moov at end", "moov_end.mp4"), ("faststart", "faststart.mp4")):
+                print(f"{label:<12} moov_before_mdat={moov_before_mdat(os.path.join(root, name))}")
+                samples, sent, requests = [], [], []
+                for _ in range(args.runs):
+                    stats.reset()
+                    samples.append(time_to_first_frame(f"{base}/{name}"))
+                    sent.append(stats.bytes_sent)
+                    requests.append(stats.requests)
+                print(
+                    f"{'':<12} time_to_first_frame median {statistics.median(samples) * 1000:8.0f} ms"
+                    f"   min {min(samples) * 1000:8.0f} ms"
+                    f"   bytes {statistics.median(sent) / 1024:8.0f} KB   requests {statistics.median(requests):.0f}"
+                )
+        finally:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
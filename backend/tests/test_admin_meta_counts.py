@@ -0,0 +1,112 @@
+"""
+管理后台元数据列表的 SQL 次数回归测试：资源数按层级一条 GROUP BY 统计，
+语句数不随专业群/专业/课程/标签条目数增长（include_counts=true 只比 false 多一条）。
+
+运行（在 backend 目录下）：
+    python -m pytest tests
+"""
+import os
+import tempfile
+
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir.name}/test.db"
+os.environ["LOG_DIR"] = os.path.join(_tmp_dir.name, "logs")
+os.environ.setdefault("JWT_SECRET", "test" * 8)
+os.environ.setdefault("SIGNED_URL_SECRET", "test")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import download, resource_attachment, audit  # noqa: E402,F401
+from app.models.base import Base  # noqa: E402
+from app.models.meta import Course, IdeologyTag, Major, ProfessionalGroup  # noqa: E402
+from app.models.resource import Resource, resource_tags  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+ENDPOINTS = ("/api/v1/admin/meta/groups", "/api/v1/admin/meta/majors", "/api/v1/admin/meta/courses", "/api/v1/admin/meta/tags")
+
+
+def _seed(db, owner: User, n: int) -> None:
+    """新增一个专业群及其下 n 个专业、n 门课程、n 个标签，每门课程两条资源（各带一个标签）。"""
+    group = ProfessionalGroup(name=f"专业群{db.query(ProfessionalGroup).count()}")
+    db.add(group)
+    db.flush()
+    majors = [Major(group_id=group.id, name=f"{group.name}-专业{i}") for i in range(n)]
+    db.add_all(majors)
+    db.flush()
+    courses = [Course(major_id=majors[i].id, name=f"{group.name}-课程{i}") for i in range(n)]
+    tags = [IdeologyTag(name=f"{group.name}-标签{i}") for i in range(n)]
+    db.add_all(courses + tags)
+    db.flush()
+    for i, course in enumerate(courses):
+        for _ in range(2):
+            r = Resource(
+                title=f"{course.name}-资源",
+                group_id=group.id,
+                major_id=course.major_id,
+                course_id=course.id,
+                resource_type="doc",
+                source_type="upload",
+                file_type="pdf",
+                status="published",
+                owner_user_id=owner.id,
+            )
+            db.add(r)
+            db.flush()
+            db.execute(resource_tags.insert().values(resource_id=r.id, tag_id=tags[i].id))
+    db.commit()
+
+
+@pytest.fixture(scope="module")
+def env():
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    admin = User(username="admin", name="管理员", role="admin", password_hash="x")
+    db.add(admin)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'id': admin.id, 'role': 'admin'})}"}
+    yield TestClient(app), headers, db, admin
+    db.close()
+    Base.metadata.drop_all(engine)
+
+
+def _count_queries(client: TestClient, headers: dict, url: str, include_counts: bool) -> tuple[int, list[dict]]:
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", _record)
+    try:
+        resp = client.get(url, params={"include_counts": str(include_counts).lower()}, headers=headers)
+    finally:
+        event.remove(engine, "after_cursor_execute", _record)
+    assert resp.status_code == 200, resp.text
+    return len(statements), resp.json()["data"]["items"]
+
+
+def test_query_count_does_not_grow_with_rows(env):
+    client, headers, db, admin = env
+    _seed(db, admin, 5)
+    small = {(url, flag): _count_queries(client, headers, url, flag)[0] for url in ENDPOINTS for flag in (True, False)}
+    _seed(db, admin, 100)
+    for url in ENDPOINTS:
+        with_counts, items = _count_queries(client, headers, url, True)
+        without_counts, _ = _count_queries(client, headers, url, False)
+        assert len(items) >= 100 or url.endswith("/groups")
+        assert with_counts == small[(url, True)], url
+        assert without_counts == small[(url, False)], url
+        assert with_counts == without_counts + 1, url
+
+
+def test_counts_are_correct(env):
+    client, headers, db, admin = env
+    _, courses = _count_queries(client, headers, "/api/v1/admin/meta/courses", True)
+    assert courses and all(c["resource_count"] == 2 for c in courses)
+    _, tags = _count_queries(client, headers, "/api/v1/admin/meta/tags", True)
+    assert tags and all(t["resource_count"] == 2 for t in tags)
+    _, majors = _count_queries(client, headers, "/api/v1/admin/meta/majors", False)
+    assert majors and all("resource_count" not in m for m in majors)
@@ -1,6 +1,15 @@
 /** @type {import('next').NextConfig} */
 const nextConfig = {
   reactStrictMode: true,
+  async headers() {
+    // 默认封面只随发版变化，允许浏览器长期缓存
+    return [
+      {
+        source: "/sample-covers/:path*",
+        headers: [{ key: "Cache-Control", value: "public, max-age=604800, immutable" }],
+      },
+    ];
+  },
 }
 
 module.exports = nextConfig
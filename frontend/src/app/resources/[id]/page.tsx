@@ -1,10 +1,13 @@
 ﻿"use client";
 
 import Link from "next/link";
-import { Suspense, useEffect, useMemo, useRef, useState } from "react";
+import { Suspense, useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { useParams, useRouter, useSearchParams } from "next/navigation";
 import { resourceApi } from "../../../lib/api";
 import { useAuthGuard } from "../../../lib/useAuthGuard";
+import { VideoPlayer } from "../../../components/VideoPlayer";
+import { PdfPages } from "../../../components/PdfPages";
+import { ZipBrowser } from "../../../components/ZipBrowser";
 
 const typeLabel: Record<string, string> = {
   text: "文本",
@@ -33,6 +36,9 @@ function ResourceDetailInner() {
   const [previewBlobLoading, setPreviewBlobLoading] = useState(false);
   const [previewBlobError, setPreviewBlobError] = useState<string | null>(null);
   const [previewRetryToken, setPreviewRetryToken] = useState(0);
+  // 默认使用分页页图预览；分页不可用或用户选择时才加载完整 PDF
+  const [showFullPdf, setShowFullPdf] = useState(false);
+  const fallbackToFullPdf = useCallback(() => setShowFullPdf(true), []);
   const previewBlobRef = useRef<string | null>(null);
   const rawBack = searchParams.get("back");
   const backTarget = useMemo(() => {
@@ -61,18 +67,40 @@ function ResourceDetailInner() {
 
   useEffect(() => {
     if (!data) return;
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | null = null;
+    const load = () => {
+      resourceApi
+        .preview(id)
+        .then((p) => {
+          if (cancelled) return;
+          // 文档转换在后台进行，pending 时轮询直到 ready/failed
+          if (p?.status === "pending") {
+            timer = setTimeout(load, 2000);
+            return;
+          }
+          setPreview(p);
+          setPreviewLoading(false);
+        })
+        .catch(() => {
+          if (cancelled) return;
+          setPreview({ mode: "unsupported", note: "暂不支持在线预览，请下载查看" });
+          setPreviewLoading(false);
+        });
+    };
     setPreview(null);
+    setShowFullPdf(false);
     setPreviewLoading(true);
-    resourceApi
-      .preview(id)
-      .then((p) => setPreview(p))
-      .catch(() => setPreview({ mode: "unsupported", note: "暂不支持在线预览，请下载查看" }))
-      .finally(() => setPreviewLoading(false));
+    load();
+    return () => {
+      cancelled = true;
+      if (timer) clearTimeout(timer);
+    };
   }, [id, data]);
 
   useEffect(() => {
     const fetchPreviewBlob = async () => {
-      if (!preview || preview.mode !== "pdf_preview" || !preview.url) {
+      if (!preview || preview.mode !== "pdf_preview" || !preview.url || (preview.page_images && !showFullPdf)) {
         if (previewBlobRef.current) {
           URL.revokeObjectURL(previewBlobRef.current);
           previewBlobRef.current = null;
@@ -82,6 +110,11 @@ function ResourceDetailInner() {
         setPreviewBlobError(null);
         return;
       }
+      if (preview.status === "failed") {
+        setPreviewBlobUrl(null);
+        setPreviewBlobError(preview.note || "预览生成失败，请下载查看");
+        return;
+      }
       const token = typeof window !== "undefined" ? localStorage.getItem("token") : null;
       if (!token) {
         setPreviewBlobError("请登录后查看预览");
@@ -113,7 +146,7 @@ function ResourceDetailInner() {
         previewBlobRef.current = null;
       }
     };
-  }, [preview, previewRetryToken]);
+  }, [preview, previewRetryToken, showFullPdf]);
 
   const handleDownload = async () => {
     if (!data) return;
@@ -128,6 +161,19 @@ function ResourceDetailInner() {
     }
   };
 
+  const handleDownloadAll = async () => {
+    if (!data) return;
+    setDownloading(true);
+    try {
+      const res = await resourceApi.downloadAll(id);
+      if (res.download_url) window.location.href = res.download_url;
+    } catch (e: any) {
+      setError(e.message || "打包下载失败");
+    } finally {
+      setDownloading(false);
+    }
+  };
+
   const handleAttachmentDownload = async (attachmentId: number) => {
     if (!data) return;
     setDownloading(true);
@@ -266,14 +312,28 @@ function ResourceDetailInner() {
 
       {!showPreviewLoading && preview?.mode === "inline" && preview.url && (
         <div className="space-y-3 rounded border bg-white p-4">
-          {preview.ext === "pdf" && <iframe src={preview.url} className="h-[480px] w-full border" title="预览" />}
+          {preview.ext === "pdf" && preview.page_images && !showFullPdf && (
+            <PdfPages resourceId={id} onFallback={fallbackToFullPdf} />
+          )}
+          {preview.ext === "pdf" && (!preview.page_images || showFullPdf) && (
+            <iframe src={preview.url} className="h-[480px] w-full border" title="预览" />
+          )}
           {["png", "jpg", "jpeg", "gif", "webp"].includes(preview.ext) && (
-            <img src={preview.url} alt={data.title} className="max-h-[480px] w-full object-contain" />
+            <img
+              src={preview.url}
+              srcSet={preview.srcset || undefined}
+              sizes="(max-width: 1024px) 100vw, 960px"
+              alt={data.title}
+              className="max-h-[480px] w-full object-contain"
+            />
           )}
           {preview.ext === "mp4" && (
-            <video controls className="w-full max-h-[480px]" src={preview.url}>
-              浏览器不支持视频播放
-            </video>
+            <VideoPlayer
+              src={preview.url}
+              poster={preview.poster}
+              thumbnails={preview.thumbnails}
+              className="w-full max-h-[480px]"
+            />
           )}
           {preview.ext === "mp3" && (
             <audio controls className="w-full" src={preview.url}>
@@ -283,6 +343,18 @@ function ResourceDetailInner() {
         </div>
       )}
 
+      {!showPreviewLoading && preview?.mode === "hls" && preview.url && (
+        <div className="space-y-3 rounded border bg-white p-4">
+          <VideoPlayer
+            src={preview.url}
+            fallbackSrc={preview.fallback_url}
+            poster={preview.poster}
+            thumbnails={preview.thumbnails}
+            className="w-full max-h-[480px]"
+          />
+        </div>
+      )}
+
       {!showPreviewLoading && preview?.mode === "pdf_preview" && (
         <div className="space-y-2 rounded border bg-white p-4">
           <p className="text-sm text-slate-700">已转换为 PDF 预览</p>
@@ -298,7 +370,22 @@ function ResourceDetailInner() {
               </button>
             </div>
           )}
-          {!previewBlobError && <iframe src={previewBlobUrl || ""} className="h-[480px] w-full border" title="预览" />}
+          {preview.page_images && !showFullPdf ? (
+            <>
+              <PdfPages resourceId={id} onFallback={fallbackToFullPdf} />
+              <button type="button" className="text-sm text-brand underline" onClick={fallbackToFullPdf}>
+                查看完整 PDF
+              </button>
+            </>
+          ) : (
+            !previewBlobError && <iframe src={previewBlobUrl || ""} className="h-[480px] w-full border" title="预览" />
+          )}
+        </div>
+      )}
+
+      {!showPreviewLoading && preview?.mode === "archive" && (
+        <div className="rounded border bg-white p-4">
+          <ZipBrowser resourceId={id} />
         </div>
       )}
 
@@ -323,6 +410,17 @@ function ResourceDetailInner() {
         {(data.resource_type === "video" || data.resource_type === "audio") && (
           <div>时长：{formatDuration(data.duration_seconds)}</div>
         )}
+        {data.media?.video?.width && data.media?.video?.height && (
+          <div>
+            分辨率：{data.media.video.width}×{data.media.video.height}
+            {data.media.video.codec ? `（${data.media.video.codec}）` : ""}
+          </div>
+        )}
+        {data.media?.audio?.sample_rate && (
+          <div>
+            音频：{data.media.audio.codec || "未知编码"} · {data.media.audio.sample_rate} Hz
+          </div>
+        )}
         {data.owner?.name && <div>发布者：{data.owner.name}</div>}
       </div>
 
@@ -340,7 +438,18 @@ function ResourceDetailInner() {
 
       {Array.isArray(data.attachments) && data.attachments.length > 0 && (
         <div className="space-y-2 rounded-lg border bg-white p-4 text-sm text-slate-700">
-          <div className="font-semibold text-slate-800">附件</div>
+          <div className="flex items-center justify-between">
+            <div className="font-semibold text-slate-800">附件</div>
+            {data.can_download && (
+              <button
+                onClick={handleDownloadAll}
+                disabled={downloading}
+                className="rounded border border-brand px-3 py-1 text-xs text-brand hover:bg-brand hover:text-white disabled:opacity-60"
+              >
+                下载全部（含附件）
+              </button>
+            )}
+          </div>
           <div className="space-y-2">
             {data.attachments.map((att: any) => (
               <div key={att.id} className="flex flex-wrap items-center justify-between gap-2 rounded border border-slate-200 px-3 py-2">
@@ -57,6 +57,7 @@ function ResourceListInner() {
   const [selectedTag, setSelectedTag] = useState<number | undefined>(initialTag ? Number(initialTag) : undefined);
   const [sort, setSort] = useState(initialSort);
   const [onlyMine, setOnlyMine] = useState(initialMine);
+  const [exporting, setExporting] = useState(false);
 
   const [groups, setGroups] = useState<SelectOption[]>([{ value: "", label: "全部专业群" }]);
   const [majors, setMajors] = useState<SelectOption[]>([{ value: "", label: "全部专业" }]);
@@ -154,6 +155,20 @@ function ResourceListInner() {
     return `${pathname}${query ? `?${query}` : ""}`;
   }, [keyword, selectedType, selectedGroup, selectedMajor, selectedCourse, selectedTag, sort, onlyMine, page, pathname]);
 
+  // 课程打包下载：取签名地址后由浏览器直接下载，服务端边读边打包
+  const handleExportCourse = async () => {
+    if (!selectedCourse) return;
+    setExporting(true);
+    try {
+      const res = await resourceApi.exportCourse(selectedCourse);
+      if (res.download_url) window.location.href = res.download_url;
+    } catch (e: any) {
+      setError(e.message || "打包下载失败");
+    } finally {
+      setExporting(false);
+    }
+  };
+
   const renderSelect = (
     label: string,
     value: string | number | undefined,
@@ -258,6 +273,18 @@ function ResourceListInner() {
         </label>
       </div>
 
+      {selectedCourse && user && (
+        <div className="flex justify-end">
+          <button
+            className="rounded border border-brand px-3 py-1 text-sm text-brand hover:bg-brand hover:text-white disabled:opacity-60"
+            disabled={exporting}
+            onClick={handleExportCourse}
+          >
+            {exporting ? "准备中..." : "打包下载本课程资源"}
+          </button>
+        </div>
+      )}
+
       {error && <div className="rounded border border-red-200 bg-red-50 px-3 py-2 text-sm text-red-700">{error}</div>}
 
       {loading ? (
@@ -0,0 +1,68 @@
+"use client";
+
+import { useEffect, useState } from "react";
+import { resourceApi } from "../lib/api";
+
+type PageInfo = { n: number; width: number; height: number };
+type Manifest = { status: string; page_count: number; pages: PageInfo[]; url_template: string };
+
+// 分页预览：先拿页数与页面尺寸占位，页图按需懒加载（首屏只请求前几页），无需下载整个 PDF
+export function PdfPages({ resourceId, onFallback }: { resourceId: number; onFallback: () => void }) {
+  const [manifest, setManifest] = useState<Manifest | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | null = null;
+    const load = () => {
+      resourceApi
+        .previewPages(resourceId)
+        .then((m: Manifest) => {
+          if (cancelled) return;
+          if (m?.status === "pending") {
+            timer = setTimeout(load, 2000);
+            return;
+          }
+          if (m?.status !== "ready") {
+            onFallback();
+            return;
+          }
+          setManifest(m);
+        })
+        .catch(() => {
+          if (!cancelled) onFallback();
+        });
+    };
+    load();
+    return () => {
+      cancelled = true;
+      if (timer) clearTimeout(timer);
+    };
+  }, [resourceId, onFallback]);
+
+  if (!manifest) {
+    return <div className="h-[480px] w-full animate-pulse rounded bg-slate-100" />;
+  }
+
+  const pageUrl = (n: number, zoom: string) =>
+    manifest.url_template.replace("{n}", String(n)).replace("{zoom}", zoom);
+
+  return (
+    <div className="max-h-[720px] space-y-3 overflow-y-auto rounded border bg-slate-100 p-3">
+      {manifest.pages.map((p) => (
+        <div key={p.n} className="relative mx-auto w-full max-w-[800px] bg-white shadow-sm" style={{ aspectRatio: `${p.width} / ${p.height}` }}>
+          <img
+            src={pageUrl(p.n, "sm")}
+            srcSet={`${pageUrl(p.n, "sm")} 1x, ${pageUrl(p.n, "lg")} 2x`}
+            loading={p.n <= 2 ? "eager" : "lazy"}
+            decoding="async"
+            alt={`第 ${p.n} 页`}
+            className="h-full w-full object-contain"
+          />
+          <span className="absolute bottom-1 right-2 text-xs text-slate-400">
+            {p.n} / {manifest.page_count}
+          </span>
+        </div>
+      ))}
+    </div>
+  );
+}
@@ -14,6 +14,7 @@ export type ResourceItem = {
   view_count?: number;
   published_at?: string | null;
   cover_url?: string | null;
+  cover_srcset?: string | null;
   can_edit?: boolean;
   can_publish?: boolean;
   can_archive?: boolean;
@@ -58,7 +59,14 @@ export function ResourceCard({ item, href }: { item: ResourceItem; href?: string
     <div className="overflow-hidden rounded-xl border bg-white shadow-sm">
       <div className="flex gap-4 p-3">
         <div className="relative w-52 flex-shrink-0 overflow-hidden rounded-lg bg-slate-100 shadow-inner" style={{ aspectRatio: "16/9" }}>
-          <img src={cover} alt={item.title} className="h-full w-full object-cover" />
+          <img
+            src={cover}
+            srcSet={item.cover_srcset || undefined}
+            sizes="208px"
+            loading="lazy"
+            alt={item.title}
+            className="h-full w-full object-cover"
+          />
           {item.status && (
             <span
               className={`absolute right-2 top-2 rounded-full px-3 py-1 text-[11px] ${statusClass[item.status] || "bg-slate-100 text-slate-600"}`}
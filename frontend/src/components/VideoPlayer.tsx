@@ -0,0 +1,138 @@
+"use client";
+
+import { MouseEvent, useEffect, useRef, useState } from "react";
+
+const HLS_MIME = "application/vnd.apple.mpegurl";
+
+export type VideoThumbnails = { vtt: string; interval: number; width: number; height: number };
+
+type ThumbCue = { start: number; end: number; url: string; x: number; y: number; w: number; h: number };
+
+function parseTime(value: string) {
+  const parts = value.trim().split(":").map(Number);
+  return parts.reduce((acc, n) => acc * 60 + n, 0);
+}
+
+// 解析缩略图 WebVTT：每条 cue 指向雪碧图中的一格（sprite_001.jpg#xywh=x,y,w,h），相对地址按 VTT 地址解析
+function parseThumbVtt(text: string, baseUrl: string): ThumbCue[] {
+  const cues: ThumbCue[] = [];
+  for (const block of text.split(/\r?\n\r?\n/)) {
+    const lines = block.trim().split(/\r?\n/);
+    const timing = lines.findIndex((l) => l.includes("-->"));
+    if (timing < 0 || !lines[timing + 1]) continue;
+    const [start, end] = lines[timing].split("-->").map(parseTime);
+    const [ref, fragment = ""] = lines[timing + 1].split("#");
+    const [x, y, w, h] = (fragment.replace("xywh=", "").split(",").map(Number) as number[]).concat([0, 0, 0, 0]);
+    cues.push({ start, end, url: new URL(ref, baseUrl).toString(), x, y, w, h });
+  }
+  return cues;
+}
+
+// 浏览器原生支持 HLS（Safari / iOS / Android Chrome）时播放自适应码率流，否则回退到整文件播放；
+// 有缩略图轨时在视频下方提供拖动预览条，悬停即可看到画面，不需要请求视频分片
+export function VideoPlayer({
+  src,
+  fallbackSrc,
+  poster,
+  thumbnails,
+  className,
+}: {
+  src: string;
+  fallbackSrc?: string;
+  poster?: string;
+  thumbnails?: VideoThumbnails | null;
+  className?: string;
+}) {
+  const videoRef = useRef<HTMLVideoElement | null>(null);
+  const [current, setCurrent] = useState<string | undefined>(undefined);
+  const [cues, setCues] = useState<ThumbCue[]>([]);
+  const [duration, setDuration] = useState(0);
+  const [hover, setHover] = useState<{ left: number; cue: ThumbCue } | null>(null);
+
+  useEffect(() => {
+    const video = videoRef.current;
+    const isHls = !!fallbackSrc;
+    const native = !!video && video.canPlayType(HLS_MIME) !== "";
+    setCurrent(!isHls || native ? src : fallbackSrc);
+  }, [src, fallbackSrc]);
+
+  useEffect(() => {
+    if (!thumbnails?.vtt) {
+      setCues([]);
+      return;
+    }
+    let cancelled = false;
+    fetch(thumbnails.vtt)
+      .then((resp) => (resp.ok ? resp.text() : ""))
+      .then((text) => {
+        if (!cancelled && text) setCues(parseThumbVtt(text, thumbnails.vtt));
+      })
+      .catch(() => undefined);
+    return () => {
+      cancelled = true;
+    };
+  }, [thumbnails?.vtt]);
+
+  const handleError = () => {
+    if (fallbackSrc && current !== fallbackSrc) setCurrent(fallbackSrc);
+  };
+
+  const timeAt = (e: MouseEvent<HTMLDivElement>) => {
+    const rect = e.currentTarget.getBoundingClientRect();
+    const ratio = Math.min(1, Math.max(0, (e.clientX - rect.left) / rect.width));
+    return { left: e.clientX - rect.left, time: ratio * duration };
+  };
+
+  const handleMove = (e: MouseEvent<HTMLDivElement>) => {
+    const { left, time } = timeAt(e);
+    const cue = cues.find((c) => time >= c.start && time < c.end) || cues[cues.length - 1];
+    setHover(cue ? { left, cue } : null);
+  };
+
+  const handleSeek = (e: MouseEvent<HTMLDivElement>) => {
+    const video = videoRef.current;
+    if (video && duration) video.currentTime = timeAt(e).time;
+  };
+
+  return (
+    <div className="space-y-1">
+      <video
+        ref={videoRef}
+        controls
+        preload="metadata"
+        className={className}
+        src={current}
+        poster={poster}
+        onError={handleError}
+        onLoadedMetadata={(e) => setDuration(e.currentTarget.duration || 0)}
+      >
+        浏览器不支持视频播放
+      </video>
+      {cues.length > 0 && duration > 0 && (
+        <div
+          className="relative h-3 cursor-pointer rounded bg-slate-200"
+          onMouseMove={handleMove}
+          onMouseLeave={() => setHover(null)}
+          onClick={handleSeek}
+          title="拖动预览"
+        >
+          {hover && (
+            <div
+              className="pointer-events-none absolute bottom-4 -translate-x-1/2 rounded border bg-white p-0.5 shadow"
+              style={{ left: hover.left }}
+            >
+              <div
+                style={{
+                  width: hover.cue.w,
+                  height: hover.cue.h,
+                  backgroundImage: `url(${hover.cue.url})`,
+                  backgroundPosition: `-${hover.cue.x}px -${hover.cue.y}px`,
+                }}
+              />
+            </div>
+          )}
+        </div>
+      )}
+    </div>
+  );
+}
@@ -0,0 +1,159 @@
+"use client";
+
+import { useEffect, useState } from "react";
+import { resourceApi } from "../lib/api";
+
+type ZipItem = {
+  name: string;
+  path: string;
+  is_dir: boolean;
+  size: number;
+  file_count?: number;
+  encrypted?: boolean;
+};
+
+type ZipListing = {
+  path: string;
+  total: number;
+  page: number;
+  page_size: number;
+  items: ZipItem[];
+  entry_count: number;
+  total_size: number;
+  truncated: boolean;
+  can_download: boolean;
+  member_url_template: string;
+};
+
+const PAGE_SIZE = 100;
+const INLINE_EXTS = ["png", "jpg", "jpeg", "gif", "webp", "pdf", "txt", "csv", "md", "mp4", "mp3"];
+
+const formatBytes = (bytes: number) => {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 ** 2) return `${Math.round(bytes / 1024)} KB`;
+  if (bytes < 1024 ** 3) return `${(bytes / 1024 ** 2).toFixed(1)} MB`;
+  return `${(bytes / 1024 ** 3).toFixed(1)} GB`;
+};
+
+// 压缩包目录浏览：服务端只读中央目录，逐级分页列出；单个文件按需解压查看或下载
+export function ZipBrowser({ resourceId }: { resourceId: number }) {
+  const [path, setPath] = useState("");
+  const [page, setPage] = useState(1);
+  const [listing, setListing] = useState<ZipListing | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    setError(null);
+    resourceApi
+      .zipList(resourceId, path, page, PAGE_SIZE)
+      .then((d: ZipListing) => {
+        if (!cancelled) setListing(d);
+      })
+      .catch((e: any) => {
+        if (!cancelled) setError(e?.message || "压缩包读取失败");
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [resourceId, path, page]);
+
+  const open = (p: string) => {
+    setPath(p);
+    setPage(1);
+  };
+
+  if (error) {
+    return <div className="text-sm text-red-600">{error}</div>;
+  }
+  if (!listing) {
+    return <div className="h-[240px] w-full animate-pulse rounded bg-slate-100" />;
+  }
+
+  const memberUrl = (p: string, inline: boolean) =>
+    listing.member_url_template.replace("{path}", encodeURIComponent(p)) + (inline ? "&inline=1" : "");
+  const crumbs = listing.path ? listing.path.split("/") : [];
+  const pages = Math.max(1, Math.ceil(listing.total / listing.page_size));
+
+  return (
+    <div className="space-y-2 text-sm text-slate-700">
+      <div className="flex flex-wrap items-center gap-1">
+        <button type="button" className="text-brand hover:underline" onClick={() => open("")}>
+          压缩包根目录
+        </button>
+        {crumbs.map((c, i) => (
+          <span key={i} className="flex items-center gap-1">
+            <span className="text-slate-400">/</span>
+            <button type="button" className="text-brand hover:underline" onClick={() => open(crumbs.slice(0, i + 1).join("/"))}>
+              {c}
+            </button>
+          </span>
+        ))}
+        <span className="ml-auto text-xs text-slate-500">
+          共 {listing.entry_count} 项 · 解压后 {formatBytes(listing.total_size)}
+          {listing.truncated && "（条目过多，仅列出部分）"}
+        </span>
+      </div>
+      <div className="max-h-[480px] overflow-y-auto rounded border">
+        <table className="w-full">
+          <tbody>
+            {listing.items.map((item) => {
+              const ext = item.name.includes(".") ? item.name.split(".").pop()!.toLowerCase() : "";
+              return (
+                <tr key={item.path} className="border-b last:border-b-0 hover:bg-slate-50">
+                  <td className="px-3 py-2">
+                    {item.is_dir ? (
+                      <button type="button" className="text-brand hover:underline" onClick={() => open(item.path)}>
+                        📁 {item.name}
+                      </button>
+                    ) : (
+                      <span>📄 {item.name}</span>
+                    )}
+                  </td>
+                  <td className="whitespace-nowrap px-3 py-2 text-right text-xs text-slate-500">
+                    {item.is_dir ? `${item.file_count} 个文件 · ${formatBytes(item.size)}` : formatBytes(item.size)}
+                  </td>
+                  <td className="whitespace-nowrap px-3 py-2 text-right">
+                    {!item.is_dir && item.encrypted && <span className="text-xs text-slate-400">已加密</span>}
+                    {!item.is_dir && !item.encrypted && (
+                      <span className="flex justify-end gap-3">
+                        {INLINE_EXTS.includes(ext) && (
+                          <a href={memberUrl(item.path, true)} target="_blank" rel="noreferrer" className="text-brand hover:underline">
+                            查看
+                          </a>
+                        )}
+                        {listing.can_download && (
+                          <a href={memberUrl(item.path, false)} className="text-brand hover:underline">
+                            下载
+                          </a>
+                        )}
+                      </span>
+                    )}
+                  </td>
+                </tr>
+              );
+            })}
+            {listing.items.length === 0 && (
+              <tr>
+                <td className="px-3 py-6 text-center text-slate-400">空目录</td>
+              </tr>
+            )}
+          </tbody>
+        </table>
+      </div>
+      {pages > 1 && (
+        <div className="flex items-center justify-end gap-3">
+          <button type="button" disabled={page <= 1} className="text-brand disabled:text-slate-300" onClick={() => setPage(page - 1)}>
+            上一页
+          </button>
+          <span className="text-xs text-slate-500">
+            {page} / {pages}
+          </span>
+          <button type="button" disabled={page >= pages} className="text-brand disabled:text-slate-300" onClick={() => setPage(page + 1)}>
+            下一页
+          </button>
+        </div>
+      )}
+    </div>
+  );
+}
@@ -105,7 +105,12 @@ export const resourceApi = {
       body: JSON.stringify(payload),
     }),
   download: (id: number) => apiFetch(`/resources/${id}/download`),
+  downloadAll: (id: number) => apiFetch(`/resources/${id}/download-all/url`),
+  exportCourse: (courseId: number) => apiFetch(`/resources/export/url?course_id=${courseId}`),
   preview: (id: number) => apiFetch(`/resources/${id}/preview`),
+  previewPages: (id: number) => apiFetch(`/resources/${id}/preview/pages`),
+  zipList: (id: number, path: string, page = 1, pageSize = 100) =>
+    apiFetch(`/resources/${id}/zip?path=${encodeURIComponent(path)}&page=${page}&page_size=${pageSize}`),
   publish: (id: number) => apiFetch(`/resources/${id}/publish`, { method: "POST" }),
   archive: (id: number) => apiFetch(`/resources/${id}/archive`, { method: "POST" }),
   remove: (id: number) => apiFetch(`/resources/${id}`, { method: "DELETE" }),
@@ -188,10 +193,11 @@ export const adminApi = {
       body: JSON.stringify(payload),
     }),
   resetPassword: (id: number) => apiFetch(`/admin/users/${id}/reset-password`, { method: "POST" }),
-  metaGroups: () => apiFetch("/admin/meta/groups"),
-  metaMajors: () => apiFetch("/admin/meta/majors"),
-  metaCourses: () => apiFetch("/admin/meta/courses"),
-  metaTags: () => apiFetch("/admin/meta/tags"),
+  // includeCounts=false 时不统计资源数，适合只需名称的下拉框
+  metaGroups: (includeCounts = true) => apiFetch(`/admin/meta/groups${includeCounts ? "" : "?include_counts=false"}`),
+  metaMajors: (includeCounts = true) => apiFetch(`/admin/meta/majors${includeCounts ? "" : "?include_counts=false"}`),
+  metaCourses: (includeCounts = true) => apiFetch(`/admin/meta/courses${includeCounts ? "" : "?include_counts=false"}`),
+  metaTags: (includeCounts = true) => apiFetch(`/admin/meta/tags${includeCounts ? "" : "?include_counts=false"}`),
   createGroup: (payload: any) =>
     apiFetch("/admin/meta/groups", { method: "POST", body: JSON.stringify(payload) }),
   updateGroup: (id: number, payload: any) =>